@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+
+REFRESH_SECONDS = float(os.getenv("GOLD_REFRESH_SECONDS", "2"))
+STALE_AFTER_SECONDS = float(os.getenv("GOLD_STALE_AFTER_SECONDS", "60"))
+
+LOG = logging.getLogger("gold_refresher")
+
+
+class GoldRefresher:
+    """Polls the ETags of the watched objects and keeps a pre-serialized response in memory.
+
+    build() -> (body_bytes, status) runs only when an ETag changes; request handlers
+    read the current (body, status) tuple, which is replaced in a single assignment.
+    """
+
+    def __init__(self, get_client, bucket: str, watch: list, build, interval: float = REFRESH_SECONDS):
+        self._get_client = get_client
+        self._bucket = bucket
+        self._watch = list(watch)
+        self._build = build
+        self.interval = interval
+
+        self._snapshot = None
+        self._signature = None
+        self.checked_at = None
+        self.loaded_at = None
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def response(self):
+        return self._snapshot
+
+    def _etag(self, client, name):
+        from minio.error import S3Error
+
+        try:
+            return client.stat_object(self._bucket, name).etag
+        except S3Error as exc:
+            if exc.code == "NoSuchKey":
+                return None
+            raise
+
+    def refresh(self) -> bool:
+        """One poll; returns True when the in-memory response was rebuilt."""
+        with self._lock:
+            try:
+                client = self._get_client()
+                signature = tuple(self._etag(client, name) for name in self._watch)
+                self.checked_at = time.time()
+
+                if self._snapshot is not None and signature == self._signature:
+                    return False
+
+                body, status = self._build()
+            except Exception as exc:
+                # keep serving the last good response; staleness shows up in /health
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                LOG.warning("Gold refresh failed: %s", exc)
+                return False
+
+            # a broken gold object does not replace a good response
+            if status != 200 and self._snapshot is not None and self._snapshot[1] == 200:
+                self.last_error = f"build returned {status}"
+                return False
+
+            self._snapshot = (body, status)
+            self._signature = signature
+            self.loaded_at = time.time()
+            self.last_error = None
+            LOG.info("Gold response refreshed (status %s, %d bytes)", status, len(body))
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gold-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        now = time.time()
+        staleness = round(now - self.checked_at, 1) if self.checked_at else None
+        return {
+            "running": self.running,
+            "loaded": self._snapshot is not None,
+            "status": self._snapshot[1] if self._snapshot else None,
+            "etags": dict(zip(self._watch, self._signature)) if self._signature else None,
+            # seconds since MinIO was last polled successfully / since the response was rebuilt
+            "staleness_s": staleness,
+            "loaded_age_s": round(now - self.loaded_at, 1) if self.loaded_at else None,
+            "stale": staleness is None or staleness > STALE_AFTER_SECONDS,
+            "last_error": self.last_error,
+        }
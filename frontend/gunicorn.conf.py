@@ -0,0 +1,43 @@
+# Production server config.
+#
+#   gunicorn -c frontend/gunicorn.conf.py frontend.wsgi:app
+#
+# Graceful reload: `kill -HUP <master pid>` starts new workers and lets the old
+# ones finish in-flight requests (up to graceful_timeout). With preload_app the
+# application code lives in the master, so deploy new code with USR2 + WINCH/QUIT
+# or set WEB_PRELOAD=0. rules.yaml edits are picked up without any reload.
+import multiprocessing
+import os
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '5000')}"
+
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("WEB_THREADS", "4"))
+worker_class = "gthread"
+
+# import the app, compile rules and load the latest gold response once before forking
+preload_app = os.getenv("WEB_PRELOAD", "1") not in ("0", "false", "False")
+
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+# recycle workers now and then so slow leaks never matter
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "200"))
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    from frontend.main import reset_minio_client, start_gold_refresher
+
+    reset_minio_client()
+    start_gold_refresher()
+    server.log.info("Worker %s ready", worker.pid)
+
+
+def on_reload(server):
+    server.log.info("HUP received, rolling workers")
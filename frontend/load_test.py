@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Simulate many dashboards polling the API and report throughput / latency.
+
+    python frontend/load_test.py --clients 200 --duration 30
+    python frontend/load_test.py --clients 500 --poll-interval 10   # real dashboard cadence
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def _client(url, deadline, poll_interval, latencies, errors, lock):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            resp = session.get(url, timeout=30)
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+        if poll_interval:
+            time.sleep(max(0.0, poll_interval - elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000/api/recommendations")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=0.0,
+                        help="seconds between polls per client (frontend uses 10)")
+    args = parser.parse_args()
+
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    threads = [
+        threading.Thread(
+            target=_client,
+            args=(args.url, deadline, args.poll_interval, latencies, errors, lock),
+            daemon=True,
+        )
+        for _ in range(args.clients)
+    ]
+
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - started
+
+    latencies.sort()
+    print(f"[LOAD] {args.url} clients={args.clients} duration={wall:.1f}s")
+    print(f"[LOAD] requests={len(latencies)} errors={errors[0]} rps={len(latencies) / wall:.1f}")
+    print(
+        "[LOAD] latency ms "
+        f"p50={_percentile(latencies, 50) * 1000:.1f} "
+        f"p95={_percentile(latencies, 95) * 1000:.1f} "
+        f"p99={_percentile(latencies, 99) * 1000:.1f} "
+        f"max={(latencies[-1] if latencies else 0) * 1000:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,26 @@ import io
 import json
 import logging
 import os
-from typing import Optional, Any, Dict, List
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict
 
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, g, jsonify, render_template, request
 from dotenv import load_dotenv
-from minio import Minio
 
-# optional analytics helper to supply daily history
-from scripts.analytics.daily_screen_time import compute_daily_trend
+from scripts.prescriptive.rules_loader import get_rules
+from frontend.response_cache import cached_response
+from frontend.gold_refresher import GoldRefresher
+from frontend.negotiation import (
+    COMPACT_JSON,
+    JSON,
+    MSGPACK,
+    Representations,
+    media_types,
+    negotiate,
+    pack_msgpack,
+)
+from scripts.profiling import Profile, profiling_enabled
 
 
 # ----------------------------
@@ -25,15 +37,39 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET")
 
+LATEST_GOLD_OBJECT = "gold/recommendations/latest.json"
+# every gold build for a device writes its own latest (see build_gold.write_gold)
+DEVICE_GOLD_OBJECT = "gold/recommendations/devices/{device}/latest.json"
+# device served when a request names none (the web UI); unset serves latest.json, the
+# most recent gold build of any device
+API_DEFAULT_DEVICE = os.getenv("API_DEFAULT_DEVICE") or None
+_DEVICE_ID = re.compile(r"^[\w.:-]{1,128}$")
+
+HISTORY_DEFAULT_HOURS = 24
+HISTORY_MAX_DAYS = int(os.getenv("HISTORY_MAX_DAYS", "92"))
+
 if not MINIO_ACCESS_KEY or not MINIO_SECRET_KEY:
     raise RuntimeError("MINIO_ACCESS_KEY / MINIO_SECRET_KEY must be set in environment or .env")
 
-minio_client = Minio(
-    MINIO_ENDPOINT,
-    access_key=MINIO_ACCESS_KEY,
-    secret_key=MINIO_SECRET_KEY,
-    secure=False
-)
+def _new_minio_client():
+    from minio import Minio
+
+    return Minio(
+        MINIO_ENDPOINT,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=False
+    )
+
+# created on first use, so importing the app does not pull in the MinIO SDK
+_minio_client = None
+
+
+def get_minio_client():
+    global _minio_client
+    if _minio_client is None:
+        _minio_client = _new_minio_client()
+    return _minio_client
 
 LOG = logging.getLogger("flask_app")
 logging.basicConfig(level=logging.INFO)
@@ -46,34 +82,36 @@ app = Flask(
 )
 
 # ----------------------------
-# Helpers: MinIO listing / read
+# Opt-in request profiling (PROFILE=cprofile|sample|both, see scripts/profiling.py)
 # ----------------------------
-def _list_minio_objects(prefix: str) -> List[Any]:
-    try:
-        it = minio_client.list_objects(MINIO_BUCKET, prefix=prefix, recursive=True)
-        if it is None:
-            return []
-        return list(it)
-    except Exception as exc:
-        LOG.warning("Failed to list objects in MinIO (%s): %s", prefix, exc)
-        return []
-
-def _safe_latest_object_name(objects: List[Any]) -> Optional[str]:
-    if not objects:
-        return None
-    valid: List[str] = []
-    for o in objects:
-        name = getattr(o, "object_name", None)
-        if name:
-            valid.append(name)
-    if not valid:
-        return None
-    valid.sort(reverse=True)
-    return valid[0]
+if profiling_enabled():
+    @app.before_request
+    def _start_profile():
+        g.profile = Profile(f"request_{request.endpoint}", thread_only=True).start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profile.stop()
+            response.headers["Server-Timing"] = profile.server_timing()
+            profile.report()
+        return response
+
+    @app.teardown_request
+    def _drop_profile(exc):
+        # after_request is skipped when the view raised
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profile.stop()
+            profile.report()
 
+# ----------------------------
+# Helpers: MinIO read
+# ----------------------------
 def _read_json_object(object_name: str) -> Optional[Dict]:
     try:
-        resp = minio_client.get_object(MINIO_BUCKET, object_name)
+        resp = get_minio_client().get_object(MINIO_BUCKET, object_name)
     except Exception as exc:
         LOG.error("Failed to get object %s: %s", object_name, exc)
         return None
@@ -105,6 +143,14 @@ def _map_weather_category_to_label(cat: Optional[str]) -> str:
 # ----------------------------
 # Routes
 # ----------------------------
+@app.before_request
+def _refresh_rules():
+    # cheap mtime check (throttled in rules_loader) so an edited rules.yaml is picked up without restart
+    try:
+        get_rules()
+    except Exception as exc:
+        LOG.warning("Failed to load rules.yaml: %s", exc)
+
 @app.route("/")
 def home():
     try:
@@ -113,103 +159,303 @@ def home():
         LOG.exception("Failed to render template: %s", e)
         return "<h3>Recommendations API</h3><p>Use /api/recommendations</p>"
 
-@app.route("/api/recommendations")
-def api_recommendations():
-    prefix = "gold/recommendations/"
-    objects = _list_minio_objects(prefix)
-    latest_name = _safe_latest_object_name(objects)
-
-    if not latest_name:
-        return jsonify({"status", "NO DATA"}), 404
-
-    gold = _read_json_object(latest_name)
+def _gold_object(device: Optional[str]) -> str:
+    return DEVICE_GOLD_OBJECT.format(device=device) if device is not None else LATEST_GOLD_OBJECT
+
+def _build_latest_recommendations(device: Optional[str] = None):
+    # one object per device plus the shared latest, rewritten by every gold run, so no
+    # listing is needed
+    gold = _read_json_object(_gold_object(device))
+    if gold is None:
+        return {"status": "NO DATA"}, 404
+    return _map_gold(gold)
+
+# the reason shown for each final_decision; sent once per response in API v2
+DECISION_REASONS = {
+    "RECOMMENDED": "Jarak dekat dan kondisi lingkungan mendukung",
+    "WAIT": "Skor prioritas lebih rendah dibanding opsi lain",
+}
+
+def _map_gold(gold: Optional[Dict]):
+    # builds the compact (v2) API payload; the verbose v1 JSON is derived from it
     if not gold:
-        return jsonify({"status": "INVALID_GOLD"}), 500
+        return {"status": "INVALID_GOLD"}, 500
 
+    from scripts.gold.gold_schema import expand_gold, maps_link
+
+    gold = expand_gold(gold)
     ctx = gold.get("context", {})
     decision = gold.get("decision", {})
     recs = gold.get("recommendations", []) or []
 
-    # -------- core context --------
-    screen_time = int(ctx.get("screen_time_minutes", 0))
-
-    weather = {
-        "condition": _map_weather_category_to_label(ctx.get("weather_category")),
-        "temperature": f"{ctx.get('temperature_c')}°C" if ctx.get("temperature_c") else None,
-        "humidity": None
-    }
-
-    user_location = {
-        "lat": ctx.get("user_lat"),
-        "lng": ctx.get("user_lon")
-    }
-
     # -------- history (optional) --------
-    daily_spend_time = compute_daily_trend(7)
-
-    history = [
-        {
-            "time": r["local_date"],
-            "value": int(r["minutes_spent"])
-        }
-        for r in daily_spend_time
-    ]
-    
+    # imported on first use: the analytics helper pulls in pandas
+    from scripts.analytics.daily_screen_time import compute_daily_trend
+
+    daily_spend_time = compute_daily_trend(7, device=ctx.get("device"))
 
     # -------- recommendation mapping --------
-    # sort DESC by priority_score
-    recs = sorted(
-        recs,
-        key=lambda r: float(r.get("priority_score", 0)),
-        reverse=True
-    )
+    # sort DESC by priority_score (gold written by build_gold is already ranked)
+    if not gold.get("sorted"):
+        recs = sorted(
+            recs,
+            key=lambda r: float(r.get("priority_score") or 0),
+            reverse=True
+        )
 
-    TOP_N = 5
-    mapped = []
+    # columnar, one list per field; the first `recommended` places are RECOMMENDED,
+    # the rest WAIT. Links are only listed when they differ from the coordinates' one
+    # ("" when a place has none).
+    places = {
+        "name": [r.get("location_name") for r in recs],
+        "category": [r.get("category") for r in recs],
+        "address": [r.get("address") for r in recs],
+        "lat": [r.get("latitude") for r in recs],
+        "lng": [r.get("longitude") for r in recs],
+        "km": [r.get("distance_km") for r in recs],
+        "score": [round(float(r.get("priority_score") or 0), 1) for r in recs],
+    }
+    links = [r.get("google_maps_link") or "" for r in recs]
+    links = [
+        None if link == maps_link(r.get("latitude"), r.get("longitude")) else link
+        for r, link in zip(recs, links)
+    ]
+    if any(link is not None for link in links):
+        places["link"] = links
+
+    return {
+        "v": 2,
+        "generated_at": gold.get("generated_at"),
+        "rules_version": gold.get("rules_version"),
+        "screen_time": int(ctx.get("screen_time_minutes") or 0),
+        "weather": {"category": ctx.get("weather_category"), "temperature_c": ctx.get("temperature_c")},
+        "user_location": [ctx.get("user_lat"), ctx.get("user_lon")],
+        "history": {
+            "time": [r["local_date"] for r in daily_spend_time],
+            "value": [int(r["minutes_spent"]) for r in daily_spend_time],
+        },
+        "decision": decision,
+        "reasons": DECISION_REASONS,
+        "recommended": get_rules().max_results,
+        "places": places,
+    }, 200
 
-    for i, r in enumerate(recs):
-        score = float(r.get("priority_score", 0))
 
-        final_decision = "RECOMMENDED" if i < TOP_N else "WAIT"
+def _legacy_payload(compact: Dict) -> Dict:
+    """The verbose v1 API response (the default JSON) from the compact one."""
+    from scripts.gold.gold_schema import maps_link
 
-        reason = (
-            "Jarak dekat dan kondisi lingkungan mendukung"
-            if final_decision == "RECOMMENDED"
-            else "Skor prioritas lebih rendah dibanding opsi lain"
-        )
+    if compact.get("v") != 2:
+        # error bodies ({"status": ...}) are the same in every version
+        return compact
 
+    places = compact["places"]
+    links = places.get("link") or [None] * len(places["name"])
+    mapped = []
+    for i, name in enumerate(places["name"]):
+        final_decision = "RECOMMENDED" if i < compact["recommended"] else "WAIT"
         mapped.append({
-            "place_name": r.get("location_name"),
-            "category": r.get("category"),
-            "address": r.get("address"),
-            "latitude": r.get("latitude"),
-            "longitude": r.get("longitude"),
-            "distance_km": r.get("distance_km"),
-            "score": round(score, 1),
+            "place_name": name,
+            "category": places["category"][i],
+            "address": places["address"][i],
+            "latitude": places["lat"][i],
+            "longitude": places["lng"][i],
+            "distance_km": places["km"][i],
+            "score": places["score"][i],
             "final_decision": final_decision,
-            "decision_reason": reason,
-            "google_maps_link": r.get("google_maps_link")
+            "decision_reason": compact["reasons"][final_decision],
+            "google_maps_link": maps_link(places["lat"][i], places["lng"][i]) if links[i] is None else links[i] or None,
         })
 
-    return jsonify({
-        "screen_time": screen_time,
-        "weather": weather,
-        "user_location": user_location,
-        "screen_time_history": history,
+    weather = compact["weather"]
+    lat, lng = compact["user_location"]
+    history = compact["history"]
+    return {
+        "screen_time": compact["screen_time"],
+        "weather": {
+            "condition": _map_weather_category_to_label(weather["category"]),
+            "temperature": f"{weather['temperature_c']}°C" if weather["temperature_c"] else None,
+            "humidity": None
+        },
+        "user_location": {"lat": lat, "lng": lng},
+        "screen_time_history": [{"time": t, "value": v} for t, v in zip(history["time"], history["value"])],
         "recommendations": mapped,
-        "decision": decision,
-        "generated_at": gold.get("generated_at")
+        "decision": compact["decision"],
+        "generated_at": compact["generated_at"],
+        "rules_version": compact["rules_version"]
+    }
+
+
+def _serialized_recommendations(device: Optional[str] = None):
+    payload, status = _build_latest_recommendations(device)
+    return app.json.dumps(payload, separators=(",", ":")).encode("utf-8"), status
+
+# every format is rendered from the cached compact JSON, once per refresh
+_RENDER = {
+    COMPACT_JSON: lambda source: source,
+    JSON: lambda source: app.json.dumps(_legacy_payload(json.loads(source)), separators=(",", ":")).encode("utf-8"),
+    MSGPACK: lambda source: pack_msgpack(json.loads(source)),
+}
+
+# representations of the body served last per device; replaced when the body changes
+_REPRESENTATIONS_MAX = 256
+_representations: Dict[Optional[str], Representations] = {}
+
+def _representations_for(device: Optional[str], body: bytes, status: int) -> Representations:
+    current = _representations.get(device)
+    if current is None or not current.matches(body, status):
+        current = Representations(body, status, _RENDER)
+        if device not in _representations and len(_representations) >= _REPRESENTATIONS_MAX:
+            # oldest device first; it is rebuilt from the response cache when polled again
+            _representations.pop(next(iter(_representations)), None)
+        _representations[device] = current
+    return current
+
+def _new_refresher() -> GoldRefresher:
+    from scripts.analytics.daily_screen_time import rollup_object
+
+    # the response embeds the screen time trend, so a new rollup also triggers a rebuild
+    return GoldRefresher(
+        get_minio_client,
+        MINIO_BUCKET,
+        list(dict.fromkeys([_gold_object(API_DEFAULT_DEVICE), rollup_object(API_DEFAULT_DEVICE), rollup_object()])),
+        lambda: _serialized_recommendations(API_DEFAULT_DEVICE),
+    )
+
+gold_refresher: Optional[GoldRefresher] = None
+
+@app.route("/api/recommendations")
+def api_recommendations():
+    device = request.args.get("device") or API_DEFAULT_DEVICE
+    if device is not None and not _DEVICE_ID.match(device):
+        return jsonify({"status": "BAD_REQUEST", "error": "invalid device id"}), 400
+
+    # hot path: bytes prepared by the background refresher, no I/O per request
+    snapshot = None
+    refresher = gold_refresher
+    if device == API_DEFAULT_DEVICE and refresher is not None and refresher.running:
+        snapshot = refresher.response()
+
+    if snapshot is None:
+        # no refresher for this device (or nothing loaded yet): shared across gunicorn
+        # workers, so N workers polling collapse to one MinIO read per TTL
+        key = "api_recommendations_v2" if device is None else f"api_recommendations_v2:{device}"
+        snapshot = cached_response(key, lambda: _serialized_recommendations(device))
+
+    return _negotiated_response(device, *snapshot)
+
+def _negotiated_response(device: Optional[str], body: bytes, status: int) -> Response:
+    # format from Accept (v1 JSON by default, compact v2 JSON, msgpack when installed),
+    # compression from Accept-Encoding (gzip, br when installed)
+    media_type, encoding = negotiate(request)
+    if media_type is None:
+        response = jsonify({"status": "NOT_ACCEPTABLE", "available": media_types()})
+        response.status_code = 406
+        response.vary.add("Accept")
+        return response
+
+    reps = _representations_for(device, body, status)
+    etag = reps.etag(media_type, encoding)
+
+    if status == 200 and etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        data, applied = reps.body(media_type, encoding)
+        response = Response(data, status=status, mimetype=media_type)
+        if applied:
+            response.headers["Content-Encoding"] = applied
+
+    response.set_etag(etag)
+    # pollers revalidate every time and get a 304 while the gold is unchanged
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.update(("Accept", "Accept-Encoding"))
+    return response
+
+def _parse_time_arg(name: str, default: datetime) -> datetime:
+    value = request.args.get(name)
+    if not value:
+        return default
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # the index is partitioned by UTC date
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+@app.route("/api/recommendations/history")
+def api_recommendations_history():
+    # answered from the gold index (gold/index/date=.../), reading only the days in range
+    from scripts.gold.gold_index import query_index
+
+    now = datetime.now(timezone.utc)
+    try:
+        end = _parse_time_arg("to", now)
+        start = _parse_time_arg("from", end - timedelta(hours=HISTORY_DEFAULT_HOURS))
+        limit = request.args.get("limit", type=int)
+    except ValueError as exc:
+        return jsonify({"status": "BAD_REQUEST", "error": str(exc)}), 400
+
+    if start >= end:
+        return jsonify({"status": "BAD_REQUEST", "error": "'from' must be before 'to'"}), 400
+    if end - start > timedelta(days=HISTORY_MAX_DAYS):
+        return jsonify({"status": "BAD_REQUEST", "error": f"range is limited to {HISTORY_MAX_DAYS} days"}), 400
+
+    try:
+        rows = query_index(start, end, device=request.args.get("device"), limit=limit)
+    except Exception as exc:
+        LOG.error("History query failed: %s", exc)
+        return jsonify({"status": "ERROR", "error": str(exc)}), 500
+
+    return jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "count": len(rows),
+        "items": rows,
     })
 
 @app.route("/health")
 def health():
+    gold = gold_refresher.status() if gold_refresher is not None else None
+    # a broken rules.yaml is reported as a degraded 503, not an unhandled 500
+    rules_version, rules_error = None, None
+    try:
+        rules_version = get_rules().version
+    except Exception as exc:
+        LOG.error("Health check: rules.yaml failed to load: %s", exc)
+        rules_error = f"rules.yaml: {exc}"
+
     try:
-        exists = minio_client.bucket_exists(MINIO_BUCKET)
-        http_code = 200 if exists else 503
-        return jsonify({"minio_ok": bool(exists)}), http_code
+        exists = get_minio_client().bucket_exists(MINIO_BUCKET)
+        body = {"minio_ok": bool(exists), "rules_version": rules_version, "gold": gold}
+        if rules_error:
+            body["error"] = rules_error
+        http_code = 200 if exists and not rules_error else 503
+        return jsonify(body), http_code
     except Exception as exc:
         LOG.error("Health check failed: %s", exc)
-        return jsonify({"minio_ok": False, "error": str(exc)}), 503
+        return jsonify({"minio_ok": False, "rules_version": rules_version, "gold": gold, "error": str(exc)}), 503
+
+# ----------------------------
+# Production server hooks (see frontend/gunicorn.conf.py)
+# ----------------------------
+def warm_up():
+    # runs once in the gunicorn master before forking: compile rules and load the
+    # latest gold response, which forked workers inherit before their refresher starts
+    global gold_refresher
+    get_rules()
+    gold_refresher = _new_refresher()
+    gold_refresher.refresh()
+
+
+def start_gold_refresher():
+    # threads do not survive fork, so each worker starts its own (see post_fork)
+    global gold_refresher
+    if gold_refresher is None:
+        gold_refresher = _new_refresher()
+    gold_refresher.start()
+
+
+def reset_minio_client():
+    # urllib3 pools must not be shared across fork; each worker creates its own on first use
+    global _minio_client
+    _minio_client = None
 
 # ----------------------------
 if __name__ == "__main__":
@@ -217,4 +463,5 @@ if __name__ == "__main__":
     PORT = int(os.getenv("FLASK_PORT", "5000"))
     DEBUG = os.getenv("FLASK_DEBUG", "0") not in ("0", "false", "False")
     LOG.info("Starting Flask on %s:%s (debug=%s)", HOST, PORT, DEBUG)
+    start_gold_refresher()
     app.run(host=HOST, port=PORT, debug=DEBUG)
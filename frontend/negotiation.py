@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import os
+import threading
+
+# below this size compression costs more than the bytes it saves
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "512"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+JSON = "application/json"
+COMPACT_JSON = "application/vnd.touchgrass.v2+json"
+MSGPACK = "application/msgpack"
+# older msgpack clients still send the pre-registration names
+MSGPACK_ALIASES = ("application/x-msgpack", "application/vnd.msgpack")
+
+
+def _optional(module: str):
+    # both are in requirements.txt; a trimmed install still serves JSON and gzip
+    try:
+        return __import__(module)
+    except ImportError:
+        return None
+
+
+_msgpack = _optional("msgpack")
+_brotli = _optional("brotli")
+
+
+def media_types() -> list:
+    # first entry wins for */* and for clients that send no Accept header
+    offers = [JSON, COMPACT_JSON]
+    if _msgpack is not None:
+        offers += [MSGPACK, *MSGPACK_ALIASES]
+    return offers
+
+
+def encodings() -> list:
+    # preferred first when a client accepts several with the same q
+    return (["br"] if _brotli is not None else []) + ["gzip"]
+
+
+def negotiate(request) -> tuple:
+    """(media type, content coding or None) for a request, from Accept / Accept-Encoding.
+
+    The media type is None when the client sent an Accept header that none of the
+    offered types satisfy (e.g. msgpack only, without msgpack installed): a 406, rather
+    than a JSON body the client cannot parse.
+    """
+    if not request.accept_mimetypes:
+        media_type = JSON
+    else:
+        media_type = request.accept_mimetypes.best_match(media_types())
+    if media_type in MSGPACK_ALIASES:
+        media_type = MSGPACK
+    encoding = request.accept_encodings.best_match(encodings() + ["identity"], default="identity")
+    return media_type, (None if encoding == "identity" else encoding)
+
+
+def pack_msgpack(payload) -> bytes:
+    return _msgpack.packb(payload, use_bin_type=True)
+
+
+def compress(body: bytes, encoding) -> bytes:
+    if encoding == "gzip":
+        # mtime=0: the same body always compresses to the same bytes (stable ETags)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return _brotli.compress(body, quality=BROTLI_QUALITY)
+    return body
+
+
+class Representations:
+    """Every format and encoding of one response, built on first request and kept until
+    the response changes, so a poll costs a dict lookup instead of a serialization and
+    a compression.
+
+    `source` is the cached body, `render` maps a media type to a function producing
+    that format's bytes from it.
+    """
+
+    def __init__(self, source: bytes, status: int, render: dict):
+        self.source = source
+        self.status = status
+        self._render = render
+        self._digest = hashlib.blake2b(source, digest_size=8).hexdigest()
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def matches(self, source: bytes, status: int) -> bool:
+        return status == self.status and (source is self.source or source == self.source)
+
+    def etag(self, media_type: str, encoding) -> str:
+        # one tag per representation: a gzip body must not revalidate an identity one
+        return f"{self._digest}-{media_type.rsplit('/', 1)[-1]}-{encoding or 'identity'}"
+
+    def body(self, media_type: str, encoding) -> tuple:
+        """(bytes, content coding applied or None); small bodies are never compressed."""
+        key = (media_type, encoding)
+        entry = self._bodies.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._bodies.get(key)
+                if entry is None:
+                    raw = self._bodies.get((media_type, None))
+                    if raw is None:
+                        raw = self._bodies[(media_type, None)] = (self._render[media_type](self.source), None)
+                    if encoding is not None and len(raw[0]) >= COMPRESS_MIN_BYTES:
+                        entry = (compress(raw[0], encoding), encoding)
+                    else:
+                        entry = raw
+                    self._bodies[key] = entry
+        return entry
@@ -0,0 +1,69 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# /dev/shm is shared by every gunicorn worker in the container and never hits disk
+_DEFAULT_DIR = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+
+CACHE_DIR = Path(os.getenv("RESPONSE_CACHE_DIR", str(_DEFAULT_DIR / "touchgrass_responses")))
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", "5"))
+
+
+def _path(key: str) -> Path:
+    return CACHE_DIR / hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def get(key: str, ttl: float = CACHE_TTL_SECONDS):
+    path = _path(key)
+    try:
+        if time.time() - path.stat().st_mtime > ttl:
+            return None
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def put(key: str, body: bytes):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _path(key)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix=".tmp_")
+    with os.fdopen(fd, "wb") as f:
+        f.write(body)
+    # rename is atomic, readers see either the old or the new body
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _key_lock(key: str):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(str(_path(key)) + ".lock", "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def cached_response(key: str, build, ttl: float = CACHE_TTL_SECONDS):
+    # build() -> (body_bytes, status); only 200 responses are cached
+    body = get(key, ttl)
+    if body is not None:
+        return body, 200
+
+    if ttl <= 0:
+        return build()
+
+    # one worker rebuilds, the others wait and reuse its result
+    with _key_lock(key):
+        body = get(key, ttl)
+        if body is not None:
+            return body, 200
+
+        body, status = build()
+        if status == 200:
+            put(key, body)
+        return body, status
@@ -0,0 +1,4 @@
+# gunicorn entry point: gunicorn -c frontend/gunicorn.conf.py frontend.wsgi:app
+from frontend.main import app, warm_up
+
+warm_up()
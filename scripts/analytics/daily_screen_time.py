@@ -1,53 +1,86 @@
 from pathlib import Path
+from datetime import datetime, timezone
 import io
+import json
 import pandas as pd
 from minio import Minio
 import os
 import logging
 
+from scripts.load.run_context import resolve_name
+
 LOG = logging.getLogger("analytics")
 
-MINIO_OBJECT_KEY = "silver/screen_time_history.csv" 
+MINIO_OBJECT_KEY = "silver/screen_time_history.csv"
+# one object per device (and one for all devices), so a reader fetches only its series
+ROLLUP_PREFIX = "gold/analytics/screen_time_rollups/"
+
+ALL_DEVICES = "__all__"
+MOVING_AVERAGE_WINDOWS = (7, 28)
+
+_CLIENT = None
 
 
 def _get_minio_client():
+    global _CLIENT
+    if _CLIENT is not None:
+        return _CLIENT
+
     endpoint = os.getenv("MINIO_ENDPOINT")
     access = os.getenv("MINIO_ACCESS_KEY")
     secret = os.getenv("MINIO_SECRET_KEY")
-    
+
     if not access or not secret:
         LOG.error("MinIO Credentials not found in environment variables inside analytics script.")
-    
-    return Minio(endpoint, access_key=access, secret_key=secret, secure=False)
+
+    _CLIENT = Minio(endpoint, access_key=access, secret_key=secret, secure=False)
+    return _CLIENT
 
 def _read_csv_from_minio(bucket_name: str, object_name: str) -> pd.DataFrame:
     client = _get_minio_client()
     try:
         LOG.info(f"Attempting to fetch Bucket: {bucket_name}, Key: {object_name}")
-        
-        resp = client.get_object(bucket_name, object_name)
+
+        resp = client.get_object(bucket_name, resolve_name(client, bucket_name, object_name))
         raw = resp.read()
         resp.close()
         resp.release_conn()
-        
+
         return pd.read_csv(
-            io.BytesIO(raw), 
-            parse_dates=["timestamp_local"], 
+            io.BytesIO(raw),
+            parse_dates=["timestamp_local"],
             keep_default_na=False
         )
     except Exception as exc:
         LOG.error(f"Error reading from MinIO: {exc}")
         return pd.DataFrame()
 
-def compute_daily_trend(last_n_days: int = None):
-    bucket = os.getenv("MINIO_BUCKET", "touchgrass")
 
-    df = _read_csv_from_minio(bucket, MINIO_OBJECT_KEY)
+def rollup_object(device: str = None) -> str:
+    return ROLLUP_PREFIX + f"{device or ALL_DEVICES}.json"
 
-    if df.empty:
-        LOG.warning("DataFrame is empty after MinIO read.")
-        return []
 
+def _read_json_from_minio(bucket_name: str, object_name: str):
+    from minio.error import S3Error
+
+    client = _get_minio_client()
+    try:
+        resp = client.get_object(bucket_name, object_name)
+    except S3Error as exc:
+        if exc.code != "NoSuchKey":
+            LOG.warning(f"Rollup object not available ({object_name}): {exc}")
+        return None
+    except Exception as exc:
+        LOG.warning(f"Rollup object not available ({object_name}): {exc}")
+        return None
+    try:
+        return json.loads(resp.read())
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+def _with_local_date(df: pd.DataFrame):
     if "local_date" not in df.columns or df["local_date"].isnull().all():
         if "timestamp_local" in df.columns:
             df["local_date"] = pd.to_datetime(df["timestamp_local"]).dt.date.astype(str)
@@ -55,7 +88,121 @@ def compute_daily_trend(last_n_days: int = None):
             df["local_date"] = pd.to_datetime(df["timestamp_utc"]).dt.date.astype(str)
         else:
             LOG.error("No timestamp column found in CSV")
+            return None
+    return df
+
+
+def _period_stats(daily: pd.DataFrame, period: pd.Series) -> list:
+    grouped = daily.groupby(period)["minutes_spent"].agg(["max", "mean", "sum"])
+    return [
+        {"period": str(p), "max": int(mx), "avg": round(float(avg), 1), "sum": int(sm)}
+        for p, mx, avg, sm in zip(grouped.index, grouped["max"], grouped["mean"], grouped["sum"])
+    ]
+
+
+def _device_rollup(df: pd.DataFrame) -> dict:
+    # one value per local day (screen time is cumulative within a day, so max is the day total)
+    daily = df.groupby("local_date")["minutes_spent"].agg(["max", "mean", "sum"])
+    daily.index = pd.to_datetime(daily.index)
+    daily = daily.sort_index()
+
+    # calendar-day windows, so gaps in the history do not stretch the average
+    moving = {
+        f"ma_{w}d": daily["max"].rolling(f"{w}D").mean().round(1)
+        for w in MOVING_AVERAGE_WINDOWS
+    }
+
+    daily_rows = []
+    for i, (day, row) in enumerate(daily.iterrows()):
+        entry = {
+            "period": day.date().isoformat(),
+            "max": int(row["max"]),
+            "avg": round(float(row["mean"]), 1),
+            "sum": int(row["sum"]),
+        }
+        for name, series in moving.items():
+            entry[name] = float(series.iloc[i])
+        daily_rows.append(entry)
+
+    per_day = daily["max"].rename("minutes_spent").reset_index()
+    iso = per_day["local_date"].dt.isocalendar()
+    week = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+    month = per_day["local_date"].dt.strftime("%Y-%m")
+
+    return {
+        "daily": daily_rows,
+        "weekly": _period_stats(per_day, week),
+        "monthly": _period_stats(per_day, month),
+    }
+
+
+def build_rollups(df: pd.DataFrame) -> dict:
+    df = _with_local_date(df)
+    if df is None or df.empty:
+        return {"devices": {}}
+
+    df["minutes_spent"] = pd.to_numeric(df["minutes_spent"], errors="coerce").fillna(0)
+
+    devices = {ALL_DEVICES: _device_rollup(df)}
+    if "device" in df.columns:
+        for device, part in df.groupby("device"):
+            if device:
+                devices[str(device)] = _device_rollup(part)
+
+    return {"devices": devices}
+
+
+def write_rollups():
+    from scripts.load.write_to_minio import upload_json_to_minio
+
+    bucket = os.getenv("MINIO_BUCKET", "touchgrass")
+    df = _read_csv_from_minio(bucket, MINIO_OBJECT_KEY)
+
+    rollups = build_rollups(df)
+    generated_at = datetime.now(timezone.utc).isoformat()
+    for device, series in rollups["devices"].items():
+        upload_json_to_minio(
+            object_name=rollup_object(device),
+            data=dict(series, device=device, generated_at=generated_at, source=MINIO_OBJECT_KEY),
+        )
+    print(f"[OK] Screen time rollups for {len(rollups['devices'])} series → {ROLLUP_PREFIX}")
+    return rollups
+
+
+def get_rollup_series(granularity: str = "daily", device: str = None, last_n: int = None):
+    """Rollup rows of one device (all devices without one); None when no rollups are published."""
+    bucket = os.getenv("MINIO_BUCKET", "touchgrass")
+    series = _read_json_from_minio(bucket, rollup_object(device))
+    if series is None:
+        if device and _read_json_from_minio(bucket, rollup_object()) is not None:
+            # published, but the device has no history; never show it other devices' data
             return []
+        return None
+
+    rows = series.get(granularity, [])
+    return rows[-last_n:] if last_n else rows
+
+
+def compute_daily_trend(last_n_days: int = None, device: str = None):
+    # fast path: the series precomputed by the ETL
+    rows = get_rollup_series("daily", device, last_n_days)
+    if rows is not None:
+        return [{"local_date": r["period"], "minutes_spent": r["max"]} for r in rows]
+
+    bucket = os.getenv("MINIO_BUCKET", "touchgrass")
+
+    df = _read_csv_from_minio(bucket, MINIO_OBJECT_KEY)
+
+    if df.empty:
+        LOG.warning("DataFrame is empty after MinIO read.")
+        return []
+
+    df = _with_local_date(df)
+    if df is None:
+        return []
+
+    if device and "device" in df.columns:
+        df = df[df["device"].astype(str) == str(device)]
 
     grouped = df.groupby("local_date")["minutes_spent"].max().reset_index()
     grouped = grouped.sort_values("local_date", ascending=False)
@@ -72,4 +219,4 @@ if __name__ == "__main__":
     BASE_DIR = Path(__file__).resolve().parents[3]
     load_dotenv(BASE_DIR / ".env")
 
-    print(compute_daily_trend(7))
\ No newline at end of file
+    write_rollups()
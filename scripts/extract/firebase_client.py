@@ -0,0 +1,32 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+load_dotenv(BASE_DIR / ".env")
+
+FIREBASE_KEY = os.getenv("FIREBASE_SERVICE_ACCOUNT")
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
+
+_db = None
+
+
+def get_db():
+    # firebase_admin / google-cloud-firestore are slow to import and the app
+    # needs credentials, so both happen on first use instead of at import
+    global _db
+    if _db is not None:
+        return _db
+
+    if not FIREBASE_KEY or not FIREBASE_PROJECT_ID:
+        raise RuntimeError("Firebase env not set (FIREBASE_SERVICE_ACCOUNT / FIREBASE_PROJECT_ID)")
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(FIREBASE_KEY)
+        firebase_admin.initialize_app(cred, {"projectId": FIREBASE_PROJECT_ID})
+
+    _db = firestore.client()
+    return _db
@@ -1,30 +1,11 @@
 from datetime import datetime, timezone
-import os
-import sys
-from dotenv import load_dotenv
-from pathlib import Path
-import firebase_admin
-from firebase_admin import credentials, firestore
+from scripts.extract.firebase_client import get_db
 from scripts.load.write_to_minio import upload_json_to_minio
+from scripts.profiling import span
 
-BASE_DIR = Path(__file__).resolve().parents[2]
-load_dotenv(BASE_DIR / ".env")
-
-FIREBASE_KEY = os.getenv("FIREBASE_SERVICE_ACCOUNT")
-FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
 COLLECTION_NAME = "screen_time_logs"
 LIMIT = 5
 
-if not FIREBASE_KEY or not FIREBASE_PROJECT_ID:
-    print("[ERROR] Firebase env not set", file=sys.stderr)
-    sys.exit(1)
-
-if not firebase_admin._apps:
-    cred = credentials.Certificate(FIREBASE_KEY)
-    firebase_admin.initialize_app(cred, {"projectId": FIREBASE_PROJECT_ID})
-
-db = firestore.client()
-
 
 def normalize_ts(ts):
     if ts is None:
@@ -32,25 +13,29 @@ def normalize_ts(ts):
     return ts.astimezone(timezone.utc).isoformat()
 
 
+def doc_to_record(doc) -> dict:
+    d = doc.to_dict() or {}
+    return {
+        "document_id": doc.id,
+        "device": d.get("device"),
+        "latitude": d.get("latitude"),
+        "longitude": d.get("longitude"),
+        "minutes_spent": d.get("minutes_spent"),
+        "timestamp_utc": normalize_ts(d.get("timestamp"))
+    }
+
+
 def extract_latest_screen_time():
+    from firebase_admin import firestore
+
     query = (
-        db.collection(COLLECTION_NAME)
+        get_db().collection(COLLECTION_NAME)
         .order_by("timestamp", direction=firestore.Query.DESCENDING)
         .limit(LIMIT)
     )
 
-    records = []
-    for doc in query.stream():
-        d = doc.to_dict() or {}
-
-        records.append({
-            "document_id": doc.id,
-            "device": d.get("device"),
-            "latitude": d.get("latitude"),
-            "longitude": d.get("longitude"),
-            "minutes_spent": d.get("minutes_spent"),
-            "timestamp_utc": normalize_ts(d.get("timestamp"))
-        })
+    with span("firestore.stream"):
+        records = [doc_to_record(doc) for doc in query.stream()]
 
     payload = {
         "source": "firebase.firestore",
@@ -1,10 +1,10 @@
 import os
 import json
-import requests
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from pathlib import Path
 
+from scripts.http_client import get_client
 from scripts.load.write_to_minio import upload_json_to_minio
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -25,8 +25,7 @@ def fetch_weather():
         "timezone": "UTC"
     }
 
-    response = requests.get(OPEN_METEO_URL, params=params, timeout=10)
-    response.raise_for_status()
+    response = get_client("open_meteo").get(OPEN_METEO_URL, params=params)
     return response.json()
 
 
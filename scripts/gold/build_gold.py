@@ -1,23 +1,52 @@
-import json
 from pathlib import Path
 from datetime import datetime, timezone
 import os
 import io
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from minio import Minio
 from dotenv import load_dotenv
 
+from scripts.load.run_context import current_run_id, run_metadata
 from scripts.prescriptive.read_silver import (
     get_latest_screen_time,
     get_latest_user_location,
     get_latest_weather,
-    get_places,
+    get_place_catalog,
+    get_crowd_table,
+    get_place_graph,
 )
 from scripts.prescriptive.distance import route_distance_km
-from scripts.prescriptive.priority import compute_priority_score
+from scripts.prescriptive.distance_model import (
+    load_detour_model,
+    save_detour_model,
+    estimate_distances,
+    observe_routes,
+)
+from scripts.prescriptive.priority import compute_priority_scores
+from scripts.prescriptive.prefilter import eligible_mask, distance_mask
+from scripts.prescriptive.crowd import hour_of_week
+from scripts.prescriptive.place_graph import suggest_outings
+from scripts.prescriptive.ranking import top_k_indices
 from scripts.prescriptive.cooldown import is_in_cooldown
+from scripts.prescriptive.cooldown_state import (
+    load_cooldown_state,
+    save_cooldown_state,
+    get_device_state,
+    record_notification,
+)
 from scripts.prescriptive.decide import decide
 from scripts.prescriptive.screen_time import classify_screen_time
+from scripts.prescriptive.rules_loader import get_rules
+from scripts.prescriptive.geo import haversine_km
+from scripts.gold.gold_index import index_entry, append_index
+from scripts.gold.gold_schema import serialize_gold
+from scripts.gold.gold_cache import (
+    load_device_cache,
+    save_device_cache,
+    distance_keys,
+)
 
 
 BASE_DIR = Path(__file__).resolve().parents[3]
@@ -30,6 +59,10 @@ MINIO_BUCKET = os.getenv("MINIO_BUCKET")
 
 GOLD_PREFIX = "gold/recommendations/"
 LATEST_NAME = GOLD_PREFIX + "latest.json"
+DEVICE_PREFIX = GOLD_PREFIX + "devices/"
+
+ROUTE_WORKERS = int(os.getenv("ORS_MAX_CONCURRENCY", "4"))
+REFINE_TOP_K = int(os.getenv("ORS_REFINE_TOP_K", "20"))
 
 
 def _minio_client():
@@ -41,127 +74,323 @@ def _minio_client():
     )
 
 
-def build_and_write_gold(top_n: int = 10):
-    screen = get_latest_screen_time() or {}
-    screen_minutes = int(screen.get("minutes_spent", 0))
-    screen_level = classify_screen_time(screen_minutes)
+def _coord(value):
+    # silver CSVs are read with keep_default_na=False, so a missing coordinate is ""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(value) else value
 
-    loc = get_latest_user_location() or {}
-    weather = get_latest_weather() or {}
-    places_df = get_places()
 
-    user_lat = loc.get("latitude")
-    user_lon = loc.get("longitude")
+def device_latest_name(device) -> str:
+    return DEVICE_PREFIX + f"{device}/latest.json"
 
-    candidates = []
 
-    for _, r in places_df.iterrows():
+def write_gold(gold_payload: dict, device=None) -> str:
+    client = _minio_client()
+    payload = serialize_gold(gold_payload)
+
+    snapshot = GOLD_PREFIX + f"recommendations_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S_%f')}.json"
+    # the shared latest is the most recent build of any device (what the web UI shows);
+    # each device also keeps its own, for clients that ask for one device
+    names = [snapshot, LATEST_NAME] + ([] if device is None else [device_latest_name(device)])
+
+    for name in names:
+        client.put_object(
+            MINIO_BUCKET,
+            name,
+            data=io.BytesIO(payload),
+            length=len(payload),
+            content_type="application/json",
+            metadata=run_metadata(),
+        )
+    return snapshot
+
+
+def _route_distances(origin, place_lat: np.ndarray, place_lon: np.ndarray) -> np.ndarray:
+    # the shared ORS client bounds concurrency and rate, so a pool this size just keeps it busy
+    def route(dest):
         try:
-            place_lat = float(r.get("latitude"))
-            place_lon = float(r.get("longitude"))
+            return route_distance_km(origin, dest)
         except Exception:
-            continue
-
-        if user_lat is not None and user_lon is not None:
-            try:
-                dist_km = route_distance_km(
-                    (user_lat, user_lon),
-                    (place_lat, place_lon),
-                )
-            except Exception:
-                dist_km = None
-        else:
-            dist_km = None
+            return np.nan
+
+    with ThreadPoolExecutor(max_workers=ROUTE_WORKERS) as pool:
+        distances = np.fromiter(
+            pool.map(route, zip(place_lat.tolist(), place_lon.tolist())),
+            dtype=np.float64,
+            count=len(place_lat),
+        )
+
+    failed = int(np.isnan(distances).sum())
+    if failed:
+        print(f"[WARN] {failed}/{len(distances)} routes failed; keeping the offline estimate for those")
+    return distances
+
+
+def _score(places, distances, crowd_levels, weather_category, rules):
+    scores = compute_priority_scores(
+        np.nan_to_num(distances, nan=9999.0),
+        places.category,
+        crowd_levels,
+        weather_category,
+        rules,
+    )
+    # outside min_km / max_km never ranks
+    return np.where(distance_mask(distances, rules), scores, -np.inf)
 
-        candidate_for_scoring = {
-            "distance_km": dist_km if dist_km is not None else 9999.0,
-            "category": r.get("category"),
-            "crowd_level": r.get("crowd_level") or r.get("crowd") or "unknown",
-            "weather": weather.get("weather_category") or "unknown",
-        }
 
-        score = compute_priority_score(candidate_for_scoring)
-
-        candidates.append({
-            "location_id": r.get("location_id"),
-            "location_name": r.get("location_name"),
-            "category": r.get("category"),
-            "address": r.get("address"),
-            "latitude": place_lat,
-            "longitude": place_lon,
-            "distance_km": round(dist_km, 3) if dist_km is not None else None,
-            "priority_score": score,
-            "google_maps_link": r.get("google_maps_link"),
-            "is_active": r.get("is_active"),
-        })
-
-    candidates = [
-        c for c in candidates
-        if str(c.get("is_active")).lower() not in ("false", "0", "none", "")
-    ]
-
-    candidates = sorted(
-        candidates,
-        key=lambda x: x.get("priority_score", 0),
-        reverse=True,
-    )
+def _rank_candidates(places, distances, routed, crowd_levels, scores, top_n):
+    top = top_k_indices(scores, top_n)
+    top = top[np.isfinite(scores[top])]
+
+    candidates = []
+    for i in top.tolist():
+        dist_km = None if np.isnan(distances[i]) else round(float(distances[i]), 3)
+        record = places.record(i, dist_km, float(scores[i])).to_dict()
+        record["distance_source"] = "ors" if not np.isnan(routed[i]) else ("estimate" if dist_km is not None else None)
+        record["crowd_level"] = crowd_levels[i] if isinstance(crowd_levels[i], str) else None
+        candidates.append(record)
+    return candidates
+
+
+def build_and_write_gold(
+    top_n: int = 10,
+    screen=None,
+    loc=None,
+    weather=None,
+    places=None,
+    cooldown_state=None,
+    detour_model=None,
+    index_entries=None,
+    place_manifest=None,
+    crowd_table=None,
+    place_graph=None,
+    now=None,
+    writer=None,
+    device_caches=None,
+    refine_top_k=REFINE_TOP_K,
+):
+    # inputs default to the latest silver rows; the stream daemon passes
+    # per-device rows and shares weather/place catalog/cooldown state/detour model across a batch.
+    # The replay engine also sets now/writer/device_caches so a past tick never touches live state
+    rules = get_rules()
+    now_ts = now or datetime.now(timezone.utc)
+
+    if screen is None:
+        screen = get_latest_screen_time() or {}
+    screen_minutes = int(screen.get("minutes_spent", 0))
+    screen_level = classify_screen_time(screen_minutes, rules)
+
+    if loc is None:
+        loc = get_latest_user_location() or {}
+    if weather is None:
+        weather = get_latest_weather() or {}
 
-    last_location = None
-    if loc.get("latitude") is not None and loc.get("longitude") is not None:
-        last_location = (loc.get("latitude"), loc.get("longitude"))
+    user_lat = _coord(loc.get("latitude"))
+    user_lon = _coord(loc.get("longitude"))
 
     current_location = None
     if user_lat is not None and user_lon is not None:
         current_location = (user_lat, user_lon)
 
-    cooldown_tuple = is_in_cooldown(last_location, current_location, None)
-    cooldown_active = bool(cooldown_tuple[0]) if isinstance(cooldown_tuple, tuple) else bool(cooldown_tuple)
+    if places is None:
+        # only the place shards around the user are loaded
+        places = get_place_catalog(near=current_location, manifest=place_manifest)
+
+    device = screen.get("device") or loc.get("device")
+    weather_category = weather.get("weather_category") or "unknown"
+
+    # precomputed per place and hour-of-week, so crowd scoring is one gather
+    how = hour_of_week(now_ts)
+    if crowd_table is None:
+        crowd_table = get_crowd_table()
+    crowd_levels = crowd_table.levels(places, how) if crowd_table is not None else places.crowd_level
+
+    # rules.yaml filters run as masks over the catalog, so routing and scoring only see
+    # eligible places (inactive / unlocatable ones included)
+    eligible, dropped = eligible_mask(places, rules, weather_category, crowd_levels, current_location)
+    # later outing stops only have to pass the hard rules, not the category preference
+    outing_allowed, _ = eligible_mask(places, rules, weather_category, crowd_levels, current_location,
+                                      apply_preferences=False)
+    catalog, catalog_crowd_levels = places, crowd_levels
+    places = places.subset(eligible)
+    crowd_levels = crowd_levels[eligible]
+
+    # incremental recompute: reuse the device's routed distances while it stays
+    # within reroute_if_move_km, and its ranking while places/rules/weather are unchanged
+    if device_caches is None:
+        cache = load_device_cache(device) or {}
+    else:
+        if device not in device_caches:
+            device_caches[device] = load_device_cache(device) or {}
+        cache = device_caches[device]
+    origin = cache.get("origin")
+    moved_km = None
+    if origin and current_location is not None:
+        moved_km = haversine_km(origin, current_location)
+
+    reuse_distances = moved_km is not None and moved_km <= rules.reroute_km
+    if not reuse_distances:
+        origin = current_location
+
+    keys = distance_keys(places.location_ids, places.latitude, places.longitude)
+    cached_distances = cache.get("distances", {}) if reuse_distances else {}
+    routed = np.array([cached_distances.get(k, np.nan) for k in keys], dtype=np.float64)
+    reused_count = int((~np.isnan(routed)).sum())
+
+    owns_model = detour_model is None
+    if owns_model:
+        detour_model = load_detour_model()
+
+    # rank on offline estimates (haversine × learned detour factor) wherever there is
+    # no routed distance yet; ORS only refines the top-K, so a run makes ≤K calls
+    distances = routed.copy()
+    to_route = np.empty(0, dtype=np.int64)
+    if origin is not None:
+        unrouted = np.isnan(routed)
+        distances[unrouted] = estimate_distances(detour_model, origin, places)[unrouted]
+
+        if refine_top_k:
+            pool = top_k_indices(_score(places, distances, crowd_levels, weather_category, rules), max(top_n, refine_top_k))
+            pool = pool[distance_mask(distances[pool], rules)]
+            to_route = pool[np.isnan(routed[pool])]
+
+    if len(to_route):
+        fresh = _route_distances(origin, places.latitude[to_route], places.longitude[to_route])
+        routed[to_route] = fresh
+        # a failed route keeps its estimate instead of dropping to the bottom
+        distances[to_route] = np.where(np.isnan(fresh), distances[to_route], fresh)
+
+        category_names = np.array(places.categories + [None], dtype=object)
+        observed = observe_routes(
+            detour_model,
+            origin,
+            places.latitude[to_route],
+            places.longitude[to_route],
+            category_names[places.category_codes[to_route]],
+            fresh,
+        )
+        if owns_model and observed:
+            save_detour_model(detour_model)
+
+    # min_km / max_km again on road distances, now that the top of the pool is routed
+    in_range = distance_mask(distances, rules)
+    dropped["min_km"] = int((distances < rules.min_km).sum())
+    dropped["max_km"] += int((distances > rules.max_km).sum())
+
+    ranking_key = {
+        "places": places.fingerprint(),
+        "rules_version": rules.version,
+        "weather_category": weather_category,
+        "top_n": top_n,
+        "detour_model": detour_model["version"],
+        "crowd": [crowd_table.version, how] if crowd_table is not None else None,
+    }
+
+    reuse_ranking = (
+        reuse_distances
+        and not len(to_route)
+        and cache.get("ranking_key") == ranking_key
+    )
+
+    if reuse_ranking:
+        candidates = cache["candidates"]
+    else:
+        scores = _score(places, distances, crowd_levels, weather_category, rules)
+        candidates = _rank_candidates(places, distances, routed, crowd_levels, scores, top_n)
+
+    if device is not None and not reuse_ranking:
+        new_cache = {
+            "origin": list(origin) if origin else None,
+            "distances": {k: float(d) for k, d in zip(keys, routed) if not np.isnan(d)},
+            "ranking_key": ranking_key,
+            "candidates": candidates,
+        }
+        if device_caches is None:
+            save_device_cache(device, new_cache)
+        else:
+            device_caches[device] = new_cache
+
+    # multi-stop outings from the precomputed place graph, no routing calls
+    if place_graph is None:
+        place_graph = get_place_graph()
+    outings = suggest_outings(candidates, catalog, catalog_crowd_levels, outing_allowed, weather_category,
+                              place_graph, rules)
+
+    reused = {
+        "ranking": bool(reuse_ranking),
+        "distances": reused_count,
+        "routed": int(len(to_route)),
+        "estimated": int((np.isnan(routed) & ~np.isnan(distances)).sum()),
+        "moved_km": round(moved_km, 3) if moved_km is not None else None,
+    }
+
+    owns_state = cooldown_state is None
+    if owns_state:
+        cooldown_state = load_cooldown_state()
+    last_notified_at, last_location = get_device_state(cooldown_state, device)
+
+    cooldown_active, cooldown_reason, _ = is_in_cooldown(
+        last_location,
+        current_location,
+        now_ts,
+        last_notified_at,
+        rules,
+    )
 
     decision = decide(
         screen_time_minutes=screen_minutes,
         ranked_candidates=candidates,
         cooldown_active=cooldown_active,
+        rules=rules,
     )
 
+    if decision.get("should_go_out"):
+        record_notification(cooldown_state, device, current_location, now_ts)
+        if owns_state:
+            save_cooldown_state(cooldown_state)
+
     context = {
-        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "generated_at": now_ts.isoformat(),
         "screen_time_minutes": screen_minutes,
         "screen_time_level": screen_level,
         "user_lat": user_lat,
         "user_lon": user_lon,
         "weather_category": weather.get("weather_category"),
         "temperature_c": weather.get("temperature_c"),
+        "device": device,
+        "cooldown_reason": cooldown_reason,
     }
 
     gold_payload = {
-        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "generated_at": now_ts.isoformat(),
+        "run_id": current_run_id(),
+        "rules_version": rules.version,
         "context": context,
         "decision": decision,
-        "recommendations": candidates[:top_n],
+        "reused": reused,
+        "filters": {"eligible": int(in_range.sum()), "dropped": dropped},
+        "sorted": True,
+        "recommendations": candidates,
+        "outings": outings,
     }
 
-    client = _minio_client()
-    payload = json.dumps(gold_payload).encode("utf-8")
-
-    client.put_object(
-        MINIO_BUCKET,
-        LATEST_NAME,
-        data=io.BytesIO(payload),
-        length=len(payload),
-        content_type="application/json",
-    )
+    snapshot = (writer or write_gold)(gold_payload, device)
 
-    timestamped = GOLD_PREFIX + f"recommendations_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.json"
-    client.put_object(
-        MINIO_BUCKET,
-        timestamped,
-        data=io.BytesIO(payload),
-        length=len(payload),
-        content_type="application/json",
-    )
+    # batch callers collect index rows and append them once
+    entry = index_entry(gold_payload, snapshot)
+    if index_entries is None:
+        append_index([entry])
+    else:
+        index_entries.append(entry)
 
     return gold_payload
 
 
 if __name__ == "__main__":
+    from scripts.http_client import all_metrics
+
     print(build_and_write_gold())
+    print(f"[HTTP] {all_metrics()}")
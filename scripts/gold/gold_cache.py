@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from scripts.load.write_to_minio import upload_json_to_minio, read_json_from_minio
+
+CACHE_PREFIX = "gold/cache/devices/"
+
+
+def _cache_object(device) -> str:
+    return CACHE_PREFIX + f"{device}/ranking.json"
+
+
+def load_device_cache(device):
+    if device is None:
+        return None
+    return read_json_from_minio(_cache_object(device))
+
+
+def save_device_cache(device, cache: dict):
+    if device is None:
+        return
+    cache["updated_at"] = datetime.now(timezone.utc).isoformat()
+    upload_json_to_minio(object_name=_cache_object(device), data=cache)
+
+
+def distance_keys(location_ids, lat: np.ndarray, lon: np.ndarray) -> list:
+    # coordinates are part of the key so an edited place is routed again
+    return [f"{i}:{a:.5f},{b:.5f}" for i, a, b in zip(location_ids, lat, lon)]
@@ -0,0 +1,186 @@
+import argparse
+import io
+import json
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from scripts.load.run_context import run_metadata
+from scripts.load.write_to_minio import MINIO_BUCKET, get_client
+
+INDEX_PREFIX = "gold/index/"
+COMPACT_NAME = "index.ndjson"
+SNAPSHOT_PREFIX = "gold/recommendations/recommendations_"
+
+# one NDJSON row per gold run; a day's rows live under gold/index/date=YYYY-MM-DD/
+# as small append-only parts until compaction folds them into index.ndjson
+
+
+def _day_prefix(day, prefix: str = INDEX_PREFIX) -> str:
+    return f"{prefix}date={day.isoformat()}/"
+
+
+def _parse_ts(value) -> datetime:
+    ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return _utc(ts)
+
+
+def _utc(ts: datetime) -> datetime:
+    # partitions are UTC dates, so every date is taken in UTC
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def index_entry(payload: dict, snapshot: str = None) -> dict:
+    ctx = payload.get("context", {})
+    decision = payload.get("decision", {})
+    return {
+        "ts": payload.get("generated_at"),
+        "device": ctx.get("device"),
+        "should_go_out": bool(decision.get("should_go_out")),
+        "reason": decision.get("reason"),
+        "score": decision.get("score"),
+        "screen_time_minutes": ctx.get("screen_time_minutes"),
+        "weather_category": ctx.get("weather_category"),
+        "rules_version": payload.get("rules_version"),
+        "snapshot": snapshot,
+        "top": [[r.get("location_id"), r.get("priority_score")] for r in payload.get("recommendations", [])],
+    }
+
+
+def _put_lines(object_name: str, rows: list):
+    body = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in rows).encode("utf-8")
+    get_client().put_object(
+        MINIO_BUCKET,
+        object_name,
+        data=io.BytesIO(body),
+        length=len(body),
+        content_type="application/x-ndjson",
+        metadata=run_metadata(),
+    )
+
+
+def _read_lines(object_name: str) -> list:
+    resp = get_client().get_object(MINIO_BUCKET, object_name)
+    try:
+        return [json.loads(line) for line in resp.read().decode("utf-8").splitlines() if line]
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+def append_index(entries: list, prefix: str = INDEX_PREFIX):
+    """Write entries as one new part per day; never rewrites existing objects."""
+    by_day = {}
+    for entry in entries:
+        by_day.setdefault(_parse_ts(entry["ts"]).date(), []).append(entry)
+
+    for day, rows in by_day.items():
+        rows.sort(key=lambda r: r["ts"])
+        # first/last time in the name lets queries skip parts outside the range without reading them
+        first = _parse_ts(rows[0]["ts"]).strftime("%H%M%S%f")
+        last = _parse_ts(rows[-1]["ts"]).strftime("%H%M%S%f")
+        _put_lines(_day_prefix(day, prefix) + f"part_{first}_{last}_{uuid.uuid4().hex[:8]}.ndjson", rows)
+
+
+def _part_bounds(name: str, day):
+    stem = name.rsplit("/", 1)[-1]
+    if not stem.startswith("part_"):
+        return None
+    _, first, last, _ = stem.split("_", 3)
+    base = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+    def at(hhmmss):
+        return base + timedelta(hours=int(hhmmss[0:2]), minutes=int(hhmmss[2:4]),
+                                seconds=int(hhmmss[4:6]), microseconds=int(hhmmss[6:]))
+
+    return at(first), at(last)
+
+
+def query_index(start: datetime, end: datetime, device: str = None, limit: int = None) -> list:
+    """Rows with start <= ts < end, oldest first; only the days (and parts) in range are read."""
+    client = get_client()
+    rows = {}
+    start, end = _utc(start), _utc(end)
+
+    day = start.date()
+    while day <= end.date():
+        for obj in client.list_objects(MINIO_BUCKET, prefix=_day_prefix(day), recursive=True):
+            bounds = _part_bounds(obj.object_name, day)
+            if bounds and (bounds[1] < start or bounds[0] >= end):
+                continue
+            for row in _read_lines(obj.object_name):
+                ts = _parse_ts(row["ts"])
+                if start <= ts < end and (device is None or str(row.get("device")) == str(device)):
+                    rows[(row["ts"], row.get("device"))] = row
+        day += timedelta(days=1)
+
+    rows = sorted(rows.values(), key=lambda r: r["ts"])
+    return rows[-limit:] if limit else rows
+
+
+def compact_day(day) -> int:
+    """Fold a day's parts into index.ndjson, so past days are a single read."""
+    client = get_client()
+    prefix = _day_prefix(day)
+    names = [o.object_name for o in client.list_objects(MINIO_BUCKET, prefix=prefix, recursive=True)]
+    parts = [n for n in names if n.rsplit("/", 1)[-1].startswith("part_")]
+    if not parts:
+        return 0
+
+    rows = []
+    if prefix + COMPACT_NAME in names:
+        rows.extend(_read_lines(prefix + COMPACT_NAME))
+    for name in parts:
+        rows.extend(_read_lines(name))
+    rows.sort(key=lambda r: r["ts"])
+
+    # the compacted file is written before the parts go away, so a row is never missing;
+    # a query in between may read it twice, which query_index dedupes
+    _put_lines(prefix + COMPACT_NAME, rows)
+    for name in parts:
+        client.remove_object(MINIO_BUCKET, name)
+
+    print(f"[OK] Compacted {len(parts)} index parts for {day.isoformat()} ({len(rows)} rows)")
+    return len(parts)
+
+
+def compact_before(day):
+    """Compact every day older than `day` that still has parts."""
+    days = set()
+    for obj in get_client().list_objects(MINIO_BUCKET, prefix=INDEX_PREFIX, recursive=True):
+        segment = obj.object_name[len(INDEX_PREFIX):].split("/", 1)[0]
+        if segment.startswith("date=") and obj.object_name.rsplit("/", 1)[-1].startswith("part_"):
+            days.add(datetime.strptime(segment[5:], "%Y-%m-%d").date())
+    for d in sorted(days):
+        if d < day:
+            compact_day(d)
+
+
+def backfill_from_snapshots():
+    """Index the recommendations_<ts>.json snapshots written before the index existed."""
+    from scripts.gold.gold_schema import expand_gold
+    from scripts.load.write_to_minio import read_json_from_minio
+
+    entries = []
+    for obj in get_client().list_objects(MINIO_BUCKET, prefix=SNAPSHOT_PREFIX, recursive=True):
+        payload = expand_gold(read_json_from_minio(obj.object_name))
+        if payload and payload.get("generated_at"):
+            entries.append(index_entry(payload, obj.object_name))
+
+    append_index(entries)
+    print(f"[OK] Indexed {len(entries)} existing gold snapshots")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the gold recommendations index")
+    parser.add_argument("--backfill", action="store_true", help="index existing gold snapshots")
+    parser.add_argument("--compact", action="store_true", help="compact index parts of past days")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_from_snapshots()
+    if args.compact or not args.backfill:
+        compact_before(datetime.now(timezone.utc).date())
+
+
+if __name__ == "__main__":
+    main()
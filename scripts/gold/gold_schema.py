@@ -0,0 +1,247 @@
+import json
+import os
+
+# layout of the gold documents written to MinIO; 1 writes the verbose layout (rollback)
+GOLD_SCHEMA = int(os.getenv("GOLD_SCHEMA", "2"))
+SCHEMAS = (1, 2)
+
+# enum tables of schema 2: values are stored as their index. Append only, never
+# reorder: old documents are decoded with the current tables. A value missing from
+# its table is stored as the plain string, so new labels never break the writer.
+SCREEN_TIME_LEVELS = ("low", "medium", "high", "critical")
+WEATHER_CATEGORIES = ("clear", "cloudy", "rain", "storm", "unknown")
+DECISION_REASONS = ("cooldown_active", "screen_time_too_low", "no_candidates", "viable_location")
+COOLDOWN_REASONS = ("outside_active_hours", "recently_notified", "user_not_moved")
+DISTANCE_SOURCES = ("ors", "estimate")
+CROWD_LEVELS = ("low", "medium", "high")
+
+# decimals kept per field: 7 is the precision of the catalog coordinates (so maps
+# links stay derivable), the rest is well below what any reader looks at
+COORD_DECIMALS = 7
+USER_COORD_DECIMALS = 6
+KM_DECIMALS = 3
+SCORE_DECIMALS = 4
+TEMPERATURE_DECIMALS = 1
+
+PLACE_FIELDS = ("location_id", "location_name", "category", "address", "latitude", "longitude",
+                "google_maps_link", "is_active")
+
+
+def maps_link(lat, lon) -> str:
+    return f"http://maps.google.com/?q={lat},{lon}"
+
+
+def _round(value, decimals):
+    return None if value is None else round(float(value), decimals)
+
+
+def _code(table: tuple, value):
+    if value is None:
+        return None
+    try:
+        return table.index(value)
+    except ValueError:
+        return value
+
+
+def _label(table: tuple, code):
+    return table[code] if isinstance(code, int) and 0 <= code < len(table) else code
+
+
+class _Encoder:
+    """Shared string table and place table of one schema 2 document."""
+
+    def __init__(self):
+        self.strings = []
+        self._string_ids = {}
+        self.places = {key: [] for key in ("id", "n", "c", "a", "lat", "lon", "g", "act")}
+        self._place_ids = {}
+
+    def string(self, value):
+        if value is None:
+            return None
+        i = self._string_ids.get(value)
+        if i is None:
+            i = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return i
+
+    def place(self, record: dict) -> int:
+        key = tuple(record.get(f) for f in PLACE_FIELDS)
+        i = self._place_ids.get(key)
+        if i is not None:
+            return i
+
+        i = self._place_ids[key] = len(self.places["id"])
+        lat = _round(record.get("latitude"), COORD_DECIMALS)
+        lon = _round(record.get("longitude"), COORD_DECIMALS)
+        link = record.get("google_maps_link")
+        # the usual link is rebuilt from the coordinates on read (None); -1 is no link
+        derivable = lat is not None and lon is not None and link == maps_link(lat, lon)
+        active = record.get("is_active")
+
+        self.places["id"].append(record.get("location_id"))
+        self.places["n"].append(self.string(record.get("location_name")))
+        self.places["c"].append(self.string(record.get("category")))
+        self.places["a"].append(self.string(record.get("address")))
+        self.places["lat"].append(lat)
+        self.places["lon"].append(lon)
+        self.places["g"].append(None if derivable else (-1 if link is None else self.string(link)))
+        self.places["act"].append(None if active is None else int(bool(active)))
+        return i
+
+    def ranked(self, records: list, source_key: str) -> dict:
+        # columnar: one list per field instead of one object per record
+        return {
+            "p": [self.place(r) for r in records],
+            "km": [_round(r.get("distance_km"), KM_DECIMALS) for r in records],
+            "s": [_round(r.get("priority_score"), SCORE_DECIMALS) for r in records],
+            "src": [_code(DISTANCE_SOURCES, r.get(source_key)) for r in records],
+            "cr": [_code(CROWD_LEVELS, r.get("crowd_level")) for r in records],
+        }
+
+
+def compact_gold(payload: dict) -> dict:
+    """Schema 2 form of a gold payload: enum codes, one string table, one place table
+    referenced by the recommendations and outings, rounded floats, and no fields
+    that repeat or derive from others (context.generated_at, default maps links)."""
+    enc = _Encoder()
+    ctx = payload.get("context") or {}
+    decision = payload.get("decision") or {}
+
+    recs = enc.ranked(payload.get("recommendations") or [], "distance_source")
+    outings = []
+    for outing in payload.get("outings") or []:
+        stops = enc.ranked(outing.get("stops") or [], "leg_source")
+        stops.pop("cr")
+        stops["tk"] = outing.get("total_km")
+        stops["sc"] = outing.get("score")
+        outings.append(stops)
+
+    dec = {
+        "go": int(bool(decision.get("should_go_out"))),
+        "r": _code(DECISION_REASONS, decision.get("reason")),
+        "cd": int(bool(decision.get("cooldown"))),
+    }
+    if "score" in decision:
+        dec["s"] = _round(decision["score"], SCORE_DECIMALS)
+
+    doc = {
+        "schema": 2,
+        "generated_at": payload.get("generated_at"),
+        "run_id": payload.get("run_id"),
+        "rules_version": payload.get("rules_version"),
+        "ctx": {
+            "st": ctx.get("screen_time_minutes"),
+            "sl": _code(SCREEN_TIME_LEVELS, ctx.get("screen_time_level")),
+            "lat": _round(ctx.get("user_lat"), USER_COORD_DECIMALS),
+            "lon": _round(ctx.get("user_lon"), USER_COORD_DECIMALS),
+            "wc": _code(WEATHER_CATEGORIES, ctx.get("weather_category")),
+            "tc": _round(ctx.get("temperature_c"), TEMPERATURE_DECIMALS),
+            "dev": ctx.get("device"),
+            "cr": _code(COOLDOWN_REASONS, ctx.get("cooldown_reason")),
+        },
+        "dec": dec,
+        "reused": payload.get("reused"),
+        "filters": payload.get("filters"),
+        "sorted": payload.get("sorted", False),
+        "str": enc.strings,
+        "pl": enc.places,
+        "rec": recs,
+        "out": outings,
+    }
+    if ctx.get("generated_at") not in (None, payload.get("generated_at")):
+        doc["ctx"]["ts"] = ctx["generated_at"]
+    return doc
+
+
+def _place_records(doc: dict) -> list:
+    strings = doc.get("str") or []
+    pl = doc.get("pl") or {}
+
+    def s(i):
+        return strings[i] if i is not None and i >= 0 else None
+
+    records = []
+    for i in range(len(pl.get("id", []))):
+        lat, lon, link, active = pl["lat"][i], pl["lon"][i], pl["g"][i], pl["act"][i]
+        records.append({
+            "location_id": pl["id"][i],
+            "location_name": s(pl["n"][i]),
+            "category": s(pl["c"][i]),
+            "address": s(pl["a"][i]),
+            "latitude": lat,
+            "longitude": lon,
+            "google_maps_link": maps_link(lat, lon) if link is None else s(link),
+            "is_active": None if active is None else bool(active),
+        })
+    return records
+
+
+def _expand_ranked(columns: dict, places: list, source_key: str) -> list:
+    out = []
+    for j, p in enumerate(columns.get("p", [])):
+        record = dict(places[p])
+        record["distance_km"] = columns["km"][j]
+        record["priority_score"] = columns["s"][j]
+        record[source_key] = _label(DISTANCE_SOURCES, columns["src"][j])
+        if "cr" in columns:
+            record["crowd_level"] = _label(CROWD_LEVELS, columns["cr"][j])
+        out.append(record)
+    return out
+
+
+def expand_gold(doc: dict) -> dict:
+    """The verbose (schema 1) payload of a gold document of any schema."""
+    if not doc or doc.get("schema", 1) == 1:
+        return doc
+    if doc["schema"] not in SCHEMAS:
+        raise RuntimeError(f"Unsupported gold schema {doc['schema']!r} (known: {SCHEMAS})")
+
+    places = _place_records(doc)
+    ctx = doc.get("ctx") or {}
+    dec = doc.get("dec") or {}
+
+    decision = {
+        "should_go_out": bool(dec.get("go")),
+        "reason": _label(DECISION_REASONS, dec.get("r")),
+        "cooldown": bool(dec.get("cd")),
+    }
+    if "s" in dec:
+        decision["score"] = dec["s"]
+
+    return {
+        "generated_at": doc.get("generated_at"),
+        "run_id": doc.get("run_id"),
+        "rules_version": doc.get("rules_version"),
+        "context": {
+            "generated_at": ctx.get("ts", doc.get("generated_at")),
+            "screen_time_minutes": ctx.get("st"),
+            "screen_time_level": _label(SCREEN_TIME_LEVELS, ctx.get("sl")),
+            "user_lat": ctx.get("lat"),
+            "user_lon": ctx.get("lon"),
+            "weather_category": _label(WEATHER_CATEGORIES, ctx.get("wc")),
+            "temperature_c": ctx.get("tc"),
+            "device": ctx.get("dev"),
+            "cooldown_reason": _label(COOLDOWN_REASONS, ctx.get("cr")),
+        },
+        "decision": decision,
+        "reused": doc.get("reused"),
+        "filters": doc.get("filters"),
+        "sorted": doc.get("sorted", False),
+        "recommendations": _expand_ranked(doc.get("rec") or {}, places, "distance_source"),
+        "outings": [
+            {"stops": _expand_ranked(o, places, "leg_source"), "total_km": o.get("tk"), "score": o.get("sc")}
+            for o in doc.get("out") or []
+        ],
+    }
+
+
+def serialize_gold(payload: dict, schema: int = None) -> bytes:
+    """Bytes stored in MinIO for a gold payload, in GOLD_SCHEMA unless given."""
+    schema = GOLD_SCHEMA if schema is None else schema
+    if schema not in SCHEMAS:
+        raise RuntimeError(f"GOLD_SCHEMA must be one of {SCHEMAS} (got {schema})")
+    if schema == 1:
+        return json.dumps(payload).encode("utf-8")
+    return json.dumps(compact_gold(payload), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,304 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from scripts.profiling import span
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+load_dotenv(BASE_DIR / ".env")
+
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "4"))
+TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_CAP_SECONDS = float(os.getenv("HTTP_BACKOFF_CAP_SECONDS", "30"))
+BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("HTTP_BREAKER_RESET_SECONDS", "30"))
+
+# provider defaults: ORS free plan allows 40 directions requests / minute
+PROVIDERS = {
+    "ors": {
+        "base_url": os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org"),
+        "rate_per_minute": float(os.getenv("ORS_RATE_PER_MINUTE", "40")),
+        "burst": int(os.getenv("ORS_BURST", "5")),
+        "max_concurrency": int(os.getenv("ORS_MAX_CONCURRENCY", "4")),
+    },
+    "open_meteo": {
+        "base_url": "",
+        "rate_per_minute": float(os.getenv("OPEN_METEO_RATE_PER_MINUTE", "600")),
+        "burst": int(os.getenv("OPEN_METEO_BURST", "10")),
+        "max_concurrency": int(os.getenv("OPEN_METEO_MAX_CONCURRENCY", "2")),
+    },
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; acquire() blocks until one is free."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause_until(self, monotonic_ts: float):
+        # provider says the window is spent: hold every caller until it resets
+        with self._lock:
+            self._paused_until = max(self._paused_until, monotonic_ts)
+            self._tokens = 0.0
+
+    def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return waited
+                    delay = (1.0 - self._tokens) / self.rate
+                else:
+                    self._updated = self._paused_until
+                    delay = self._paused_until - now
+            time.sleep(delay)
+            waited += delay
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one probe through after `reset_seconds`."""
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        # thread that holds the half-open probe slot, None when the slot is free
+        self._probe = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probe is not None:
+                    return False
+                self._probe = threading.get_ident()
+                return True
+            return self.state == "closed"
+
+    def release(self):
+        # a probe that ended without an outcome (e.g. an unexpected exception) frees the slot
+        with self._lock:
+            if self._probe == threading.get_ident():
+                self._probe = None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe = None
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe = None
+            if self.state == "half_open" or self._failures >= self.threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def record_rate_limited(self):
+        # a 429 is not a health signal while closed, but a rate-limited probe proves nothing
+        with self._lock:
+            if self.state == "half_open":
+                self._probe = None
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # ORS: x-ratelimit-remaining / x-ratelimit-reset (epoch seconds of the window reset)
+    if response.headers.get("x-ratelimit-remaining") == "0":
+        reset = response.headers.get("x-ratelimit-reset")
+        if reset:
+            try:
+                return max(0.0, float(reset) - time.time())
+            except ValueError:
+                pass
+    return None
+
+
+class HttpClient:
+    """Keep-alive session with rate limiting, bounded concurrency, retries and a circuit breaker."""
+
+    def __init__(self, name: str, base_url: str = "", rate_per_minute: float = 60,
+                 burst: int = 5, max_concurrency: int = 4, max_retries: int = MAX_RETRIES,
+                 timeout: float = TIMEOUT_SECONDS):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._session = None
+        self._session_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "circuit_rejected": 0,
+            "throttle_wait_s": 0.0,
+            "latency_total_s": 0.0,
+            "latency_max_s": 0.0,
+        }
+
+    def _get_session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                # retries are handled here, not by urllib3
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def _count(self, **values):
+        with self._metrics_lock:
+            for key, value in values.items():
+                self._metrics[key] += value
+
+    def _url(self, path: str) -> str:
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method: str, path: str, **kwargs):
+        import requests
+
+        kwargs.setdefault("timeout", self.timeout)
+        url = self._url(path)
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count(circuit_rejected=1)
+                raise CircuitOpenError(f"{self.name}: circuit open, not calling {url}")
+
+            try:
+                waited = self.bucket.acquire()
+                response, error = None, None
+                with self._slots:
+                    started = time.monotonic()
+                    try:
+                        with span(f"http.{self.name}"):
+                            response = self._get_session().request(method, url, **kwargs)
+                    except (requests.ConnectionError, requests.Timeout) as exc:
+                        error = exc
+                    elapsed = time.monotonic() - started
+
+                self._count(requests=1, throttle_wait_s=waited, latency_total_s=elapsed)
+                with self._metrics_lock:
+                    self._metrics["latency_max_s"] = max(self._metrics["latency_max_s"], elapsed)
+
+                retry_after = None
+                if response is not None:
+                    retry_after = _retry_after_seconds(response)
+                    if retry_after is not None and response.headers.get("x-ratelimit-remaining") == "0":
+                        self.bucket.pause_until(time.monotonic() + retry_after)
+
+                    if response.status_code not in RETRY_STATUS:
+                        # 4xx other than 429 is the caller's problem, not the provider's health
+                        self.breaker.record_success()
+                        response.raise_for_status()
+                        return response
+
+                    if response.status_code == 429:
+                        self._count(rate_limited=1)
+                        self.breaker.record_rate_limited()
+                    else:
+                        self.breaker.record_failure()
+                else:
+                    self.breaker.record_failure()
+
+                if attempt == self.max_retries:
+                    self._count(failures=1)
+                    if error is not None:
+                        raise error
+                    response.raise_for_status()
+            finally:
+                self.breaker.release()
+
+            # full jitter, unless the provider said exactly how long to wait
+            backoff = min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+            delay = retry_after if retry_after is not None else random.uniform(0, backoff)
+            self._count(retries=1)
+            time.sleep(min(delay, BACKOFF_CAP_SECONDS))
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        m["latency_avg_ms"] = round(1000 * m["latency_total_s"] / m["requests"], 1) if m["requests"] else None
+        m["latency_max_ms"] = round(1000 * m.pop("latency_max_s"), 1)
+        m["throttle_wait_s"] = round(m["throttle_wait_s"], 3)
+        m.pop("latency_total_s")
+        m["circuit"] = self.breaker.state
+        return m
+
+
+def get_client(provider: str) -> HttpClient:
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(provider)
+        if client is None:
+            if provider not in PROVIDERS:
+                raise RuntimeError(f"Unknown HTTP provider: {provider}")
+            client = HttpClient(provider, **PROVIDERS[provider])
+            _CLIENTS[provider] = client
+        return client
+
+
+def all_metrics() -> dict:
+    with _CLIENTS_LOCK:
+        return {name: client.metrics() for name, client in _CLIENTS.items()}
@@ -0,0 +1,88 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# cold import budget per entry point, in milliseconds (python -X importtime, best of --repeat runs)
+BUDGETS_MS = {
+    "frontend.main": 200,
+    "scripts.extract.firebase_data": 40,
+    "scripts.extract.firebase_history_extract": 40,
+    "scripts.extract.open_meteo_weather": 120,
+    "scripts.extract.raw_places_loader": 40,
+    "scripts.prescriptive.distance": 25,
+    "scripts.transform.split_user_activity": 550,
+    "scripts.transform.history_to_silver": 550,
+    "scripts.transform.weather_to_silver": 550,
+    "scripts.transform.places_upsert": 550,
+    "scripts.analytics.daily_screen_time": 550,
+    "scripts.gold.build_gold": 600,
+    "scripts.stream.daemon": 400,
+}
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    # the report is post-order: a module's direct imports are the depth-1
+    # lines just before its own depth-0 line
+    total_us = 0
+    children, pending = {}, {}
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)) // 2, m.group(4)
+        if depth == 1:
+            pending[name] = cumulative
+        elif depth == 0:
+            if name == module:
+                total_us, children = cumulative, pending
+            pending = {}
+
+    return {"total_ms": total_us / 1000, "children": children}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold import time per entry point against its budget")
+    parser.add_argument("modules", nargs="*", help="entry points to check (default: all budgeted)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="heaviest direct imports to list")
+    args = parser.parse_args()
+
+    modules = args.modules or list(BUDGETS_MS)
+    over = []
+
+    for module in modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["total_ms"])
+        budget = BUDGETS_MS.get(module)
+
+        status = "OK" if budget is None or best["total_ms"] <= budget else "OVER"
+        if status == "OVER":
+            over.append(module)
+
+        budget_text = f"{budget} ms" if budget is not None else "no budget"
+        print(f"[{status}] {module}: {best['total_ms']:.0f} ms ({budget_text})")
+
+        # direct imports of the entry point: where its cold start goes
+        heaviest = sorted(best["children"].items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+        for name, us in heaviest:
+            print(f"        {us / 1000:7.1f} ms  {name}")
+
+    if over:
+        raise SystemExit(f"Import budget exceeded: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import io
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+STAGE_PREFIX = "staging/"
+COMMIT_OBJECT = "state/etl_commit.json"
+LEASE_PREFIX = "state/locks/"
+
+LEASE_SECONDS = int(os.getenv("ETL_LEASE_SECONDS", "1800"))
+LOCK_DIR = Path(os.getenv("ETL_LOCK_DIR", "/tmp"))
+LEASE_POLL_SECONDS = 15.0
+
+# objects only the batch ETL rewrites in place. During a run (ETL_STAGE=1) they are
+# written under staging/<run_id>/ and copied over the live names once every step has
+# succeeded, in this order: silver data before the manifest / pointer that references
+# it, gold analytics after silver, watermarks last so they only advance when the data
+# they describe is live. Objects the stream daemon also upserts (silver
+# screen_time/user_location, gold latest, cooldown, device caches) stay live; run_etl
+# builds gold only after the commit, so it never reads uncommitted silver.
+STAGED_OBJECTS = (
+    "silver/weather.csv",
+    "silver/screen_time_history.csv",
+    "silver/places/",
+    "silver/places/manifest.json",
+    "silver/places_snapshot/CURRENT.json",
+    "silver/crowd/",
+    "silver/place_graph/",
+    "gold/analytics/",
+    "state/crowd_presence.json",
+    "state/watermarks/",
+)
+# staging/<run_id>/.removed/<name>: a live object the run deletes on commit
+REMOVED_MARKER = ".removed/"
+
+_RUN_ID = os.getenv("ETL_RUN_ID")
+
+
+def new_run_id() -> str:
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def current_run_id() -> str:
+    """Run id handed down by run_etl (ETL_RUN_ID), or one per process for standalone runs."""
+    global _RUN_ID
+    if _RUN_ID is None:
+        _RUN_ID = new_run_id()
+    return _RUN_ID
+
+
+def run_metadata() -> dict:
+    # stored as x-amz-meta-run-id on every object the run writes
+    return {"run-id": current_run_id()}
+
+
+def staging_active() -> bool:
+    return os.getenv("ETL_STAGE", "0") == "1" and bool(os.getenv("ETL_RUN_ID"))
+
+
+def _stage_rank(object_name: str):
+    # the longest matching prefix, so an exact name can be ordered after its directory
+    ranks = [(len(prefix), rank) for rank, prefix in enumerate(STAGED_OBJECTS) if object_name.startswith(prefix)]
+    return max(ranks)[1] if ranks else None
+
+
+def staged_name(object_name: str) -> str:
+    """Where a write to `object_name` goes in the current run."""
+    if staging_active() and _stage_rank(object_name) is not None:
+        return f"{STAGE_PREFIX}{current_run_id()}/{object_name}"
+    return object_name
+
+
+def resolve_name(client, bucket: str, object_name: str) -> str:
+    """Where to read `object_name` from: this run's staged copy if it wrote one, else the live object."""
+    from minio.error import S3Error
+
+    staged = staged_name(object_name)
+    if staged == object_name:
+        return object_name
+    try:
+        client.stat_object(bucket, staged)
+        return staged
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return object_name
+        raise
+
+
+def stage_removal(client, bucket: str, object_name: str) -> bool:
+    """Delete `object_name` now, or on commit when the current run stages it. True if deferred."""
+    if staged_name(object_name) == object_name:
+        client.remove_object(bucket, object_name)
+        return False
+    marker = f"{STAGE_PREFIX}{current_run_id()}/{REMOVED_MARKER}{object_name}"
+    client.put_object(bucket, marker, data=io.BytesIO(b""), length=0, metadata=run_metadata())
+    return True
+
+
+def _staged_listing(client, bucket: str, run_id: str) -> list:
+    prefix = f"{STAGE_PREFIX}{run_id}/"
+    return [o.object_name for o in client.list_objects(bucket, prefix=prefix, recursive=True)]
+
+
+def staged_objects(client, bucket: str, run_id: str) -> list:
+    prefix = f"{STAGE_PREFIX}{run_id}/"
+    pairs = [(name[len(prefix):], name) for name in _staged_listing(client, bucket, run_id)]
+    pairs = [(live, name) for live, name in pairs if not live.startswith(REMOVED_MARKER)]
+    return sorted(pairs, key=lambda pair: (_stage_rank(pair[0]), pair[0]))
+
+
+def staged_removals(client, bucket: str, run_id: str) -> list:
+    prefix = f"{STAGE_PREFIX}{run_id}/{REMOVED_MARKER}"
+    return sorted(name[len(prefix):] for name in _staged_listing(client, bucket, run_id) if name.startswith(prefix))
+
+
+def commit_staged(client, bucket: str, run_id: str) -> list:
+    """Copy a run's staged objects over the live ones (server-side), apply its deletions
+    and record the commit.
+
+    Each copy replaces its object atomically, but the set is not published at once: a
+    reader during the copies (a few server-side requests) can see some of this run's
+    objects next to older ones. The order in STAGED_OBJECTS keeps every manifest and
+    pointer behind the data it references. A single pointer resolved by every reader
+    would close that window, but the daemon writes most of the same names live.
+    """
+    from minio.commonconfig import CopySource
+
+    committed = []
+    for live, staged in staged_objects(client, bucket, run_id):
+        client.copy_object(bucket, live, CopySource(bucket, staged))
+        committed.append(live)
+
+    removed = staged_removals(client, bucket, run_id)
+    for name in removed:
+        client.remove_object(bucket, name)
+
+    record = json.dumps({
+        "run_id": run_id,
+        "committed_at": datetime.now(timezone.utc).isoformat(),
+        "objects": committed,
+        "removed": removed,
+    }, indent=2).encode("utf-8")
+    client.put_object(bucket, COMMIT_OBJECT, data=io.BytesIO(record), length=len(record),
+                      content_type="application/json", metadata={"run-id": run_id})
+
+    discard_staged(client, bucket, run_id)
+    return committed
+
+
+def discard_staged(client, bucket: str, run_id: str) -> int:
+    names = _staged_listing(client, bucket, run_id)
+    for name in names:
+        client.remove_object(bucket, name)
+    return len(names)
+
+
+class RunLease:
+    """Exclusive right to run a job, so an overlapping cron tick skips (or waits) instead
+    of running on top of the previous one.
+
+    Two layers: an flock on a local file (atomic, released by the kernel if the process
+    dies) and a lease object in MinIO with an expiry, renewed by a heartbeat, for runs on
+    other hosts. MinIO has no conditional put, so the lease is written and read back;
+    two hosts racing inside the same instant are only caught by the read-back.
+    """
+
+    def __init__(self, name: str, run_id: str, client, bucket: str, seconds: int = LEASE_SECONDS):
+        self.name = name
+        self.run_id = run_id
+        self.client = client
+        self.bucket = bucket
+        self.seconds = seconds
+        self.object_name = f"{LEASE_PREFIX}{name}.json"
+        self.blocked_by = None
+        self.lost = False
+        self._fd = None
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    # ---- local lock ----
+
+    def _lock_file(self) -> bool:
+        import fcntl
+
+        LOCK_DIR.mkdir(parents=True, exist_ok=True)
+        fd = os.open(LOCK_DIR / f"touchgrass_{self.name}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{self.run_id} {os.getpid()}\n".encode("utf-8"))
+        self._fd = fd
+        return True
+
+    def _unlock_file(self):
+        if self._fd is not None:
+            import fcntl
+
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    # ---- lease object ----
+
+    def holder(self):
+        from minio.error import S3Error
+
+        try:
+            resp = self.client.get_object(self.bucket, self.object_name)
+        except S3Error as exc:
+            if exc.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return json.loads(resp.read())
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def _write(self, acquired_at: str):
+        now = datetime.now(timezone.utc)
+        body = json.dumps({
+            "run_id": self.run_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "acquired_at": acquired_at,
+            "renewed_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=self.seconds)).isoformat(),
+        }).encode("utf-8")
+        self.client.put_object(self.bucket, self.object_name, data=io.BytesIO(body), length=len(body),
+                               content_type="application/json", metadata={"run-id": self.run_id})
+
+    def _try_acquire(self) -> bool:
+        if not self._lock_file():
+            self.blocked_by = {"run_id": "?", "host": socket.gethostname(), "local": True}
+            return False
+
+        holder = self.holder()
+        now = datetime.now(timezone.utc)
+        if holder and holder.get("run_id") != self.run_id:
+            if datetime.fromisoformat(holder["expires_at"]) > now:
+                self.blocked_by = holder
+                self._unlock_file()
+                return False
+            print(f"[WARN] Lease {self.name}: run {holder['run_id']} ({holder.get('host')}) expired "
+                  f"at {holder['expires_at']} without releasing it, taking over")
+
+        self._acquired_at = now.isoformat()
+        self._write(self._acquired_at)
+        holder = self.holder()
+        if not holder or holder.get("run_id") != self.run_id:
+            self.blocked_by = holder
+            self._unlock_file()
+            return False
+        return True
+
+    def acquire(self, wait_seconds: float = 0) -> bool:
+        deadline = time.monotonic() + wait_seconds
+        while not self._try_acquire():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(LEASE_POLL_SECONDS, remaining))
+
+        self._heartbeat = threading.Thread(target=self._renew, name=f"lease-{self.name}", daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _renew(self):
+        while not self._stop.wait(self.seconds / 3):
+            try:
+                holder = self.holder()
+                if not holder or holder.get("run_id") != self.run_id:
+                    # someone took over after our lease expired (e.g. the host was suspended)
+                    self.lost = True
+                    print(f"[WARN] Lease {self.name}: lost to {holder and holder.get('run_id')}")
+                    return
+                self._write(self._acquired_at)
+            except Exception as exc:
+                print(f"[WARN] Lease {self.name}: renewal failed: {exc}")
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        try:
+            holder = self.holder()
+            if holder and holder.get("run_id") == self.run_id:
+                self.client.remove_object(self.bucket, self.object_name)
+        finally:
+            self._unlock_file()
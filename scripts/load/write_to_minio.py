@@ -1,9 +1,10 @@
 import os
 import json
 import io
-from minio import Minio
 from dotenv import load_dotenv
 
+from scripts.load.run_context import resolve_name, run_metadata, staged_name
+
 load_dotenv()
 
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
@@ -12,16 +13,32 @@ MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
 MINIO_BUCKET = os.getenv("MINIO_BUCKET")
 
-client = Minio(
-    MINIO_ENDPOINT,
-    access_key=MINIO_ACCESS_KEY,
-    secret_key=MINIO_SECRET_KEY,
-    secure=MINIO_SECURE
-)
+_client = None
+_bucket_checked = False
+
+
+def get_client():
+    # created on first use; importing this module does not load the MinIO SDK
+    global _client
+    if _client is None:
+        from minio import Minio
+
+        _client = Minio(
+            MINIO_ENDPOINT,
+            access_key=MINIO_ACCESS_KEY,
+            secret_key=MINIO_SECRET_KEY,
+            secure=MINIO_SECURE
+        )
+    return _client
 
 def ensure_bucket():
+    global _bucket_checked
+    if _bucket_checked:
+        return
+    client = get_client()
     if not client.bucket_exists(MINIO_BUCKET):
         client.make_bucket(MINIO_BUCKET)
+    _bucket_checked = True
 
 def upload_json_to_minio(object_name: str, data: dict):
     ensure_bucket()
@@ -29,12 +46,14 @@ def upload_json_to_minio(object_name: str, data: dict):
     payload = json.dumps(data, indent=2).encode("utf-8")
     buffer = io.BytesIO(payload)
 
-    client.put_object(
+    object_name = staged_name(object_name)
+    get_client().put_object(
         bucket_name=MINIO_BUCKET,
         object_name=object_name,
         data=buffer,
         length=len(payload),
-        content_type="application/json"
+        content_type="application/json",
+        metadata=run_metadata()
     )
 
     print(f"[MINIO] Uploaded → {MINIO_BUCKET}/{object_name}")
@@ -44,12 +63,30 @@ def upload_csv_to_minio(object_name: str, csv_bytes: bytes):
 
     buffer = io.BytesIO(csv_bytes)
 
-    client.put_object(
+    object_name = staged_name(object_name)
+    get_client().put_object(
         bucket_name=MINIO_BUCKET,
         object_name=object_name,
         data=buffer,
         length=len(csv_bytes),
-        content_type="text/csv"
+        content_type="text/csv",
+        metadata=run_metadata()
     )
 
     print(f"[MINIO] Uploaded → {MINIO_BUCKET}/{object_name}")
+
+def read_json_from_minio(object_name: str, default=None):
+    from minio.error import S3Error
+
+    try:
+        resp = get_client().get_object(MINIO_BUCKET, resolve_name(get_client(), MINIO_BUCKET, object_name))
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return default
+        raise
+
+    try:
+        return json.loads(resp.read().decode("utf-8"))
+    finally:
+        resp.close()
+        resp.release_conn()
@@ -0,0 +1,262 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+STRING_COLUMNS = ("location_name", "address", "google_maps_link")
+CSV_CHUNK_ROWS = 100_000
+
+
+class PlaceCatalog:
+    """Columnar place catalog: coordinate arrays, category / crowd codes and
+    interned strings, instead of a DataFrame of Python objects."""
+
+    __slots__ = (
+        "location_ids",
+        "latitude",
+        "longitude",
+        "category_codes",
+        "categories",
+        "crowd_codes",
+        "crowd_levels",
+        "is_active",
+        "strings",
+        "string_idx",
+        "version",
+        "grid",
+    )
+
+    def __init__(self, location_ids, latitude, longitude, category_codes, categories,
+                 crowd_codes, crowd_levels, is_active, strings, string_idx, version=None, grid=None):
+        self.location_ids = location_ids
+        self.latitude = latitude
+        self.longitude = longitude
+        self.category_codes = category_codes
+        self.categories = categories
+        self.crowd_codes = crowd_codes
+        self.crowd_levels = crowd_levels
+        self.is_active = is_active
+        self.strings = strings
+        # {column: int32 index into strings}
+        self.string_idx = string_idx
+        # set when opened from a published snapshot
+        self.version = version
+        self.grid = grid
+
+    def __len__(self):
+        return len(self.latitude)
+
+    @property
+    def category(self) -> pd.Categorical:
+        return pd.Categorical.from_codes(self.category_codes, categories=self.categories)
+
+    @property
+    def crowd_level(self) -> pd.Categorical:
+        return pd.Categorical.from_codes(self.crowd_codes, categories=self.crowd_levels)
+
+    def subset(self, mask, version=None) -> "PlaceCatalog":
+        # string and code tables are shared, only the row arrays are sliced;
+        # the grid index refers to full-catalog rows so it is not carried over
+        return PlaceCatalog(
+            self.location_ids[mask],
+            self.latitude[mask],
+            self.longitude[mask],
+            self.category_codes[mask],
+            self.categories,
+            self.crowd_codes[mask],
+            self.crowd_levels,
+            self.is_active[mask],
+            self.strings,
+            {col: idx[mask] for col, idx in self.string_idx.items()},
+            version=version,
+        )
+
+    def active(self) -> "PlaceCatalog":
+        mask = self.is_active & np.isfinite(self.latitude) & np.isfinite(self.longitude)
+        return self.subset(mask, version=f"{self.version}:active" if self.version else None)
+
+    def string(self, column: str, i: int):
+        idx = self.string_idx[column][i]
+        return self.strings[idx] if idx >= 0 else None
+
+    def nbytes(self) -> int:
+        arrays = [self.location_ids, self.latitude, self.longitude, self.category_codes,
+                  self.crowd_codes, self.is_active, *self.string_idx.values()]
+        return sum(a.nbytes for a in arrays) + self.strings.nbytes()
+
+    def fingerprint(self) -> str:
+        if self.version:
+            return self.version
+        h = hashlib.sha1()
+        for arr in (self.location_ids, self.latitude, self.longitude, self.category_codes,
+                    self.crowd_codes, self.is_active):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update("\x00".join(self.categories).encode("utf-8"))
+        h.update("\x00".join(self.crowd_levels).encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    def record(self, i: int, distance_km, priority_score) -> "PlaceRecord":
+        code = self.category_codes[i]
+        return PlaceRecord(
+            self.location_ids[i].item(),
+            self.string("location_name", i),
+            self.categories[code] if code >= 0 else None,
+            self.string("address", i),
+            float(self.latitude[i]),
+            float(self.longitude[i]),
+            distance_km,
+            priority_score,
+            self.string("google_maps_link", i),
+            bool(self.is_active[i]),
+        )
+
+
+class StringTable:
+    """Strings packed into one UTF-8 buffer plus offsets; no per-string Python object."""
+
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob: bytes, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __getitem__(self, i: int) -> str:
+        # blob is bytes, or a memory-mapped uint8 array when opened from a snapshot
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def nbytes(self) -> int:
+        return len(self.blob) + self.offsets.nbytes
+
+
+class _StringTableBuilder:
+    def __init__(self):
+        self._parts = []
+        self._lengths = []
+        self._count = 0
+
+    def add(self, values: pd.Series) -> np.ndarray:
+        # dedupe within the chunk only; a global hash table of every string
+        # would cost more than the occasional repeat across chunks
+        codes, uniques = pd.factorize(values.where(values != ""), use_na_sentinel=True)
+        encoded = [str(u).encode("utf-8") for u in uniques]
+
+        self._parts.append(b"".join(encoded))
+        self._lengths.append(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+
+        codes = codes.astype(np.int32)
+        codes[codes >= 0] += self._count
+        self._count += len(uniques)
+        return codes
+
+    def build(self) -> StringTable:
+        offsets = np.zeros(self._count + 1, dtype=np.int64)
+        if self._lengths:
+            np.cumsum(np.concatenate(self._lengths), out=offsets[1:])
+        blob = b"".join(self._parts)
+        self._parts, self._lengths = [], []
+        return StringTable(blob, offsets)
+
+
+class PlaceRecord:
+    """One materialized place; only built for the final top-K."""
+
+    __slots__ = (
+        "location_id",
+        "location_name",
+        "category",
+        "address",
+        "latitude",
+        "longitude",
+        "distance_km",
+        "priority_score",
+        "google_maps_link",
+        "is_active",
+    )
+
+    def __init__(self, location_id, location_name, category, address, latitude, longitude,
+                 distance_km, priority_score, google_maps_link, is_active):
+        self.location_id = location_id
+        self.location_name = location_name
+        self.category = category
+        self.address = address
+        self.latitude = latitude
+        self.longitude = longitude
+        self.distance_km = distance_km
+        self.priority_score = priority_score
+        self.google_maps_link = google_maps_link
+        self.is_active = is_active
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _intern(values: pd.Series, table: dict) -> np.ndarray:
+    # low-cardinality labels (category, crowd level): factorize the chunk,
+    # then map its few uniques into the shared label table
+    codes, uniques = pd.factorize(values.where(values != ""), use_na_sentinel=True)
+    lut = np.array([table.setdefault(u, len(table)) for u in uniques] + [-1], dtype=np.int32)
+    return lut[codes]
+
+
+def _parse_active(values: pd.Series) -> np.ndarray:
+    return ~values.astype(str).str.strip().str.lower().isin(("false", "0", "none", "", "nan")).to_numpy()
+
+
+def catalog_from_chunks(chunks) -> PlaceCatalog:
+    ids, lats, lons, active = [], [], [], []
+    cat_codes, crowd_codes = [], []
+    str_codes = {col: [] for col in STRING_COLUMNS}
+
+    category_table, crowd_table = {}, {}
+    string_table = _StringTableBuilder()
+
+    for chunk in chunks:
+        if "category" not in chunk.columns and "location_category" in chunk.columns:
+            chunk = chunk.rename(columns={"location_category": "category"})
+
+        ids.append(pd.to_numeric(chunk["location_id"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64))
+        lats.append(pd.to_numeric(chunk["latitude"], errors="coerce").to_numpy(dtype=np.float64))
+        lons.append(pd.to_numeric(chunk["longitude"], errors="coerce").to_numpy(dtype=np.float64))
+        active.append(_parse_active(chunk["is_active"]) if "is_active" in chunk.columns
+                      else np.ones(len(chunk), dtype=bool))
+
+        cat_codes.append(_intern(chunk["category"], category_table).astype(np.int16))
+        crowd = chunk["crowd_level"] if "crowd_level" in chunk.columns else pd.Series([""] * len(chunk))
+        crowd_codes.append(_intern(crowd, crowd_table).astype(np.int8))
+
+        for col in STRING_COLUMNS:
+            values = chunk[col] if col in chunk.columns else pd.Series([""] * len(chunk))
+            str_codes[col].append(string_table.add(values))
+
+    def cat(parts, dtype):
+        # concatenate then drop the chunk parts right away, so peak memory is
+        # the finished catalog plus one column, not two full copies
+        out = np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype=dtype)
+        parts.clear()
+        return out
+
+    return PlaceCatalog(
+        location_ids=cat(ids, np.int64),
+        latitude=cat(lats, np.float64),
+        longitude=cat(lons, np.float64),
+        category_codes=cat(cat_codes, np.int16),
+        categories=list(category_table),
+        crowd_codes=cat(crowd_codes, np.int8),
+        crowd_levels=list(crowd_table),
+        is_active=cat(active, bool),
+        strings=string_table.build(),
+        string_idx={col: cat(parts, np.int32) for col, parts in str_codes.items()},
+    )
+
+
+def catalog_from_frame(df: pd.DataFrame) -> PlaceCatalog:
+    return catalog_from_chunks([df])
+
+
+def read_catalog_csv(source) -> PlaceCatalog:
+    # chunked so the object-dtype DataFrame never exists for the whole file at once
+    reader = pd.read_csv(source, keep_default_na=False, dtype=str, chunksize=CSV_CHUNK_ROWS)
+    return catalog_from_chunks(reader)
@@ -0,0 +1,255 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from minio.error import S3Error
+
+from scripts.load.run_context import resolve_name, run_metadata, staged_name
+
+from .catalog import PlaceCatalog, StringTable, STRING_COLUMNS
+from .geo import EARTH_RADIUS_KM
+
+SNAPSHOT_PREFIX = "silver/places_snapshot/"
+POINTER_OBJECT = SNAPSHOT_PREFIX + "CURRENT.json"
+
+LOCAL_DIR = Path(os.getenv("PLACES_SNAPSHOT_DIR", "/tmp/touchgrass/places_snapshot"))
+GRID_CELL_DEG = float(os.getenv("PLACES_GRID_CELL_DEG", "0.05"))
+KEEP_LOCAL_VERSIONS = 2
+
+ARRAYS = (
+    "location_ids",
+    "latitude",
+    "longitude",
+    "category_codes",
+    "crowd_codes",
+    "is_active",
+    "string_offsets",
+    "string_blob",
+    *(f"idx_{col}" for col in STRING_COLUMNS),
+    "grid_cells",
+    "grid_starts",
+    "grid_rows",
+)
+
+_LOCK = threading.Lock()
+_OPENED = {}
+
+
+class GridIndex:
+    """Fixed lat/lon grid: rows sorted by cell, plus the start offset of each non-empty cell."""
+
+    __slots__ = ("cell_deg", "cells", "starts", "rows", "_lon_span")
+
+    def __init__(self, cell_deg, cells, starts, rows):
+        self.cell_deg = cell_deg
+        self.cells = cells
+        self.starts = starts
+        self.rows = rows
+        self._lon_span = int(round(360.0 / cell_deg)) + 1
+
+    def _cell_key(self, lat_cell, lon_cell):
+        return lat_cell * self._lon_span + lon_cell
+
+    def within(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Row ids of every place in the grid cells overlapping the radius (a superset, not exact)."""
+        if not len(self.cells):
+            # empty catalog, e.g. a user far from every shard
+            return np.empty(0, dtype=np.int64)
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+
+        lat_cells = np.arange(np.floor((lat + 90.0 - dlat) / self.cell_deg),
+                              np.floor((lat + 90.0 + dlat) / self.cell_deg) + 1, dtype=np.int64)
+        lon_cells = np.arange(np.floor((lon + 180.0 - dlon) / self.cell_deg),
+                              np.floor((lon + 180.0 + dlon) / self.cell_deg) + 1, dtype=np.int64)
+        lon_cells = np.unique(np.mod(lon_cells, self._lon_span - 1))
+
+        keys = self._cell_key(lat_cells[:, None], lon_cells[None, :]).ravel()
+        pos = np.searchsorted(self.cells, keys)
+        pos = pos[(pos < len(self.cells)) & (self.cells[np.minimum(pos, len(self.cells) - 1)] == keys)]
+        if not len(pos):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.rows[self.starts[p]:self.starts[p + 1]] for p in pos])
+
+
+def build_grid_index(latitude, longitude, cell_deg=GRID_CELL_DEG):
+    lon_span = int(round(360.0 / cell_deg)) + 1
+    valid = np.isfinite(latitude) & np.isfinite(longitude)
+    rows = np.flatnonzero(valid)
+
+    lat_cells = np.floor((latitude[rows] + 90.0) / cell_deg).astype(np.int64)
+    lon_cells = np.floor((longitude[rows] + 180.0) / cell_deg).astype(np.int64)
+    keys = lat_cells * lon_span + lon_cells
+
+    order = np.argsort(keys, kind="stable")
+    keys, rows = keys[order], rows[order]
+    cells, starts = np.unique(keys, return_index=True)
+    starts = np.append(starts, len(keys)).astype(np.int64)
+    return cells, starts, rows
+
+
+def _snapshot_arrays(catalog: PlaceCatalog) -> dict:
+    strings = catalog.strings
+    cells, starts, rows = build_grid_index(catalog.latitude, catalog.longitude)
+    arrays = {
+        "location_ids": catalog.location_ids,
+        "latitude": catalog.latitude,
+        "longitude": catalog.longitude,
+        "category_codes": catalog.category_codes,
+        "crowd_codes": catalog.crowd_codes,
+        "is_active": catalog.is_active,
+        "string_offsets": strings.offsets,
+        "string_blob": np.frombuffer(strings.blob, dtype=np.uint8),
+        "grid_cells": cells,
+        "grid_starts": starts,
+        "grid_rows": rows,
+    }
+    for col in STRING_COLUMNS:
+        arrays[f"idx_{col}"] = catalog.string_idx[col]
+    return arrays
+
+
+def publish_snapshot(catalog: PlaceCatalog, client, bucket: str) -> str:
+    arrays = _snapshot_arrays(catalog)
+
+    # content-addressed: the version only changes when the catalog does
+    h = hashlib.sha1()
+    for name in ARRAYS:
+        h.update(name.encode("utf-8"))
+        h.update(np.ascontiguousarray(arrays[name]).tobytes())
+    h.update(json.dumps([catalog.categories, catalog.crowd_levels]).encode("utf-8"))
+    version = h.hexdigest()[:16]
+
+    prefix = f"{SNAPSHOT_PREFIX}v={version}/"
+    for name in ARRAYS:
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(arrays[name]), allow_pickle=False)
+        client.put_object(bucket, prefix + f"{name}.npy", data=io.BytesIO(buf.getvalue()),
+                          length=buf.tell(), content_type="application/octet-stream", metadata=run_metadata())
+
+    meta = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "rows": len(catalog),
+        "categories": catalog.categories,
+        "crowd_levels": catalog.crowd_levels,
+        "string_columns": list(STRING_COLUMNS),
+        "grid_cell_deg": GRID_CELL_DEG,
+        "arrays": list(ARRAYS),
+    }
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    client.put_object(bucket, prefix + "meta.json", data=io.BytesIO(meta_bytes),
+                      length=len(meta_bytes), content_type="application/json", metadata=run_metadata())
+
+    # the pointer goes last, so readers never see a partially uploaded version
+    pointer = json.dumps({"version": version, "prefix": prefix, "created_at": meta["created_at"]}).encode("utf-8")
+    client.put_object(bucket, staged_name(POINTER_OBJECT), data=io.BytesIO(pointer),
+                      length=len(pointer), content_type="application/json", metadata=run_metadata())
+
+    print(f"[OK] places snapshot {version} ({len(catalog)} rows) → {prefix}")
+    return version
+
+
+def current_version(client, bucket: str):
+    try:
+        resp = client.get_object(bucket, resolve_name(client, bucket, POINTER_OBJECT))
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return None
+        raise
+    try:
+        return json.loads(resp.read())["version"]
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+def sync_snapshot(client, bucket: str, version: str) -> Path:
+    """Download a snapshot version to local disk once; later calls reuse it."""
+    target = LOCAL_DIR / version
+    if (target / "meta.json").exists():
+        return target
+
+    staging = LOCAL_DIR / f".{version}.{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    prefix = f"{SNAPSHOT_PREFIX}v={version}/"
+    for name in ARRAYS:
+        client.fget_object(bucket, prefix + f"{name}.npy", str(staging / f"{name}.npy"))
+    # meta.json last: its presence marks a complete local copy
+    client.fget_object(bucket, prefix + "meta.json", str(staging / "meta.json"))
+
+    try:
+        staging.rename(target)
+    except OSError:
+        # another worker finished the same version first
+        shutil.rmtree(staging, ignore_errors=True)
+
+    _prune_local(keep=version)
+    print(f"[INFO] places snapshot {version} synced to {target}")
+    return target
+
+
+def _prune_local(keep: str):
+    versions = sorted(
+        (p for p in LOCAL_DIR.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in versions[KEEP_LOCAL_VERSIONS:]:
+        if old.name != keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def open_snapshot(path: Path) -> PlaceCatalog:
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    # read-only maps: pages come from the OS page cache and are shared by every process
+    a = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in meta["arrays"]}
+
+    return PlaceCatalog(
+        location_ids=a["location_ids"],
+        latitude=a["latitude"],
+        longitude=a["longitude"],
+        category_codes=a["category_codes"],
+        categories=meta["categories"],
+        crowd_codes=a["crowd_codes"],
+        crowd_levels=meta["crowd_levels"],
+        is_active=a["is_active"],
+        strings=StringTable(a["string_blob"], a["string_offsets"]),
+        string_idx={col: a[f"idx_{col}"] for col in meta["string_columns"]},
+        version=meta["version"],
+        grid=GridIndex(meta["grid_cell_deg"], a["grid_cells"], a["grid_starts"], a["grid_rows"]),
+    )
+
+
+def load_snapshot_catalog(client, bucket: str, near=None, radius_km: float = None):
+    """Catalog for the current published version, or None if no snapshot exists yet.
+
+    With `near` (lat, lon), only the rows in the grid cells within radius_km of it.
+    """
+    version = current_version(client, bucket)
+    if version is None:
+        return None
+
+    with _LOCK:
+        catalog = _OPENED.get(version)
+        if catalog is None:
+            catalog = open_snapshot(sync_snapshot(client, bucket, version))
+            _OPENED.clear()
+            _OPENED[version] = catalog
+
+    if near is None:
+        return catalog
+    rows = np.sort(catalog.grid.within(near[0], near[1], radius_km))
+    # content-derived version, so ranking caches stay valid while the area is unchanged
+    area = catalog.subset(rows, version=f"{version}:{hashlib.sha1(rows.tobytes()).hexdigest()[:16]}")
+    area.grid = GridIndex(catalog.grid.cell_deg, *build_grid_index(area.latitude, area.longitude, catalog.grid.cell_deg))
+    return area
@@ -1,35 +1,92 @@
 from datetime import datetime, timezone
-from .distance import route_distance_km
-from .rules_loader import load_rules
+
+import numpy as np
+import pandas as pd
+
+from .geo import haversine_km, haversine_km_array
+from .rules_loader import get_rules
+
+REASONS = np.array([None, "outside_active_hours", "user_not_moved", "recently_notified"], dtype=object)
 
 
 def is_in_cooldown(
     last_location,
     current_location,
     now_ts=None,
+    last_notified_at=None,
+    rules=None,
 ):
-    rules = load_rules()
+    if rules is None:
+        rules = get_rules()
 
     if now_ts is None:
         now_ts = datetime.now(timezone.utc)
 
-    active = rules["user_activity"]["active_hours"]
-    cooldown_cfg = rules["cooldown"]
-    distance_cfg = rules["distance"]
-
     local_hour = now_ts.astimezone().hour
-    start_h = int(active["start"].split(":")[0])
-    end_h = int(active["end"].split(":")[0])
 
-    if not (start_h <= local_hour < end_h):
+    if not (rules.active_start_h <= local_hour < rules.active_end_h):
         return True, "outside_active_hours", None
 
+    if last_notified_at is None:
+        return False, None, 0
+
+    remaining = rules.cooldown_seconds - (now_ts - last_notified_at).total_seconds()
+    if remaining <= 0:
+        return False, None, 0
+
     if last_location is None or current_location is None:
+        return True, "recently_notified", int(remaining)
+
+    if haversine_km(last_location, current_location) > rules.reset_cooldown_km:
         return False, None, 0
 
-    dist_km = route_distance_km(last_location, current_location)
+    return True, "user_not_moved", int(remaining)
+
+
+def evaluate_cooldown_batch(devices: pd.DataFrame, state: dict, now_ts=None, rules=None) -> pd.DataFrame:
+    # devices: one row per device with device/latitude/longitude of the current location
+    if rules is None:
+        rules = get_rules()
+
+    if now_ts is None:
+        now_ts = datetime.now(timezone.utc)
+
+    device_keys = devices["device"].astype(str)
+    prev = pd.DataFrame.from_dict(state, orient="index") if state else pd.DataFrame()
+    prev = prev.reindex(index=device_keys, columns=["last_notified_at", "latitude", "longitude"])
+
+    last_ts = pd.to_datetime(prev["last_notified_at"], utc=True, format="ISO8601")
+    elapsed = (pd.Timestamp(now_ts).tz_convert("UTC") - last_ts).dt.total_seconds().to_numpy()
+    remaining = rules.cooldown_seconds - elapsed
+
+    moved_km = haversine_km_array(
+        prev["latitude"].to_numpy(dtype=np.float64),
+        prev["longitude"].to_numpy(dtype=np.float64),
+        pd.to_numeric(devices["latitude"], errors="coerce").to_numpy(dtype=np.float64),
+        pd.to_numeric(devices["longitude"], errors="coerce").to_numpy(dtype=np.float64),
+    )
+
+    # NaN remaining (never notified) and NaN distance (unknown location) both compare False
+    in_window = remaining > 0
+    moved = moved_km > rules.reset_cooldown_km
+    location_known = ~np.isnan(moved_km)
+
+    reason_code = np.zeros(len(devices), dtype=np.int8)
+    reason_code[in_window & ~location_known] = 3
+    reason_code[in_window & location_known & ~moved] = 2
+
+    local_hour = now_ts.astimezone().hour
+    if not (rules.active_start_h <= local_hour < rules.active_end_h):
+        reason_code[:] = 1
 
-    if dist_km <= distance_cfg["reset_cooldown_if_move_km"]:
-        return True, "user_not_moved", cooldown_cfg["minutes"] * 60
+    in_cooldown = reason_code > 0
+    remaining_s = np.where(in_cooldown & (reason_code != 1), np.nan_to_num(remaining), 0).astype(np.int64)
 
-    return False, None, 0
+    return pd.DataFrame({
+        "device": devices["device"].to_numpy(),
+        "in_cooldown": in_cooldown,
+        # object column: pandas would store the None of "no cooldown" as NaN
+        "reason": pd.Series(REASONS[reason_code], dtype=object),
+        "remaining_seconds": remaining_s,
+        "moved_km": moved_km,
+    })
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+from scripts.load.write_to_minio import upload_json_to_minio, read_json_from_minio
+
+COOLDOWN_STATE_OBJECT = "state/cooldown_state.json"
+
+
+def load_cooldown_state() -> dict:
+    # { device: {"last_notified_at": iso, "latitude": float, "longitude": float} }
+    payload = read_json_from_minio(COOLDOWN_STATE_OBJECT, default={}) or {}
+    return payload.get("devices", {})
+
+
+def save_cooldown_state(state: dict):
+    upload_json_to_minio(
+        object_name=COOLDOWN_STATE_OBJECT,
+        data={
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "device_count": len(state),
+            "devices": state,
+        },
+    )
+
+
+def get_device_state(state: dict, device):
+    entry = state.get(str(device)) if device is not None else None
+    if not entry:
+        return None, None
+
+    last_notified_at = entry.get("last_notified_at")
+    if last_notified_at:
+        last_notified_at = datetime.fromisoformat(last_notified_at)
+
+    last_location = None
+    if entry.get("latitude") is not None and entry.get("longitude") is not None:
+        last_location = (float(entry["latitude"]), float(entry["longitude"]))
+
+    return last_notified_at, last_location
+
+
+def record_notification(state: dict, device, location, now_ts=None):
+    if device is None:
+        return state
+
+    if now_ts is None:
+        now_ts = datetime.now(timezone.utc)
+
+    state[str(device)] = {
+        "last_notified_at": now_ts.isoformat(),
+        "latitude": location[0] if location else None,
+        "longitude": location[1] if location else None,
+    }
+    return state
@@ -0,0 +1,149 @@
+import hashlib
+import io
+import os
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from minio.error import S3Error
+
+from scripts.load.run_context import resolve_name, run_metadata, staged_name
+
+CROWD_TABLE_OBJECT = "silver/crowd/crowd_table.npz"
+
+CROWD_LEVELS = ("low", "medium", "high")
+HOURS_PER_WEEK = 168
+LOCAL_TZ_OFFSET = timedelta(hours=8)
+
+# device presence is counted on a fine grid (~500 m) around each place
+CELL_DEG = float(os.getenv("CROWD_CELL_DEG", "0.005"))
+# average distinct devices seen in a cell during one hour-of-week slot
+MEDIUM_DEVICES = float(os.getenv("CROWD_MEDIUM_DEVICES", "2"))
+HIGH_DEVICES = float(os.getenv("CROWD_HIGH_DEVICES", "5"))
+
+_CELL_STRIDE = 100_000
+
+_LOCK = threading.Lock()
+_TABLE = {"etag": None, "table": None}
+
+
+def hour_of_week(ts) -> int:
+    """Local hour-of-week, Monday 00:00 = 0."""
+    local = pd.Timestamp(ts).tz_convert("UTC") + LOCAL_TZ_OFFSET
+    return local.dayofweek * 24 + local.hour
+
+
+def presence_cells(lat, lon) -> np.ndarray:
+    lat_idx = np.floor((np.asarray(lat, dtype=np.float64) + 90.0) / CELL_DEG).astype(np.int64)
+    lon_idx = np.floor((np.asarray(lon, dtype=np.float64) + 180.0) / CELL_DEG).astype(np.int64)
+    return lat_idx * _CELL_STRIDE + lon_idx
+
+
+class CrowdTable:
+    """Crowd level code per place and hour-of-week: int8 [places × 168], -1 = unknown.
+
+    Rows follow `location_ids` (sorted); the row of each catalog place is resolved once
+    per catalog version, so a lookup is a single gather.
+    """
+
+    def __init__(self, location_ids: np.ndarray, codes: np.ndarray, version: str):
+        self.location_ids = location_ids
+        self.codes = codes
+        self.version = version
+        self._rows = {}
+
+    def _rows_for(self, places) -> np.ndarray:
+        rows = self._rows.get(places.version) if places.version else None
+        if rows is None:
+            if len(self.location_ids):
+                pos = np.minimum(np.searchsorted(self.location_ids, places.location_ids), len(self.location_ids) - 1)
+                rows = np.where(self.location_ids[pos] == places.location_ids, pos, -1)
+            else:
+                rows = np.full(len(places), -1, dtype=np.int64)
+            if places.version:
+                self._rows = {places.version: rows}
+        return rows
+
+    def levels(self, places, how: int) -> pd.Categorical:
+        """Crowd level of every catalog place at hour-of-week `how`; places missing from the
+        table fall back to the catalog's own crowd_level column."""
+        rows = self._rows_for(places)
+        codes = np.full(len(places), -1, dtype=np.int64)
+        known = rows >= 0
+        codes[known] = self.codes[rows[known], how]
+
+        fallback = places.crowd_level
+        if len(fallback.categories):
+            lut = np.array([CROWD_LEVELS.index(c) if c in CROWD_LEVELS else -1
+                            for c in fallback.categories] + [-1], dtype=np.int64)
+            missing = codes < 0
+            codes[missing] = lut[fallback.codes[missing]]
+
+        return pd.Categorical.from_codes(codes, categories=list(CROWD_LEVELS))
+
+
+def build_crowd_codes(places, rules, presence: dict = None, weeks: float = 1.0) -> np.ndarray:
+    """[places × 168] crowd codes: the category baseline from rules.crowdedness.category_map,
+    raised where observed device presence in the place's cell says it is busier."""
+    category_lut = np.array(
+        [CROWD_LEVELS.index(rules.crowd_category_map[c]) if rules.crowd_category_map.get(c) in CROWD_LEVELS else -1
+         for c in places.categories] + [-1],
+        dtype=np.int8,
+    )
+    base = category_lut[places.category_codes]
+    codes = np.repeat(base[:, None], HOURS_PER_WEEK, axis=1)
+
+    if presence:
+        cells = presence_cells(places.latitude, places.longitude)
+        observed = np.array([presence.get(str(c)) is not None for c in cells.tolist()], dtype=bool)
+        if observed.any():
+            counts = np.array([presence[str(c)] for c in cells[observed].tolist()], dtype=np.float64)
+            per_week = counts / max(weeks, 1.0)
+            level = np.where(per_week >= HIGH_DEVICES, 2, np.where(per_week >= MEDIUM_DEVICES, 1, 0))
+            codes[observed] = np.maximum(codes[observed], level.astype(np.int8))
+
+    return codes
+
+
+def publish_crowd_table(location_ids, codes: np.ndarray, client, bucket: str) -> str:
+    order = np.argsort(location_ids, kind="stable")
+    ids = np.asarray(location_ids, dtype=np.int64)[order]
+    codes = np.ascontiguousarray(codes[order], dtype=np.int8)
+
+    buf = io.BytesIO()
+    np.savez_compressed(buf, location_ids=ids, codes=codes, levels=np.array(CROWD_LEVELS))
+    body = buf.getvalue()
+    client.put_object(bucket, staged_name(CROWD_TABLE_OBJECT), data=io.BytesIO(body),
+                      length=len(body), content_type="application/octet-stream", metadata=run_metadata())
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+def load_crowd_table(client, bucket: str):
+    """Current crowd table, re-read only when its ETag changes; None if none is published."""
+    object_name = resolve_name(client, bucket, CROWD_TABLE_OBJECT)
+    try:
+        etag = client.stat_object(bucket, object_name).etag
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return None
+        raise
+
+    with _LOCK:
+        if _TABLE["etag"] == etag:
+            return _TABLE["table"]
+
+        resp = client.get_object(bucket, object_name)
+        try:
+            body = resp.read()
+        finally:
+            resp.close()
+            resp.release_conn()
+
+        with np.load(io.BytesIO(body), allow_pickle=False) as data:
+            if tuple(data["levels"].tolist()) != CROWD_LEVELS:
+                raise RuntimeError(f"Crowd table levels {data['levels'].tolist()} do not match {CROWD_LEVELS}")
+            table = CrowdTable(data["location_ids"], data["codes"], hashlib.sha1(body).hexdigest()[:16])
+
+        _TABLE["etag"], _TABLE["table"] = etag, table
+        return table
@@ -1,14 +1,14 @@
-from .rules_loader import load_rules
+from .rules_loader import get_rules
 
 
-def decide(screen_time_minutes, ranked_candidates, cooldown_active):
-    rules = load_rules()
-    thresholds = rules["screen_time"]["thresholds_minutes"]
+def decide(screen_time_minutes, ranked_candidates, cooldown_active, rules=None):
+    if rules is None:
+        rules = get_rules()
 
     if cooldown_active:
         return {"should_go_out": False, "reason": "cooldown_active", "cooldown": True}
 
-    if screen_time_minutes < thresholds["medium"]:
+    if screen_time_minutes < rules.medium_threshold:
         return {"should_go_out": False, "reason": "screen_time_too_low", "cooldown": False}
 
     if not ranked_candidates:
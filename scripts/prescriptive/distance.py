@@ -1,5 +1,4 @@
 import os
-import requests
 from pathlib import Path
 from typing import Tuple
 from dotenv import load_dotenv
@@ -7,15 +6,18 @@ from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parents[2]
 load_dotenv(BASE_DIR / ".env")
 
-ORS_BASE_URL = "https://api.openrouteservice.org"
 ORS_API_KEY = os.getenv("ORS_API_KEY")
-
-if not ORS_API_KEY:
-    raise RuntimeError("ORS_API_KEY not found")
+DIRECTIONS_PATH = "/v2/directions/driving-car"
 
 
 def route_distance_km(origin, destination):
-    url = "https://api.openrouteservice.org/v2/directions/driving-car"
+    # checked on first call rather than at import, so modules that only
+    # import this (and runs that never route) do not need the key
+    if not ORS_API_KEY:
+        raise RuntimeError("ORS_API_KEY not found")
+
+    from scripts.http_client import get_client
+
     headers = {
         "Authorization": ORS_API_KEY,
         "Content-Type": "application/json",
@@ -28,8 +30,8 @@ def route_distance_km(origin, destination):
         ]
     }
 
-    response = requests.post(url, json=payload, headers=headers, timeout=10)
-    response.raise_for_status()
+    # shared ORS client: keep-alive, rate limit, retries on 429/5xx (base URL from ORS_BASE_URL)
+    response = get_client("ors").post(DIRECTIONS_PATH, json=payload, headers=headers)
     data = response.json()
 
     route = data["routes"][0]
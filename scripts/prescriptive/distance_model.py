@@ -0,0 +1,192 @@
+import argparse
+import math
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from scripts.load.write_to_minio import upload_json_to_minio, read_json_from_minio
+from .geo import haversine_km_array
+
+DETOUR_MODEL_OBJECT = "state/detour_model.json"
+
+# road distance ≈ haversine × detour factor; the prior is used until routes have been observed
+DEFAULT_DETOUR = float(os.getenv("DETOUR_DEFAULT_FACTOR", "1.3"))
+PRIOR_WEIGHT = float(os.getenv("DETOUR_PRIOR_WEIGHT", "5"))
+CELL_DEG = float(os.getenv("DETOUR_CELL_DEG", "0.1"))
+MIN_OBSERVED_KM = 0.2
+FACTOR_RANGE = (1.0, 4.0)
+# "version" (part of every device's ranking cache key) only moves when the global or a
+# category factor drifts this much (relative) from its value at the last version
+VERSION_TOLERANCE = float(os.getenv("DETOUR_VERSION_TOLERANCE", "0.02"))
+
+_CELL_STRIDE = 100_000
+
+
+def _empty_model() -> dict:
+    # log-ratio sums and counts, so factors are geometric means and updates are additive.
+    # "observations" counts every folded route (callers save the model when it moves)
+    return {"version": 0, "observations": 0, "global": [0.0, 0], "category": {}, "cell": {}}
+
+
+def load_detour_model() -> dict:
+    model = read_json_from_minio(DETOUR_MODEL_OBJECT, default=None) or _empty_model()
+    model.setdefault("observations", model["global"][1])
+    return model
+
+
+def save_detour_model(model: dict):
+    model["updated_at"] = datetime.now(timezone.utc).isoformat()
+    upload_json_to_minio(object_name=DETOUR_MODEL_OBJECT, data=model)
+
+
+def area_cells(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat_idx = np.floor((np.asarray(lat) + 90.0) / CELL_DEG).astype(np.int64)
+    lon_idx = np.floor((np.asarray(lon) + 180.0) / CELL_DEG).astype(np.int64)
+    return lat_idx * _CELL_STRIDE + lon_idx
+
+
+def _shrunk(stats, prior: float) -> float:
+    # few observations stay close to the parent factor, many converge on their own mean
+    sum_log, count = stats
+    return math.exp((sum_log + PRIOR_WEIGHT * math.log(prior)) / (count + PRIOR_WEIGHT))
+
+
+def detour_factors(model: dict, categories, category_codes: np.ndarray, cells: np.ndarray) -> np.ndarray:
+    """Per-place factor: area cell, shrunk toward its category, shrunk toward the global factor."""
+    global_f = _shrunk(model["global"], DEFAULT_DETOUR)
+
+    cat_f = np.array(
+        [_shrunk(model["category"].get(c, [0.0, 0]), global_f) for c in categories] + [global_f],
+        dtype=np.float64,
+    )
+    place_cat_f = cat_f[category_codes]
+
+    unique_cells, inverse = np.unique(cells, return_inverse=True)
+    cell_stats = model["cell"]
+    sum_log = np.array([cell_stats.get(str(c), [0.0, 0])[0] for c in unique_cells.tolist()])
+    count = np.array([cell_stats.get(str(c), [0.0, 0])[1] for c in unique_cells.tolist()], dtype=np.float64)
+
+    factors = np.exp((sum_log[inverse] + PRIOR_WEIGHT * np.log(place_cat_f)) / (count[inverse] + PRIOR_WEIGHT))
+    return np.clip(factors, *FACTOR_RANGE)
+
+
+def estimate_distances(model: dict, origin, places) -> np.ndarray:
+    """Offline road-distance estimate from origin to every place in the catalog."""
+    straight = haversine_km_array(origin[0], origin[1], places.latitude, places.longitude)
+    factors = detour_factors(
+        model,
+        places.categories,
+        places.category_codes,
+        area_cells(places.latitude, places.longitude),
+    )
+    return straight * factors
+
+
+def observe_routes(model: dict, origin, lat, lon, categories, routed_km) -> int:
+    """Fold routed distances into the model; returns the number of usable observations."""
+    lat, lon, routed_km = (np.asarray(a, dtype=np.float64) for a in (lat, lon, routed_km))
+    straight = haversine_km_array(origin[0], origin[1], lat, lon)
+
+    # very short hops give unstable ratios, failed routes are NaN
+    usable = np.isfinite(routed_km) & (straight >= MIN_OBSERVED_KM)
+    if not usable.any():
+        return 0
+
+    log_ratio = np.log(np.clip(routed_km[usable] / straight[usable], *FACTOR_RANGE))
+    cells = area_cells(lat[usable], lon[usable])
+    categories = np.asarray(categories, dtype=object)[usable]
+
+    def add(stats, value, n=1):
+        stats[0] += float(value)
+        stats[1] += n
+
+    add(model["global"], log_ratio.sum(), len(log_ratio))
+    for key, value in zip(categories.tolist(), log_ratio.tolist()):
+        if key:
+            add(model["category"].setdefault(key, [0.0, 0]), value)
+    for key, value in zip(cells.tolist(), log_ratio.tolist()):
+        add(model["cell"].setdefault(str(key), [0.0, 0]), value)
+
+    model["observations"] = model.get("observations", 0) + int(usable.sum())
+    _bump_version_on_drift(model)
+    return int(usable.sum())
+
+
+def _version_factors(model: dict) -> dict:
+    global_f = _shrunk(model["global"], DEFAULT_DETOUR)
+    factors = {"": global_f}
+    factors.update({c: _shrunk(stats, global_f) for c, stats in model["category"].items()})
+    return factors
+
+
+def _bump_version_on_drift(model: dict):
+    # per-route bumps would invalidate every device's ranking cache whenever any device
+    # routes; cell factors are left out, they are shrunk toward their category anyway
+    factors = _version_factors(model)
+    reference = model.get("version_factors") or {}
+    drifted = any(
+        abs(f / reference.get(key, reference.get("", DEFAULT_DETOUR)) - 1.0) > VERSION_TOLERANCE
+        for key, f in factors.items()
+    )
+    if drifted or not reference:
+        model["version"] += 1
+        model["version_factors"] = factors
+
+
+def rebuild_from_device_caches() -> dict:
+    """Refit the model from every routed distance held in the per-device gold caches."""
+    import pandas as pd
+
+    from scripts.gold.gold_cache import CACHE_PREFIX
+    from scripts.load.write_to_minio import MINIO_BUCKET, get_client
+    from scripts.prescriptive.read_silver import get_place_catalog
+
+    places = get_place_catalog()
+    position = pd.Index(places.location_ids)
+    categories = np.array(places.categories + [None], dtype=object)
+
+    model = _empty_model()
+    observed = 0
+    for obj in get_client().list_objects(MINIO_BUCKET, prefix=CACHE_PREFIX, recursive=True):
+        cache = read_json_from_minio(obj.object_name, default={}) or {}
+        origin = cache.get("origin")
+        distances = cache.get("distances") or {}
+        if not origin or not distances:
+            continue
+
+        # keys are "<location_id>:<lat>,<lon>" (see gold_cache.distance_keys)
+        ids, lat, lon = [], [], []
+        for key in distances:
+            location_id, coords = key.split(":", 1)
+            a, b = coords.split(",")
+            ids.append(int(location_id))
+            lat.append(float(a))
+            lon.append(float(b))
+
+        rows = position.get_indexer(ids)
+        place_cats = categories[np.where(rows >= 0, places.category_codes[rows], -1)]
+        observed += observe_routes(model, origin, lat, lon, place_cats, list(distances.values()))
+
+    # keep versions increasing so ranking caches keyed on the old model are invalidated
+    model["version"] = load_detour_model()["version"] + 1
+    model["version_factors"] = _version_factors(model)
+    print(f"[OK] Detour model rebuilt from {observed} cached routes")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline detour model for road-distance estimates")
+    parser.add_argument("--rebuild", action="store_true", help="refit from the per-device ORS distance caches")
+    args = parser.parse_args()
+
+    model = rebuild_from_device_caches() if args.rebuild else load_detour_model()
+    if args.rebuild:
+        save_detour_model(model)
+
+    print(f"[INFO] global detour factor {_shrunk(model['global'], DEFAULT_DETOUR):.3f} "
+          f"from {model['global'][1]} routes, {len(model['category'])} categories, {len(model['cell'])} cells")
+
+
+if __name__ == "__main__":
+    main()
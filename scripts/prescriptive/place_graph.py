@@ -0,0 +1,393 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from minio.error import S3Error
+
+from scripts.load.run_context import resolve_name, run_metadata, staged_name
+
+from .catalog_snapshot import GridIndex, build_grid_index, GRID_CELL_DEG
+from .distance_model import area_cells, detour_factors
+from .geo import haversine_km_array
+
+PLACE_GRAPH_OBJECT = "silver/place_graph/place_graph.npz"
+
+# every active place keeps its MAX_NEIGHBORS nearest places within RADIUS_KM (straight line)
+RADIUS_KM = float(os.getenv("PLACE_GRAPH_RADIUS_KM", "3"))
+MAX_NEIGHBORS = int(os.getenv("PLACE_GRAPH_MAX_NEIGHBORS", "16"))
+# ORS calls per refresh spent on replacing estimated edges with routed ones, shortest first
+ROUTE_BUDGET = int(os.getenv("PLACE_GRAPH_ROUTE_BUDGET", "40"))
+ROUTE_WORKERS = int(os.getenv("PLACE_GRAPH_ROUTE_WORKERS", "4"))
+
+_LOCK = threading.Lock()
+_GRAPH = {"etag": None, "graph": None}
+
+
+class PlaceGraph:
+    """Sparse place × place road distances in CSR form.
+
+    Rows follow `location_ids` (sorted). The neighbours of row i are
+    indices[indptr[i]:indptr[i+1]] (graph rows, nearest first) with road km in `km`,
+    routed by ORS where `routed` is set and haversine × detour factor otherwise.
+    Coordinates are kept so a refresh can tell which places moved.
+    """
+
+    def __init__(self, location_ids, latitude, longitude, indptr, indices, km, routed, meta: dict, version=None):
+        self.location_ids = location_ids
+        self.latitude = latitude
+        self.longitude = longitude
+        self.indptr = indptr
+        self.indices = indices
+        self.km = km
+        self.routed = routed
+        self.meta = meta
+        self.version = version
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.location_ids)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def neighbors(self, row: int):
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:end], self.km[start:end], self.routed[start:end]
+
+    def rows_for(self, places) -> np.ndarray:
+        """Graph row of every catalog place, -1 for places not in the graph."""
+        rows = self._rows.get(places.version) if places.version else None
+        if rows is None:
+            if len(self.location_ids):
+                pos = np.minimum(np.searchsorted(self.location_ids, places.location_ids), len(self.location_ids) - 1)
+                rows = np.where(self.location_ids[pos] == places.location_ids, pos, -1)
+            else:
+                rows = np.full(len(places), -1, dtype=np.int64)
+            if places.version:
+                self._rows = {places.version: rows}
+        return rows
+
+    def edges(self):
+        """COO view: (src rows, dst rows, km, routed)."""
+        src = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+        return src, self.indices.astype(np.int64), self.km, self.routed
+
+
+def _to_csr(n: int, src, dst, km, routed):
+    order = np.lexsort((km, src))
+    src, dst, km, routed = src[order], dst[order], km[order], routed[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst.astype(np.int32), km.astype(np.float32), routed.astype(bool)
+
+
+def _nearest(grid: GridIndex, lat, lon, rows, radius_km: float, k: int):
+    """COO edges from each row in `rows` to its k nearest places within radius_km."""
+    src, dst, straight = [], [], []
+    for row in rows.tolist():
+        near = grid.within(lat[row], lon[row], radius_km)
+        near = near[near != row]
+        if not len(near):
+            continue
+        d = haversine_km_array(lat[row], lon[row], lat[near], lon[near])
+        keep = d <= radius_km
+        near, d = near[keep], d[keep]
+        if len(near) > k:
+            top = np.argpartition(d, k - 1)[:k]
+            near, d = near[top], d[top]
+        src.append(np.full(len(near), row, dtype=np.int64))
+        dst.append(near.astype(np.int64))
+        straight.append(d)
+
+    if not src:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(src), np.concatenate(dst), np.concatenate(straight)
+
+
+def _changed_ids(change_logs: list) -> set:
+    ids = set()
+    for log in change_logs:
+        for change in log.get("changes", []):
+            try:
+                ids.add(int(change["location_id"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return ids
+
+
+def build_place_graph(places, detour_model: dict, previous: PlaceGraph = None, change_logs: list = None,
+                      radius_km: float = RADIUS_KM, max_neighbors: int = MAX_NEIGHBORS):
+    """(graph, rebuilt rows). With a compatible `previous` graph only the neighbourhoods of
+    places named in the change logs (plus places that appeared, vanished or moved) are
+    recomputed; every other row and every still-valid routed distance is carried over."""
+    active = places.active()
+    order = np.argsort(active.location_ids, kind="stable")
+    ids = active.location_ids[order].astype(np.int64)
+    lat = active.latitude[order].astype(np.float64)
+    lon = active.longitude[order].astype(np.float64)
+    n = len(ids)
+
+    cells, starts, grid_rows = build_grid_index(lat, lon)
+    grid = GridIndex(GRID_CELL_DEG, cells, starts, grid_rows)
+
+    factors = detour_factors(detour_model, active.categories, active.category_codes[order], area_cells(lat, lon))
+
+    params = {"radius_km": radius_km, "max_neighbors": max_neighbors}
+    incremental = (
+        previous is not None
+        and change_logs is not None
+        and {k: previous.meta.get(k) for k in params} == params
+    )
+
+    id_set = set(ids.tolist())
+    kept = (np.empty(0, dtype=np.int64),) * 2 + (np.empty(0, dtype=np.float32), np.empty(0, dtype=bool))
+    routed_pairs = {}
+    if not incremental:
+        affected = np.arange(n, dtype=np.int64)
+    else:
+        prev_ids = previous.location_ids
+        prev_row = np.full(n, -1, dtype=np.int64)
+        if len(prev_ids):
+            pos = np.minimum(np.searchsorted(prev_ids, ids), len(prev_ids) - 1)
+            prev_row = np.where(prev_ids[pos] == ids, pos, -1)
+        known = prev_row >= 0
+
+        # new or moved places change neighbour sets; a logged change (e.g. a new category)
+        # only changes the detour estimate of edges touching the place
+        moved = ~known
+        moved[known] = (previous.latitude[prev_row[known]] != lat[known]) | (previous.longitude[prev_row[known]] != lon[known])
+        dirty = moved | np.isin(ids, np.fromiter(_changed_ids(change_logs), dtype=np.int64))
+
+        prev_src, prev_dst, prev_km, prev_routed = previous.edges()
+        new_row_of_prev = np.full(len(prev_ids), -1, dtype=np.int64)
+        new_row_of_prev[prev_row[known]] = np.flatnonzero(known)
+        # previous rows that vanished or are dirty invalidate every row listing them
+        stale_prev = np.ones(len(prev_ids), dtype=bool)
+        stale_prev[prev_row[known & ~dirty]] = False
+
+        affected_mask = dirty.copy()
+        src_now = new_row_of_prev[prev_src]
+        affected_mask[src_now[stale_prev[prev_dst] & (src_now >= 0)]] = True
+        # and places near a new or moved one may now have it among their nearest
+        for row in np.flatnonzero(moved).tolist():
+            affected_mask[grid.within(lat[row], lon[row], radius_km)] = True
+        affected = np.flatnonzero(affected_mask)
+
+        keep = (src_now >= 0) & ~affected_mask[np.maximum(src_now, 0)] & ~stale_prev[prev_dst]
+        kept = (src_now[keep], new_row_of_prev[prev_dst[keep]], prev_km[keep], prev_routed[keep])
+
+        # routes between two places that did not move stay valid in rebuilt rows too
+        moved_ids = set(ids[moved].tolist())
+        for s, d, km in zip(prev_ids[prev_src[prev_routed]].tolist(), prev_ids[prev_dst[prev_routed]].tolist(),
+                            prev_km[prev_routed].tolist()):
+            if s not in moved_ids and d not in moved_ids and s in id_set and d in id_set:
+                routed_pairs[(s, d)] = km
+
+    src, dst, straight = _nearest(grid, lat, lon, affected, radius_km, max_neighbors)
+    km = (straight * (factors[src] + factors[dst]) / 2.0).astype(np.float32)
+    routed = np.zeros(len(src), dtype=bool)
+    if routed_pairs:
+        for j, key in enumerate(zip(ids[src].tolist(), ids[dst].tolist())):
+            hit = routed_pairs.get(key)
+            if hit is not None:
+                km[j], routed[j] = hit, True
+
+    indptr, indices, km, routed = _to_csr(
+        n,
+        np.concatenate([kept[0], src]),
+        np.concatenate([kept[1], dst]),
+        np.concatenate([kept[2], km]).astype(np.float32),
+        np.concatenate([kept[3], routed]),
+    )
+    meta = dict(params, built_at=datetime.now(timezone.utc).isoformat(),
+                last_change_log=previous.meta.get("last_change_log") if incremental else None)
+    return PlaceGraph(ids, lat, lon, indptr, indices, km, routed, meta), len(affected)
+
+
+def refine_routes(graph: PlaceGraph, budget: int = ROUTE_BUDGET) -> int:
+    """Route up to `budget` estimated edges with ORS, shortest first; both directions are
+    updated. Returns the number of edges that got a routed distance."""
+    from scripts.prescriptive.distance import route_distance_km
+
+    if budget <= 0 or not graph.nnz:
+        return 0
+
+    src, dst, km, routed = graph.edges()
+    # one call per unordered pair. kNN edges are asymmetric: a pair may only exist as
+    # src > dst, so the representative is the first edge of each (min, max) pair
+    todo = np.flatnonzero(~routed)
+    lo = np.minimum(src[todo], dst[todo]).astype(np.int64)
+    hi = np.maximum(src[todo], dst[todo]).astype(np.int64)
+    _, first = np.unique(lo * len(graph) + hi, return_index=True)
+    pending = todo[np.sort(first)]
+    pending = pending[np.argsort(km[pending], kind="stable")[:budget]]
+    if not len(pending):
+        return 0
+
+    def route(j):
+        try:
+            return route_distance_km((graph.latitude[src[j]], graph.longitude[src[j]]),
+                                     (graph.latitude[dst[j]], graph.longitude[dst[j]]))
+        except Exception:
+            return np.nan
+
+    with ThreadPoolExecutor(max_workers=ROUTE_WORKERS) as pool:
+        fresh = np.fromiter(pool.map(route, pending.tolist()), dtype=np.float64, count=len(pending))
+
+    ok = np.isfinite(fresh)
+    pending, fresh = pending[ok], fresh[ok]
+    graph.km[pending] = fresh
+    graph.routed[pending] = True
+
+    # the reverse edge, where the other place also lists this one
+    pair = pd.Series(np.arange(len(src)), index=pd.MultiIndex.from_arrays([src, dst]))
+    reverse = pair.reindex(pd.MultiIndex.from_arrays([dst[pending], src[pending]])).to_numpy()
+    has_reverse = ~np.isnan(reverse)
+    graph.km[reverse[has_reverse].astype(np.int64)] = fresh[has_reverse]
+    graph.routed[reverse[has_reverse].astype(np.int64)] = True
+
+    # rows stay sorted nearest first
+    graph.indptr, graph.indices, graph.km, graph.routed = _to_csr(len(graph), src, dst, graph.km, graph.routed)
+    return int(len(pending))
+
+
+def publish_place_graph(graph: PlaceGraph, client, bucket: str) -> str:
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        location_ids=graph.location_ids,
+        latitude=graph.latitude,
+        longitude=graph.longitude,
+        indptr=graph.indptr,
+        indices=graph.indices,
+        km=graph.km,
+        routed=graph.routed,
+        meta=np.array(json.dumps(graph.meta)),
+    )
+    body = buf.getvalue()
+    client.put_object(bucket, staged_name(PLACE_GRAPH_OBJECT), data=io.BytesIO(body), length=len(body),
+                      content_type="application/octet-stream", metadata=run_metadata())
+    graph.version = hashlib.sha1(body).hexdigest()[:16]
+    return graph.version
+
+
+def _read_graph(body: bytes) -> PlaceGraph:
+    with np.load(io.BytesIO(body), allow_pickle=False) as data:
+        return PlaceGraph(
+            data["location_ids"], data["latitude"], data["longitude"],
+            data["indptr"], data["indices"], data["km"], data["routed"],
+            json.loads(str(data["meta"])),
+            version=hashlib.sha1(body).hexdigest()[:16],
+        )
+
+
+def load_place_graph(client, bucket: str):
+    """Current place graph, re-read only when its ETag changes; None if none is published."""
+    object_name = resolve_name(client, bucket, PLACE_GRAPH_OBJECT)
+    try:
+        etag = client.stat_object(bucket, object_name).etag
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return None
+        raise
+
+    with _LOCK:
+        if _GRAPH["etag"] == etag:
+            return _GRAPH["graph"]
+
+        resp = client.get_object(bucket, object_name)
+        try:
+            body = resp.read()
+        finally:
+            resp.close()
+            resp.release_conn()
+
+        graph = _read_graph(body)
+        _GRAPH["etag"], _GRAPH["graph"] = etag, graph
+        return graph
+
+
+def suggest_outings(candidates: list, catalog, crowd_levels, allowed: np.ndarray, weather_category: str,
+                    graph: PlaceGraph, rules) -> list:
+    """Best 2..max_stops stop outings starting at the ranked candidates, from precomputed
+    place × place distances only. Each stop after the first is scored like a
+    recommendation with its leg distance as the distance, so a far hop costs as much as a
+    far first stop; no stop repeats a category."""
+    from .priority import compute_priority_scores
+
+    if graph is None or rules.outing_max_stops < 2 or not candidates or not len(catalog):
+        return []
+
+    graph_rows = graph.rows_for(catalog)
+    catalog_of_graph = np.full(len(graph), -1, dtype=np.int64)
+    catalog_of_graph[graph_rows[graph_rows >= 0]] = np.flatnonzero(graph_rows >= 0)
+
+    position = pd.Index(catalog.location_ids)
+    categories = catalog.category
+    beam = []
+    for c in candidates:
+        row = position.get_indexer([c["location_id"]])[0]
+        if row < 0 or c.get("distance_km") is None:
+            continue
+        first = {"row": int(row), "leg_km": float(c["distance_km"]), "leg_source": c.get("distance_source"),
+                 "score": float(c["priority_score"])}
+        beam.append(([first], float(c["distance_km"])))
+
+    outings = []
+    for _ in range(rules.outing_max_stops - 1):
+        extended = []
+        for stops, total in beam:
+            g = graph_rows[stops[-1]["row"]]
+            if g < 0:
+                continue
+            cols, km, routed = graph.neighbors(g)
+            rows = catalog_of_graph[cols]
+            ok = (rows >= 0) & (km <= rules.outing_max_leg_km) & (total + km <= rules.outing_max_total_km)
+            ok[ok] = allowed[rows[ok]]
+            seen_rows = {s["row"] for s in stops}
+            seen_categories = {categories[s["row"]] for s in stops}
+            ok[ok] = [r not in seen_rows and categories[r] not in seen_categories for r in rows[ok].tolist()]
+            if not ok.any():
+                continue
+
+            rows, km, routed = rows[ok], km[ok].astype(np.float64), routed[ok]
+            scores = compute_priority_scores(km, categories[rows], crowd_levels[rows], weather_category, rules)
+            for j in np.argsort(-scores, kind="stable")[:rules.outing_suggestions].tolist():
+                stop = {"row": int(rows[j]), "leg_km": float(km[j]), "leg_source": "ors" if routed[j] else "estimate",
+                        "score": float(scores[j])}
+                extended.append((stops + [stop], total + float(km[j])))
+
+        if not extended:
+            break
+        outings.extend(extended)
+        # keep the beam small: the best few partial outings per depth
+        extended.sort(key=lambda o: -np.mean([s["score"] for s in o[0]]))
+        beam = extended[:max(rules.outing_suggestions * 3, 10)]
+
+    ranked = sorted(outings, key=lambda o: (-np.mean([s["score"] for s in o[0]]), o[1]))
+    suggestions, used_first = [], set()
+    for stops, total in ranked:
+        # one suggestion per first stop, so the list is not three variations of one walk
+        if stops[0]["row"] in used_first:
+            continue
+        used_first.add(stops[0]["row"])
+        suggestions.append({
+            "stops": [
+                # a stop's distance_km is its leg: from the user for the first stop, else from the previous stop
+                dict(catalog.record(s["row"], round(s["leg_km"], 3), round(s["score"], 4)).to_dict(),
+                     leg_source=s["leg_source"])
+                for s in stops
+            ],
+            "total_km": round(total, 3),
+            "score": round(float(np.mean([s["score"] for s in stops])), 4),
+        })
+        if len(suggestions) >= rules.outing_suggestions:
+            break
+    return suggestions
@@ -0,0 +1,218 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+from minio.error import S3Error
+
+from scripts.load.run_context import resolve_name, run_metadata, stage_removal, staged_name
+
+from .catalog import catalog_from_chunks
+from .catalog_snapshot import GridIndex, build_grid_index, GRID_CELL_DEG
+from .geo import EARTH_RADIUS_KM
+
+SHARD_PREFIX = "silver/places/"
+MANIFEST_OBJECT = SHARD_PREFIX + "manifest.json"
+
+# precision 4 cells are ~0.18° × 0.35° (about 20 × 39 km near the equator)
+GEOHASH_PRECISION = int(os.getenv("PLACES_SHARD_PRECISION", "4"))
+NEIGHBORHOOD_KM = float(os.getenv("PLACES_NEIGHBORHOOD_KM", "25"))
+CACHE_SIZE = int(os.getenv("PLACES_SHARD_CACHE_SIZE", "16"))
+
+# rows without usable coordinates cannot be placed on the map but are kept
+UNLOCATED_SHARD = "unlocated"
+# bookkeeping column, excluded from the shard content hash
+UPDATED_COLUMN = "updated_at_utc"
+
+_BASE32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+_LOCK = threading.Lock()
+_CATALOGS = OrderedDict()
+
+
+def geohash_encode(lat, lon, precision: int = GEOHASH_PRECISION) -> np.ndarray:
+    """Vectorised geohash of each (lat, lon); NaN coordinates map to UNLOCATED_SHARD."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    lat_i = np.clip(np.floor((np.where(valid, lat, 0) + 90.0) / 180.0 * (1 << lat_bits)), 0, (1 << lat_bits) - 1)
+    lon_i = np.clip(np.floor((np.where(valid, lon, 0) + 180.0) / 360.0 * (1 << lon_bits)), 0, (1 << lon_bits) - 1)
+    lat_i, lon_i = lat_i.astype(np.int64), lon_i.astype(np.int64)
+
+    # bits interleave starting with longitude
+    code = np.zeros(lat.shape, dtype=np.int64)
+    for i in range(bits):
+        if i % 2 == 0:
+            bit = (lon_i >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_i >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+
+    chars = [_BASE32[(code >> (5 * (precision - 1 - k))) & 31] for k in range(precision)]
+    hashes = reduce(np.char.add, chars) if precision > 1 else chars[0]
+    return np.where(valid, hashes, UNLOCATED_SHARD)
+
+
+def covering_geohashes(lat: float, lon: float, radius_km: float, precision: int = GEOHASH_PRECISION) -> list:
+    """Geohash cells overlapping the bounding box of the radius."""
+    bits = 5 * precision
+    cell_lat = 180.0 / (1 << (bits // 2))
+    cell_lon = 360.0 / (1 << ((bits + 1) // 2))
+
+    dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = min(180.0, dlat / max(np.cos(np.radians(lat)), 1e-6))
+
+    # sample at half a cell so every overlapped cell gets at least one point
+    lats = np.clip(np.append(np.arange(lat - dlat, lat + dlat, cell_lat / 2), lat + dlat), -90.0, 90.0)
+    lons = np.append(np.arange(lon - dlon, lon + dlon, cell_lon / 2), lon + dlon)
+    lons = (lons + 180.0) % 360.0 - 180.0
+
+    grid_lat, grid_lon = np.meshgrid(lats, lons)
+    return sorted(set(geohash_encode(grid_lat.ravel(), grid_lon.ravel(), precision).tolist()))
+
+
+def shard_object(geohash: str) -> str:
+    return f"{SHARD_PREFIX}gh={geohash}/places.csv"
+
+
+def _shard_hash(df: pd.DataFrame) -> str:
+    content = df.drop(columns=[UPDATED_COLUMN], errors="ignore").sort_values("location_id")
+    return hashlib.sha1(content.to_csv(index=False).encode("utf-8")).hexdigest()[:16]
+
+
+def load_manifest(client, bucket: str):
+    try:
+        resp = client.get_object(bucket, resolve_name(client, bucket, MANIFEST_OBJECT))
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return None
+        raise
+    try:
+        return json.loads(resp.read())
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+def write_shards(df: pd.DataFrame, client, bucket: str) -> dict:
+    """Split the silver places by geohash prefix and rewrite only the shards whose rows changed.
+
+    Returns the new manifest; `changed` / `removed` list what this run wrote.
+    """
+    previous = load_manifest(client, bucket) or {}
+    old_shards = previous.get("shards", {})
+    # a precision change re-keys every shard, so nothing can be reused
+    reusable = old_shards if previous.get("precision") == GEOHASH_PRECISION else {}
+
+    lat = pd.to_numeric(df["latitude"], errors="coerce").to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df["longitude"], errors="coerce").to_numpy(dtype=np.float64)
+    keys = geohash_encode(lat, lon)
+
+    shards, changed = {}, []
+    for geohash, rows in df.groupby(keys, sort=True):
+        digest = _shard_hash(rows)
+        old = reusable.get(geohash)
+        if old and old["hash"] == digest:
+            shards[geohash] = old
+            continue
+
+        body = rows.to_csv(index=False).encode("utf-8")
+        client.put_object(bucket, staged_name(shard_object(geohash)), data=io.BytesIO(body),
+                          length=len(body), content_type="text/csv", metadata=run_metadata())
+
+        in_shard = keys == geohash
+        shards[geohash] = {
+            "object": shard_object(geohash),
+            "rows": int(len(rows)),
+            "hash": digest,
+            "bbox": None if geohash == UNLOCATED_SHARD else [
+                float(lat[in_shard].min()), float(lon[in_shard].min()),
+                float(lat[in_shard].max()), float(lon[in_shard].max()),
+            ],
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        changed.append(geohash)
+
+    removed = sorted(g for g in old_shards if old_shards[g]["object"] not in {s["object"] for s in shards.values()})
+
+    h = hashlib.sha1(json.dumps({k: v["hash"] for k, v in shards.items()}, sort_keys=True).encode("utf-8"))
+    manifest = {
+        "version": h.hexdigest()[:16],
+        "precision": GEOHASH_PRECISION,
+        "rows": int(sum(s["rows"] for s in shards.values())),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "shards": shards,
+    }
+
+    # the manifest goes last: readers see either the old or the new shard set
+    if changed or removed or previous.get("version") != manifest["version"]:
+        body = json.dumps(manifest).encode("utf-8")
+        client.put_object(bucket, staged_name(MANIFEST_OBJECT), data=io.BytesIO(body),
+                          length=len(body), content_type="application/json", metadata=run_metadata())
+    for geohash in removed:
+        stage_removal(client, bucket, old_shards[geohash]["object"])
+
+    print(f"[OK] places shards: {len(changed)} rewritten, {len(removed)} removed, "
+          f"{len(shards) - len(changed)} unchanged ({manifest['rows']} rows)")
+    manifest["changed"], manifest["removed"] = changed, removed
+    return manifest
+
+
+def _read_shard(client, bucket: str, object_name: str) -> pd.DataFrame:
+    resp = client.get_object(bucket, resolve_name(client, bucket, object_name))
+    try:
+        return pd.read_csv(resp, keep_default_na=False, dtype=str)
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+def read_shards_frame(client, bucket: str, manifest=None):
+    """Every shard as one string-typed DataFrame, or None when no manifest exists."""
+    manifest = manifest or load_manifest(client, bucket)
+    if manifest is None:
+        return None
+    frames = [_read_shard(client, bucket, s["object"]) for _, s in sorted(manifest["shards"].items())]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def load_shard_catalog(client, bucket: str, near=None, radius_km: float = NEIGHBORHOOD_KM, manifest=None):
+    """Catalog of the shards covering `near` (lat, lon) within radius_km, or every shard when
+    near is None. Returns None when no manifest has been published yet."""
+    manifest = manifest or load_manifest(client, bucket)
+    if manifest is None:
+        return None
+
+    shards = manifest["shards"]
+    if near is None:
+        selected = sorted(shards)
+    else:
+        wanted = covering_geohashes(near[0], near[1], radius_km, manifest["precision"])
+        selected = [g for g in wanted if g in shards]
+
+    key = tuple((g, shards[g]["hash"]) for g in selected)
+    with _LOCK:
+        catalog = _CATALOGS.get(key)
+        if catalog is not None:
+            _CATALOGS.move_to_end(key)
+            return catalog
+
+    catalog = catalog_from_chunks(_read_shard(client, bucket, shards[g]["object"]) for g in selected)
+    # content-derived version, so ranking caches stay valid while these shards are unchanged
+    catalog.version = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+    catalog.grid = GridIndex(GRID_CELL_DEG, *build_grid_index(catalog.latitude, catalog.longitude))
+
+    with _LOCK:
+        _CATALOGS[key] = catalog
+        while len(_CATALOGS) > CACHE_SIZE:
+            _CATALOGS.popitem(last=False)
+    return catalog
@@ -0,0 +1,70 @@
+import numpy as np
+
+from .geo import haversine_km_array
+
+# rules are applied in this order; each count is the places that rule removed
+# from what the rules before it left. min_km (and the road-distance part of max_km)
+# is counted by the caller once distances are known
+RULES = ("inactive", "max_km", "weather", "crowd_level", "category", "min_km")
+
+
+def weather_allows(rules, weather_category) -> bool:
+    """weather.allowed_categories is a gate for the whole catalog: in weather outside
+    the list (rain, storm with the default rules) every place is dropped and the
+    decision is no_candidates. Unknown weather (no silver weather row) passes, as
+    unknown crowd levels do: there is nothing to judge it on."""
+    if not rules.allowed_weather or weather_category in (None, "unknown"):
+        return True
+    return weather_category in rules.allowed_weather
+
+
+def eligible_mask(places, rules, weather_category, crowd_levels, origin=None, apply_preferences=True):
+    """Compile rules.yaml into boolean masks over the catalog, before any routing or scoring.
+
+    Returns (mask, drops). Distances here are straight-line, so the max_km cut never
+    drops a place whose road distance could still be within range.
+    """
+    n = len(places)
+    drops = dict.fromkeys(RULES, 0)
+
+    mask = places.is_active & np.isfinite(places.latitude) & np.isfinite(places.longitude)
+    drops["inactive"] = int(n - mask.sum())
+
+    def apply(name, keep):
+        nonlocal mask
+        after = mask & keep
+        drops[name] += int(mask.sum() - after.sum())
+        mask = after
+
+    if origin is not None and np.isfinite(rules.max_km):
+        near = np.zeros(n, dtype=bool)
+        if places.grid is not None:
+            # grid cells around the origin first, exact distance only for those rows
+            rows = places.grid.within(origin[0], origin[1], rules.max_km)
+            near[rows] = haversine_km_array(origin[0], origin[1], places.latitude[rows], places.longitude[rows]) <= rules.max_km
+        else:
+            near = haversine_km_array(origin[0], origin[1], places.latitude, places.longitude) <= rules.max_km
+        apply("max_km", near)
+
+    if not weather_allows(rules, weather_category):
+        apply("weather", np.zeros(n, dtype=bool))
+
+    if rules.allowed_crowd_levels:
+        # unknown crowd levels pass: there is nothing to judge them on
+        allowed = np.array([c in rules.allowed_crowd_levels for c in crowd_levels.categories] + [True])
+        apply("crowd_level", allowed[crowd_levels.codes])
+
+    if apply_preferences and rules.preferred_categories:
+        preferred = np.array([c in rules.preferred_categories for c in places.categories] + [False])
+        keep = preferred[places.category_codes]
+        # a preference, not a hard rule: relaxed when nothing preferred is left
+        if (mask & keep).any():
+            apply("category", keep)
+
+    return mask, drops
+
+
+def distance_mask(distances: np.ndarray, rules) -> np.ndarray:
+    """min_km / max_km on road (routed or estimated) distances; unknown distances pass."""
+    d = np.asarray(distances, dtype=np.float64)
+    return np.isnan(d) | ((d >= rules.min_km) & (d <= rules.max_km))
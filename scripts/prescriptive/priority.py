@@ -1,31 +1,48 @@
-from .rules_loader import load_rules
+import numpy as np
+import pandas as pd
 
+from .rules_loader import get_rules
 
-def compute_priority_score(candidate: dict) -> float:
-    rules = load_rules()
 
-    s = rules["scoring"]
-    w = s["weights"]
+def compute_priority_score(candidate: dict, rules=None) -> float:
+    if rules is None:
+        rules = get_rules()
+
+    score = (
+        rules.w_distance * rules.distance_score(candidate["distance_km"]) +
+        rules.w_category * rules.category_score.get(candidate["category"], 0.0) +
+        rules.w_crowd * rules.crowd_score.get(candidate["crowd_level"], 0.0) +
+        rules.w_weather * rules.weather_score.get(candidate["weather"], 0.0)
+    )
+
+    return round(score, 3)
 
-    dist_cfg = s["distance_score"]
-    d = candidate["distance_km"]
 
-    if d <= dist_cfg["near_km"]:
-        distance_score = 1.0
-    elif d >= dist_cfg["far_km"]:
-        distance_score = 0.0
-    else:
-        distance_score = 1.0 - ((d - dist_cfg["near_km"]) / (dist_cfg["far_km"] - dist_cfg["near_km"]))
+def _lookup(values, table: dict) -> np.ndarray:
+    if isinstance(values, pd.Categorical):
+        # one dict lookup per distinct label, then a gather over the codes (-1 → 0.0)
+        lut = np.array([table.get(c, 0.0) for c in values.categories] + [0.0], dtype=np.float64)
+        return lut[values.codes]
+    return pd.Series(values).map(table).fillna(0.0).to_numpy(dtype=np.float64)
 
-    category_score = s["category_score"].get(candidate["category"], 0.0)
-    crowd_score = s["crowd_score"].get(candidate["crowd_level"], 0.0)
-    weather_score = s["weather_score"].get(candidate["weather"], 0.0)
+
+def compute_priority_scores(distance_km, categories, crowd_levels, weather, rules=None) -> np.ndarray:
+    # vectorized compute_priority_score over the whole catalog
+    if rules is None:
+        rules = get_rules()
+
+    d = np.asarray(distance_km, dtype=np.float64)
+    distance_score = np.clip(1.0 - (d - rules.near_km) / (rules.far_km - rules.near_km), 0.0, 1.0)
+
+    category_score = _lookup(categories, rules.category_score)
+    crowd_score = _lookup(crowd_levels, rules.crowd_score)
+    weather_score = rules.weather_score.get(weather, 0.0)
 
     score = (
-        w["distance"] * distance_score +
-        w["category"] * category_score +
-        w["crowd"] * crowd_score +
-        w["weather"] * weather_score
+        rules.w_distance * distance_score +
+        rules.w_category * category_score +
+        rules.w_crowd * crowd_score +
+        rules.w_weather * weather_score
     )
 
-    return round(score, 3)
+    return np.round(score, 3)
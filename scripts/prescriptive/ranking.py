@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def top_k_indices(scores, k: int) -> np.ndarray:
+    # O(n) selection of the k best scores, then a sort of only those k.
+    # Ties keep catalog order, same as a stable sorted(..., reverse=True)[:k].
+    scores = np.asarray(scores, dtype=np.float64)
+    n = len(scores)
+
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        idx = np.concatenate([above, ties])
+    else:
+        idx = np.arange(n)
+
+    order = np.lexsort((idx, -scores[idx]))
+    return idx[order]
@@ -5,6 +5,13 @@ from minio import Minio
 from dotenv import load_dotenv
 import os
 
+from scripts.load.run_context import resolve_name
+
+from .catalog_snapshot import load_snapshot_catalog
+from .place_shards import NEIGHBORHOOD_KM, load_manifest, load_shard_catalog
+from .crowd import load_crowd_table
+from .place_graph import load_place_graph
+
 BASE_DIR = Path(__file__).resolve().parents[3]
 load_dotenv(BASE_DIR / ".env")
 
@@ -20,7 +27,7 @@ def _minio_client():
 
 def _read_csv(object_name: str) -> pd.DataFrame:
     client = _minio_client()
-    resp = client.get_object(MINIO_BUCKET, object_name)
+    resp = client.get_object(MINIO_BUCKET, resolve_name(client, MINIO_BUCKET, object_name))
     raw = resp.read()
     resp.close()
     resp.release_conn()
@@ -34,7 +41,7 @@ def get_latest_screen_time():
         return None
     # pick the latest by timestamp_utc
     df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"])
-    row = df.sort_values("timestamp_utc", ascending=False).iloc[0]
+    row = df.loc[df["timestamp_utc"].idxmax()]
     return row.to_dict()
 
 
@@ -45,7 +52,7 @@ def get_latest_user_location():
         return None
     # location uses resolved_at_utc
     df["resolved_at_utc"] = pd.to_datetime(df["resolved_at_utc"])
-    row = df.sort_values("resolved_at_utc", ascending=False).iloc[0]
+    row = df.loc[df["resolved_at_utc"].idxmax()]
     return row.to_dict()
 
 
@@ -55,14 +62,39 @@ def get_latest_weather():
     if df.empty:
         return None
     df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"])
-    row = df.sort_values("timestamp_utc", ascending=False).iloc[0]
+    row = df.loc[df["timestamp_utc"].idxmax()]
     return row.to_dict()
 
 
-def get_places():
-    obj = "silver/places.csv"
-    df = _read_csv(obj)
-    return df
+def get_crowd_table():
+    return load_crowd_table(_minio_client(), MINIO_BUCKET)
+
+
+def get_place_graph():
+    return load_place_graph(_minio_client(), MINIO_BUCKET)
+
+
+def get_place_manifest():
+    return load_manifest(_minio_client(), MINIO_BUCKET)
+
+
+def get_place_catalog(near=None, manifest=None):
+    """Places around `near` (lat, lon), or the whole catalog without a location. Read from
+    the memory-mapped snapshot published by places_upsert; the geohash shards are the
+    fallback until one is published."""
+    client = _minio_client()
+
+    catalog = load_snapshot_catalog(client, MINIO_BUCKET, near=near, radius_km=NEIGHBORHOOD_KM)
+    if catalog is not None:
+        return catalog
+
+    catalog = load_shard_catalog(client, MINIO_BUCKET, near=near, manifest=manifest)
+    if catalog is not None:
+        return catalog
+
+    # silver/places.csv is no longer written; serving it would freeze the catalog
+    raise RuntimeError("No place catalog published (no snapshot, no shard manifest); "
+                       "run scripts.transform.places_upsert")
 
 
 if __name__ == "__main__":
@@ -1,7 +1,31 @@
 from pathlib import Path
+import hashlib
+import os
+import threading
+import time
+
 import yaml
 
+RELOAD_CHECK_SECONDS = float(os.getenv("RULES_RELOAD_CHECK_SECONDS", "5"))
+
+SCREEN_TIME_LEVELS = ("low", "medium", "high", "critical")
+
+REQUIRED_KEYS = {
+    "user_activity": {"active_hours": {"start", "end"}},
+    "screen_time": {"thresholds_minutes": set(SCREEN_TIME_LEVELS)},
+    "distance": {"reset_cooldown_if_move_km"},
+    "cooldown": {"minutes"},
+    "scoring": {
+        "weights": {"distance", "category", "crowd", "weather"},
+        "distance_score": {"near_km", "far_km"},
+        "category_score": set(),
+        "crowd_score": set(),
+        "weather_score": set(),
+    },
+}
+
 _RULES = None
+_LOCK = threading.Lock()
 
 
 def _find_rules_yaml(start: Path) -> Path:
@@ -14,11 +38,134 @@ def _find_rules_yaml(start: Path) -> Path:
     raise FileNotFoundError("rules.yaml not found in any parent directory")
 
 
-def load_rules():
+def _validate(raw, spec, path="rules"):
+    if not isinstance(raw, dict):
+        raise RuntimeError(f"{path} must be a mapping")
+
+    for key in spec:
+        if key not in raw:
+            raise RuntimeError(f"{path}.{key} missing in rules.yaml")
+        if isinstance(spec, dict):
+            _validate(raw[key], spec[key], f"{path}.{key}")
+
+
+def _hour(value: str) -> int:
+    return int(str(value).split(":")[0])
+
+
+class CompiledRules:
+    """rules.yaml flattened into plain attributes so scoring never walks YAML dicts."""
+
+    def __init__(self, raw: dict, version: str, path: Path = None, mtime: float = None):
+        _validate(raw, REQUIRED_KEYS)
+
+        self.raw = raw
+        self.version = version
+        self.path = path
+        self.mtime = mtime
+        self._checked_at = 0.0
+
+        active = raw["user_activity"]["active_hours"]
+        self.active_start_h = _hour(active["start"])
+        self.active_end_h = _hour(active["end"])
+
+        thresholds = raw["screen_time"]["thresholds_minutes"]
+        self.screen_thresholds = tuple(float(thresholds[level]) for level in SCREEN_TIME_LEVELS)
+        self.medium_threshold = self.screen_thresholds[1]
+
+        self.cooldown_seconds = float(raw["cooldown"]["minutes"]) * 60
+
+        distance = raw["distance"]
+        self.reset_cooldown_km = float(distance["reset_cooldown_if_move_km"])
+        self.min_km = float(distance.get("min_km", 0.0))
+        self.max_km = float(distance.get("max_km", float("inf")))
+        self.reroute_km = float(distance.get("reroute_if_move_km", 0.5))
+
+        scoring = raw["scoring"]
+        weights = scoring["weights"]
+        self.w_distance = float(weights["distance"])
+        self.w_category = float(weights["category"])
+        self.w_crowd = float(weights["crowd"])
+        self.w_weather = float(weights["weather"])
+
+        self.near_km = float(scoring["distance_score"]["near_km"])
+        self.far_km = float(scoring["distance_score"]["far_km"])
+        if self.far_km <= self.near_km:
+            raise RuntimeError("rules.scoring.distance_score.far_km must be greater than near_km")
+
+        self.category_score = {k: float(v) for k, v in scoring["category_score"].items()}
+        self.crowd_score = {k: float(v) for k, v in scoring["crowd_score"].items()}
+        self.weather_score = {k: float(v) for k, v in scoring["weather_score"].items()}
+
+        self.crowd_category_map = dict((raw.get("crowdedness") or {}).get("category_map") or {})
+        self.allowed_weather = frozenset((raw.get("weather") or {}).get("allowed_categories") or ())
+
+        recommendation = raw.get("recommendation") or {}
+        self.allowed_crowd_levels = frozenset(recommendation.get("allowed_crowd_levels") or ())
+        self.preferred_categories = frozenset(recommendation.get("preferred_categories") or ())
+        self.max_results = int(recommendation.get("max_results", 5))
+
+        # multi-stop suggestions over the precomputed place graph; max_stops < 2 turns them off
+        outings = raw.get("outings") or {}
+        self.outing_max_stops = int(outings.get("max_stops", 3))
+        self.outing_max_leg_km = float(outings.get("max_leg_km", 2.0))
+        self.outing_max_total_km = float(outings.get("max_total_km", self.max_km))
+        self.outing_suggestions = int(outings.get("suggestions", 3))
+
+    def classify_screen_time(self, minutes) -> str:
+        for level, threshold in zip(SCREEN_TIME_LEVELS[:0:-1], self.screen_thresholds[:0:-1]):
+            if minutes >= threshold:
+                return level
+        return SCREEN_TIME_LEVELS[0]
+
+    def distance_score(self, d: float) -> float:
+        if d <= self.near_km:
+            return 1.0
+        if d >= self.far_km:
+            return 0.0
+        return 1.0 - ((d - self.near_km) / (self.far_km - self.near_km))
+
+
+def compile_rules(path: Path) -> CompiledRules:
+    raw_bytes = path.read_bytes()
+    raw = yaml.safe_load(raw_bytes)
+    version = hashlib.sha256(raw_bytes).hexdigest()[:12]
+    return CompiledRules(raw, version, path=path, mtime=path.stat().st_mtime)
+
+
+def get_rules() -> CompiledRules:
     global _RULES
-    if _RULES is None:
-        here = Path(__file__).resolve()
-        path = _find_rules_yaml(here)
-        with open(path, "r") as f:
-            _RULES = yaml.safe_load(f)
-    return _RULES
+
+    rules = _RULES
+    now = time.monotonic()
+
+    if rules is not None and now - rules._checked_at < RELOAD_CHECK_SECONDS:
+        return rules
+
+    with _LOCK:
+        rules = _RULES
+        if rules is None:
+            path = _find_rules_yaml(Path(__file__).resolve())
+            rules = compile_rules(path)
+        else:
+            try:
+                mtime = rules.path.stat().st_mtime
+            except OSError:
+                mtime = rules.mtime
+            if mtime != rules.mtime:
+                try:
+                    rules = compile_rules(rules.path)
+                    print(f"[RULES] Reloaded rules.yaml (version {rules.version})")
+                except Exception as exc:
+                    # keep serving the last good rules until the file is fixed
+                    print(f"[RULES] Reload failed, keeping version {rules.version}: {exc}")
+                    rules.mtime = mtime
+
+        rules._checked_at = now
+        _RULES = rules
+
+    return rules
+
+
+def load_rules():
+    return get_rules().raw
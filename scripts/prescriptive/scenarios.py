@@ -0,0 +1,304 @@
+import argparse
+import copy
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from .crowd import CROWD_LEVELS, hour_of_week
+from .distance_model import load_detour_model, estimate_distances
+from .prefilter import weather_allows
+from .rules_loader import CompiledRules, get_rules
+
+SCENARIO_PREFIX = "gold/scenarios/"
+# variants scored per task; a task holds a [variants × places] float matrix
+CHUNK_VARIANTS = int(os.getenv("SCENARIO_CHUNK_VARIANTS", "128"))
+DEFAULT_WORKERS = int(os.getenv("SCENARIO_WORKERS", str(os.cpu_count() or 1)))
+
+# set in the parent before the pool forks, so workers share the catalog and
+# per-context arrays copy-on-write instead of receiving them pickled
+_SHARED = {}
+
+
+def apply_overrides(raw: dict, overrides: dict) -> dict:
+    """Copy of a rules.yaml dict with dotted-path overrides, e.g. {"scoring.weights.crowd": 0}."""
+    raw = copy.deepcopy(raw)
+    for path, value in overrides.items():
+        node = raw
+        *parents, leaf = path.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+    return raw
+
+
+def expand_variants(spec: dict, base_raw: dict) -> list:
+    """[(name, CompiledRules)]: the unmodified rules first, then explicit variants, then
+    the cartesian product of `grid`."""
+    variants = [("baseline", {})]
+    for v in spec.get("variants") or []:
+        variants.append((v["name"], v.get("set") or {}))
+
+    grid = spec.get("grid") or {}
+    keys = sorted(grid)
+    for values in itertools.product(*(grid[k] for k in keys)):
+        overrides = dict(zip(keys, values))
+        variants.append((",".join(f"{k}={v}" for k, v in overrides.items()), overrides))
+
+    compiled = []
+    for name, overrides in variants:
+        raw = apply_overrides(base_raw, overrides)
+        version = hashlib.sha256(json.dumps(raw, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        compiled.append((name, CompiledRules(raw, version)))
+    return compiled
+
+
+def _label_lut(labels, rules_list, table_of, default=0.0) -> np.ndarray:
+    # [variants × labels + 1]; the extra column is for code -1 (unknown label)
+    return np.array(
+        [[table_of(r).get(label, default) for label in labels] + [default] for r in rules_list],
+        dtype=np.float64,
+    )
+
+
+def score_variants(rules_list: list, places, distances: np.ndarray, crowd_codes: np.ndarray,
+                   weather_category: str, screen_minutes: float, top_k: int) -> list:
+    """Score every variant against one context in a single [variants × places] pass."""
+    v = len(rules_list)
+    col = lambda values: np.array(values, dtype=np.float64)[:, None]
+
+    d = np.nan_to_num(distances, nan=9999.0)[None, :]
+    near, far = col([r.near_km for r in rules_list]), col([r.far_km for r in rules_list])
+    distance_score = np.clip(1.0 - (d - near) / (far - near), 0.0, 1.0)
+
+    category_score = _label_lut(places.categories, rules_list, lambda r: r.category_score)[:, places.category_codes]
+    crowd_score = _label_lut(CROWD_LEVELS, rules_list, lambda r: r.crowd_score)[:, crowd_codes]
+    weather_score = col([r.weather_score.get(weather_category, 0.0) for r in rules_list])
+
+    scores = np.round(
+        col([r.w_distance for r in rules_list]) * distance_score
+        + col([r.w_category for r in rules_list]) * category_score
+        + col([r.w_crowd for r in rules_list]) * crowd_score
+        + col([r.w_weather for r in rules_list]) * weather_score,
+        3,
+    )
+
+    # the prefilter rules as [variants × places] masks
+    located = places.is_active & np.isfinite(places.latitude) & np.isfinite(places.longitude)
+    eligible = np.broadcast_to(located, scores.shape).copy()
+    # unknown distances (no user location) pass, as in gold
+    in_range = (d >= col([r.min_km for r in rules_list])) & (d <= col([r.max_km for r in rules_list]))
+    eligible &= in_range | np.isnan(distances)[None, :]
+    weather_ok = np.array([weather_allows(r, weather_category) for r in rules_list])
+    eligible &= weather_ok[:, None]
+
+    crowd_ok = np.array([[not r.allowed_crowd_levels or c in r.allowed_crowd_levels for c in CROWD_LEVELS] + [True]
+                         for r in rules_list])
+    eligible &= crowd_ok[:, crowd_codes]
+
+    preferred = np.array([[not r.preferred_categories or c in r.preferred_categories for c in places.categories]
+                          + [not r.preferred_categories] for r in rules_list])[:, places.category_codes]
+    # a preference: relaxed for variants where nothing preferred is eligible
+    relax = ~(eligible & preferred).any(axis=1)
+    eligible &= preferred | relax[:, None]
+
+    scores = np.where(eligible, scores, -np.inf)
+    k = min(top_k, scores.shape[1])
+    if k:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+    else:
+        top = np.empty((v, 0), dtype=np.int64)
+
+    rows = []
+    for i, r in enumerate(rules_list):
+        picked = top[i][np.isfinite(scores[i, top[i]])]
+        n_eligible = int(eligible[i].sum())
+        if screen_minutes < r.medium_threshold:
+            go, reason = False, "screen_time_too_low"
+        elif not len(picked):
+            go, reason = False, "no_candidates"
+        else:
+            go, reason = True, "viable_location"
+        rows.append({
+            "should_go_out": go,
+            "reason": reason,
+            "eligible": n_eligible,
+            "top_score": float(scores[i, picked[0]]) if len(picked) else None,
+            "mean_top_km": round(float(np.nanmean(distances[picked])), 3) if np.isfinite(distances[picked]).any() else None,
+            "top_ids": " ".join(str(x) for x in places.location_ids[picked].tolist()),
+        })
+    return rows
+
+
+def _score_task(task):
+    context_idx, start, rules_list = task
+    ctx = _SHARED["contexts"][context_idx]
+    rows = score_variants(
+        rules_list,
+        _SHARED["places"],
+        ctx["distances"],
+        ctx["crowd_codes"],
+        ctx["weather_category"],
+        ctx["screen_time_minutes"],
+        _SHARED["top_k"],
+    )
+    return context_idx, start, rows
+
+
+def _context_arrays(ctx: dict, places, detour_model, crowd_table) -> dict:
+    try:
+        origin = (float(ctx["latitude"]), float(ctx["longitude"]))
+    except (KeyError, TypeError, ValueError):
+        origin = None
+    distances = (estimate_distances(detour_model, origin, places) if origin
+                 else np.full(len(places), np.nan))
+
+    # a device's routed distances replace the estimates while it is near the cached origin
+    if origin and ctx.get("device") is not None:
+        from scripts.gold.gold_cache import load_device_cache, distance_keys
+        from .geo import haversine_km
+
+        cache = load_device_cache(ctx["device"]) or {}
+        if cache.get("origin") and haversine_km(cache["origin"], origin) <= get_rules().reroute_km:
+            cached = cache.get("distances") or {}
+            keys = distance_keys(places.location_ids, places.latitude, places.longitude)
+            routed = np.array([cached.get(k, np.nan) for k in keys], dtype=np.float64)
+            distances = np.where(np.isnan(routed), distances, routed)
+
+    how = int(ctx["hour_of_week"]) if ctx.get("hour_of_week") is not None else hour_of_week(datetime.now(timezone.utc))
+    levels = crowd_table.levels(places, how) if crowd_table is not None else places.crowd_level
+    crowd_codes = np.array([CROWD_LEVELS.index(c) if c in CROWD_LEVELS else -1 for c in levels.categories] + [-1],
+                           dtype=np.int64)[levels.codes]
+
+    return {
+        "distances": distances,
+        "crowd_codes": crowd_codes,
+        "weather_category": ctx.get("weather_category") or "unknown",
+        "screen_time_minutes": float(ctx.get("screen_time_minutes") or 0),
+    }
+
+
+def run_scenarios(variants: list, contexts: list, places, detour_model=None, crowd_table=None,
+                  top_k: int = 5, workers: int = DEFAULT_WORKERS) -> pd.DataFrame:
+    """Score every (rule variant × context) pair; returns one comparison row per pair."""
+    if detour_model is None:
+        detour_model = load_detour_model()
+
+    _SHARED["places"] = places
+    _SHARED["top_k"] = top_k
+    _SHARED["contexts"] = [_context_arrays(c, places, detour_model, crowd_table) for c in contexts]
+
+    names = [name for name, _ in variants]
+    compiled = [rules for _, rules in variants]
+    tasks = [
+        (ci, start, compiled[start:start + CHUNK_VARIANTS])
+        for ci in range(len(contexts))
+        for start in range(0, len(compiled), CHUNK_VARIANTS)
+    ]
+
+    if workers > 1 and len(tasks) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                   mp_context=multiprocessing.get_context("fork"))
+        with pool:
+            results = list(pool.map(_score_task, tasks))
+    else:
+        results = [_score_task(t) for t in tasks]
+
+    rows = []
+    for ci, start, chunk_rows in results:
+        for offset, row in enumerate(chunk_rows):
+            rows.append({
+                "variant": names[start + offset],
+                "context": contexts[ci].get("name") or f"context_{ci}",
+                **row,
+            })
+
+    table = pd.DataFrame(rows)
+    # how far each variant's top-K moved from the current rules, per context
+    baseline = table[table["variant"] == names[0]].set_index("context")["top_ids"].str.split().apply(set)
+    table["overlap_with_baseline"] = [
+        round(len(set(ids.split()) & baseline[c]) / max(len(set(ids.split()) | baseline[c]), 1), 3)
+        for ids, c in zip(table["top_ids"], table["context"])
+    ]
+    return table
+
+
+def summarize(table: pd.DataFrame) -> pd.DataFrame:
+    return (
+        table.groupby("variant", sort=False)
+        .agg(
+            go_out_rate=("should_go_out", "mean"),
+            mean_top_score=("top_score", "mean"),
+            mean_eligible=("eligible", "mean"),
+            mean_overlap=("overlap_with_baseline", "mean"),
+        )
+        .round(3)
+    )
+
+
+def default_contexts() -> list:
+    from .read_silver import get_latest_screen_time, get_latest_user_location, get_latest_weather
+
+    screen = get_latest_screen_time() or {}
+    loc = get_latest_user_location() or {}
+    weather = get_latest_weather() or {}
+    return [{
+        "name": "latest",
+        "device": screen.get("device") or loc.get("device"),
+        "latitude": loc.get("latitude"),
+        "longitude": loc.get("longitude"),
+        "screen_time_minutes": screen.get("minutes_spent", 0),
+        "weather_category": weather.get("weather_category"),
+    }]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score rules.yaml variants × user contexts offline")
+    parser.add_argument("spec", help="YAML with `grid` and/or `variants`, and optional `contexts`")
+    parser.add_argument("--out", default="scenarios.csv", help="comparison table (CSV)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--upload", action="store_true", help=f"also write the table under {SCENARIO_PREFIX}")
+    args = parser.parse_args()
+
+    with open(args.spec, encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or {}
+
+    from .read_silver import get_place_catalog, get_crowd_table
+
+    variants = expand_variants(spec, get_rules().raw)
+    contexts = spec.get("contexts") or default_contexts()
+    places = get_place_catalog()
+
+    started = time.perf_counter()
+    table = run_scenarios(variants, contexts, places, crowd_table=get_crowd_table(),
+                          top_k=args.top_k, workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    table.to_csv(args.out, index=False)
+    print(summarize(table).to_string())
+    print(f"[OK] {len(variants)} variants × {len(contexts)} contexts over {len(places)} places "
+          f"in {elapsed:.2f}s → {args.out}")
+
+    if args.upload:
+        from scripts.load.write_to_minio import MINIO_BUCKET, get_client
+
+        body = table.to_csv(index=False).encode("utf-8")
+        name = SCENARIO_PREFIX + f"scenarios_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.csv"
+        get_client().put_object(MINIO_BUCKET, name, data=io.BytesIO(body), length=len(body), content_type="text/csv")
+        print(f"[MINIO] Uploaded {name}")
+
+
+if __name__ == "__main__":
+    main()
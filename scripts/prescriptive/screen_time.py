@@ -1,13 +1,6 @@
-from .rules_loader import load_rules
+from .rules_loader import get_rules
 
-def classify_screen_time(minutes: int) -> str:
-    rules = load_rules()
-    thresholds = rules["screen_time"]["thresholds_minutes"]
-
-    if minutes >= thresholds["critical"]:
-        return "critical"
-    if minutes >= thresholds["high"]:
-        return "high"
-    if minutes >= thresholds["medium"]:
-        return "medium"
-    return "low"
+def classify_screen_time(minutes: int, rules=None) -> str:
+    if rules is None:
+        rules = get_rules()
+    return rules.classify_screen_time(minutes)
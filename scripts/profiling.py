@@ -0,0 +1,361 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+load_dotenv(BASE_DIR / ".env")
+
+# PROFILE: "cprofile", "sample", "both" (or 1/true); unset or 0 = off
+MODES = ("cprofile", "sample", "both")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE_DIR / "logs" / "profiles")))
+PROFILE_PREFIX = "logs/profiles/"
+PROFILE_UPLOAD = os.getenv("PROFILE_UPLOAD", "0").lower() in ("1", "true", "yes")
+SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000.0
+# units of work faster than this are timed but leave no artifacts (keeps hot endpoints quiet)
+MIN_MS = float(os.getenv("PROFILE_MIN_MS", "0"))
+TOP_FUNCTIONS = 25
+
+
+def _parse_mode(value) -> str:
+    value = (value or "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return ""
+    if value in ("1", "true", "yes", "on"):
+        return "both"
+    if value not in MODES:
+        raise RuntimeError(f"PROFILE must be one of {', '.join(MODES)} (got {value!r})")
+    return value
+
+
+_MODE = _parse_mode(os.getenv("PROFILE"))
+
+_SPANS_LOCK = threading.Lock()
+_SPANS = {}  # name -> [count, total_s, max_s], process-wide
+_local = threading.local()
+
+
+def profiling_enabled() -> bool:
+    return bool(_MODE)
+
+
+def enable(mode: str = "both"):
+    global _MODE
+    _MODE = _parse_mode(mode)
+    if _MODE:
+        instrument_minio()
+
+
+# ---- spans around external calls ----
+
+def _add(spans: dict, name: str, elapsed: float):
+    entry = spans.get(name)
+    if entry is None:
+        spans[name] = [1, elapsed, elapsed]
+    else:
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+
+@contextmanager
+def span(name: str):
+    """Wall time of one external call (ORS, MinIO, Firestore, ...); a no-op unless profiling."""
+    if not _MODE:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _SPANS_LOCK:
+            _add(_SPANS, name, elapsed)
+        for spans in getattr(_local, "collectors", ()):
+            _add(spans, name, elapsed)
+
+
+def spans_snapshot() -> dict:
+    with _SPANS_LOCK:
+        return {name: list(entry) for name, entry in _SPANS.items()}
+
+
+def _spans_delta(before: dict, after: dict) -> dict:
+    delta = {}
+    for name, (count, total, peak) in after.items():
+        prev = before.get(name, [0, 0.0, 0.0])
+        if count > prev[0]:
+            delta[name] = [count - prev[0], total - prev[1], peak]
+    return delta
+
+
+_MINIO_PATCHED = False
+
+
+def instrument_minio():
+    """Time every MinIO request as a span. The SDK is called from many modules (several
+    with their own module-level client), so the hook goes on the client class itself."""
+    global _MINIO_PATCHED
+    if _MINIO_PATCHED:
+        return
+    try:
+        from minio import Minio
+    except ImportError:
+        return
+
+    url_open = Minio._url_open
+
+    def _timed_url_open(self, method, region, bucket_name=None, object_name=None, *args, **kwargs):
+        with span(f"minio.{method}"):
+            return url_open(self, method, region, bucket_name, object_name, *args, **kwargs)
+
+    Minio._url_open = _timed_url_open
+    _MINIO_PATCHED = True
+
+
+# ---- stack sampling ----
+
+_FRAME_NAMES = {}
+
+
+def _frame_name(code) -> str:
+    name = _FRAME_NAMES.get(code)
+    if name is None:
+        path = Path(code.co_filename)
+        try:
+            where = path.relative_to(BASE_DIR).as_posix()
+        except ValueError:
+            # site-packages / stdlib: the package-relative tail is enough to read a flamegraph
+            where = "/".join(path.parts[-2:])
+        name = f"{code.co_name} ({where}:{code.co_firstlineno})".replace(";", ":")
+        _FRAME_NAMES[code] = name
+    return name
+
+
+def _collapse(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class StackSampler:
+    """Samples Python stacks every `interval` seconds into collapsed-stack counts
+    ("root;caller;callee N"), the input format of flamegraph.pl / speedscope.
+
+    With `thread_id` only that thread is sampled; otherwise every thread, with the
+    thread name as the root frame so worker pools show up as their own towers.
+    """
+
+    def __init__(self, thread_id: int = None, interval: float = SAMPLE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is not None:
+                    self.stacks[";".join(_collapse(frame))] += 1
+            else:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in frames.items():
+                    if ident != own:
+                        stack = [names.get(ident, f"thread-{ident}")] + _collapse(frame)
+                        self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# ---- one profiled unit of work ----
+
+class Profile:
+    """cProfile and/or stack sampling plus span timings around one unit of work
+    (a pipeline step, a request).
+
+    `thread_only` scopes everything to the calling thread (concurrent requests);
+    otherwise spans are process-wide and every thread is sampled. cProfile always
+    covers the calling thread only.
+    """
+
+    def __init__(self, label: str, mode: str = None, thread_only: bool = False):
+        self.label = label
+        self.mode = _parse_mode(mode) if mode is not None else _MODE
+        self.thread_only = thread_only
+        self.spans = {}
+        self.wall_s = self.cpu_s = 0.0
+        self.profiler = None
+        self.sampler = None
+        self._before = None
+
+    def start(self):
+        instrument_minio()
+        if self.thread_only:
+            _local.collectors = getattr(_local, "collectors", ()) + (self.spans,)
+        else:
+            self._before = spans_snapshot()
+
+        if self.mode in ("cprofile", "both"):
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another profiler is already active in this interpreter
+                self.profiler = None
+        if self.mode in ("sample", "both"):
+            self.sampler = StackSampler(threading.get_ident() if self.thread_only else None).start()
+
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time() if not self.thread_only else time.thread_time()
+        return self
+
+    def stop(self):
+        self.wall_s = time.perf_counter() - self._started
+        self.cpu_s = (time.process_time() if not self.thread_only else time.thread_time()) - self._cpu_started
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.thread_only:
+            _local.collectors = tuple(c for c in _local.collectors if c is not self.spans)
+        else:
+            self.spans = _spans_delta(self._before, spans_snapshot())
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.report()
+        return False
+
+    def top_spans(self, n: int = 5) -> list:
+        return sorted(self.spans.items(), key=lambda kv: kv[1][1], reverse=True)[:n]
+
+    def server_timing(self) -> str:
+        """Spans as a Server-Timing header value (browser devtools show it per request)."""
+        parts = [f"total;dur={self.wall_s * 1000:.1f}"]
+        for name, (count, total, _) in self.top_spans(10):
+            parts.append(f"{name.replace('.', '-')};desc=\"{count}x\";dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> dict:
+        out = {
+            "label": self.label,
+            "mode": self.mode,
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(self.cpu_s, 4),
+            "spans": {
+                name: {"count": count, "total_s": round(total, 4), "max_s": round(peak, 4)}
+                for name, (count, total, peak) in sorted(self.spans.items(), key=lambda kv: -kv[1][1])
+            },
+        }
+        if self.sampler is not None:
+            out["samples"] = self.sampler.samples
+            out["sample_interval_ms"] = round(self.sampler.interval * 1000, 3)
+        if self.profiler is not None:
+            import pstats
+
+            stats = pstats.Stats(self.profiler)
+            rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:TOP_FUNCTIONS]
+            out["top_cumulative"] = [
+                {"function": f"{fn} ({Path(path).name}:{line})", "calls": nc, "tottime_s": round(tt, 4),
+                 "cumtime_s": round(ct, 4)}
+                for (path, line, fn), (cc, nc, tt, ct, _) in rows
+            ]
+        return out
+
+    def write(self, directory: Path = None) -> list:
+        """<stamp>_<label>.json (summary), .pstats (snakeviz / pstats) and .collapsed
+        (flamegraph.pl / speedscope); uploaded under logs/profiles/ with PROFILE_UPLOAD=1."""
+        directory = Path(directory or PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S_%f")
+        label = "".join(c if c.isalnum() or c in "._-" else "_" for c in self.label)
+        base = f"{stamp}_{label}"
+
+        paths = [directory / f"{base}.json"]
+        paths[0].write_text(json.dumps(self.summary(), indent=2))
+        if self.profiler is not None:
+            paths.append(directory / f"{base}.pstats")
+            self.profiler.dump_stats(str(paths[-1]))
+        if self.sampler is not None:
+            paths.append(directory / f"{base}.collapsed")
+            paths[-1].write_text(self.sampler.collapsed())
+
+        if PROFILE_UPLOAD:
+            _upload(paths, stamp[:8])
+        return paths
+
+    def report(self):
+        if not self.mode or self.wall_s * 1000 < MIN_MS:
+            return None
+        paths = self.write()
+        spans = ", ".join(f"{name} {total:.2f}s/{count}" for name, (count, total, _) in self.top_spans())
+        print(f"[PROFILE] {self.label}: {self.wall_s:.2f}s wall, {self.cpu_s:.2f}s cpu"
+              f"{' | ' + spans if spans else ''} → {paths[0].parent / paths[0].stem}.*")
+        return paths
+
+
+def _upload(paths: list, day: str):
+    from scripts.load.write_to_minio import MINIO_BUCKET, get_client
+
+    client = get_client()
+    for path in paths:
+        body = path.read_bytes()
+        name = f"{PROFILE_PREFIX}date={day[:4]}-{day[4:6]}-{day[6:]}/{path.name}"
+        try:
+            client.put_object(MINIO_BUCKET, name, data=io.BytesIO(body), length=len(body),
+                              content_type="application/octet-stream")
+        except Exception as exc:
+            print(f"[WARN] Profile upload failed for {name}: {exc}")
+
+
+def main():
+    """python -m scripts.profiling <module> [args...]: run a module as __main__ under the profiler."""
+    import runpy
+
+    if len(sys.argv) < 2:
+        raise RuntimeError("usage: python -m scripts.profiling <module> [args...]")
+    module = sys.argv[1]
+    sys.argv = [module] + sys.argv[2:]
+
+    global _MODE
+    _MODE = _MODE or "both"
+    with Profile(module):
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+if __name__ == "__main__":
+    main()
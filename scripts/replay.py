@@ -0,0 +1,267 @@
+import argparse
+import bisect
+import io
+import os
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from scripts.load.write_to_minio import MINIO_BUCKET, get_client, upload_json_to_minio, read_json_from_minio
+from scripts.transform.bronze_batch import fetch_json_objects, object_key, object_time
+
+REPLAY_PREFIX = "replay/"
+CHECKPOINT_PREFIX = "state/replay/"
+USER_ACTIVITY_PREFIX = "bronze/user_activity/"
+WEATHER_PREFIX = "bronze/weather/"
+
+# bronze objects downloaded ahead of the tick being processed (BRONZE_FETCH_WORKERS at a time)
+PREFETCH_OBJECTS = int(os.getenv("REPLAY_PREFETCH_OBJECTS", "32"))
+CHECKPOINT_EVERY = int(os.getenv("REPLAY_CHECKPOINT_EVERY", "50"))
+# ORS calls per device per tick; 0 ranks on cached routes and offline estimates only
+ROUTE_TOP_K = int(os.getenv("REPLAY_ROUTE_TOP_K", "0"))
+
+
+def bronze_objects(client, prefix: str, start: datetime = None, end: datetime = None) -> list:
+    """[(ts, name)] of timestamped bronze objects with start <= ts < end, oldest first."""
+    found = []
+    for obj in client.list_objects(MINIO_BUCKET, prefix=prefix, recursive=True):
+        ts = object_time(obj.object_name)
+        if ts is None or (start and ts < start) or (end and ts >= end):
+            continue
+        found.append((ts, obj.object_name))
+    found.sort()
+    return found
+
+
+class WeatherTimeline:
+    """Silver weather as of any past time: the newest forecast issued before it."""
+
+    def __init__(self, client, objects: list):
+        self._client = client
+        self._times = [ts for ts, _ in objects]
+        self._names = [name for _, name in objects]
+        self._cached = (None, None)
+
+    def at(self, ts: datetime) -> dict:
+        from scripts.transform.weather_to_silver import weather_row
+
+        i = bisect.bisect_right(self._times, ts) - 1
+        if i < 0:
+            return {}
+        name = self._names[i]
+        if self._cached[0] != name:
+            self._cached = (name, fetch_json_objects(self._client, MINIO_BUCKET, [name])[0])
+        return weather_row([self._cached[1]], ts)
+
+
+def _checkpoint_object(run_id: str) -> str:
+    return CHECKPOINT_PREFIX + f"{run_id}.json"
+
+
+def _read_csv(client, object_name: str):
+    from minio.error import S3Error
+
+    try:
+        resp = client.get_object(MINIO_BUCKET, object_name)
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return None
+        raise
+    try:
+        return pd.read_csv(io.BytesIO(resp.read()), keep_default_na=False)
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+def _put_csv(client, object_name: str, df: pd.DataFrame):
+    body = df.to_csv(index=False).encode("utf-8")
+    client.put_object(MINIO_BUCKET, object_name, data=io.BytesIO(body), length=len(body), content_type="text/csv")
+
+
+class Replay:
+    """Recompute silver and gold tick by tick from the bronze user_activity objects of a
+    time range. Output goes under replay/<run_id>/, never to the live silver/gold objects."""
+
+    def __init__(self, run_id: str, start: datetime, end: datetime, route_top_k: int = ROUTE_TOP_K):
+        from scripts.prescriptive.distance_model import load_detour_model
+        from scripts.prescriptive.read_silver import get_place_catalog, get_crowd_table, get_place_graph
+
+        self.run_id = run_id
+        self.start = start
+        self.end = end
+        self.route_top_k = route_top_k
+        self.client = get_client()
+        self.prefix = f"{REPLAY_PREFIX}{run_id}/"
+
+        # places and models are today's; replay re-runs history against the current rules
+        self.places = get_place_catalog()
+        self.crowd_table = get_crowd_table()
+        self.place_graph = get_place_graph()
+        self.detour_model = load_detour_model()
+        self.weather = WeatherTimeline(self.client, bronze_objects(self.client, WEATHER_PREFIX, end=end))
+
+        self.screen = None
+        self.location = None
+        self.cooldown_state = {}
+        self.device_caches = {}
+        self.index_entries = []
+        self.last_object = None
+        self.last_key = None  # (ts, name) of last_object; objects are resumed after it
+        self.ticks = 0
+        self.gold_written = 0
+
+    # ---- checkpointing ----
+
+    def load_checkpoint(self) -> bool:
+        state = read_json_from_minio(_checkpoint_object(self.run_id), default=None)
+        if not state:
+            return False
+        if (state["start"], state["end"]) != (self.start.isoformat(), self.end.isoformat()):
+            raise RuntimeError(f"Replay {self.run_id} was started for {state['start']}..{state['end']}")
+
+        self.last_object = state["last_object"]
+        self.last_key = object_key(self.last_object) if self.last_object else None
+        self.ticks = state["ticks"]
+        self.gold_written = state["gold_written"]
+        self.cooldown_state = state.get("cooldown_state") or {}
+        self.screen = _read_csv(self.client, self.prefix + "silver/screen_time.csv")
+        self.location = _read_csv(self.client, self.prefix + "silver/user_location.csv")
+        print(f"[INFO] Resuming replay {self.run_id} after {self.last_object} ({self.ticks} ticks done)")
+        return True
+
+    def save_checkpoint(self, done: bool = False):
+        from scripts.gold.gold_index import append_index
+
+        # silver and index rows first; the checkpoint only ever points at persisted work
+        if self.screen is not None:
+            _put_csv(self.client, self.prefix + "silver/screen_time.csv", self.screen)
+            _put_csv(self.client, self.prefix + "silver/user_location.csv", self.location)
+        append_index(self.index_entries, prefix=self.prefix + "gold/index/")
+        self.index_entries = []
+
+        upload_json_to_minio(
+            object_name=_checkpoint_object(self.run_id),
+            data={
+                "run_id": self.run_id,
+                "start": self.start.isoformat(),
+                "end": self.end.isoformat(),
+                "last_object": self.last_object,
+                "last_ts": self.last_key[0].isoformat() if self.last_key else None,
+                "ticks": self.ticks,
+                "gold_written": self.gold_written,
+                "cooldown_state": self.cooldown_state,
+                "done": done,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    # ---- one tick ----
+
+    def _write_gold(self, payload: dict, device=None) -> str:
+        from scripts.gold.gold_schema import serialize_gold
+
+        ts = datetime.fromisoformat(payload["generated_at"])
+        name = (self.prefix + f"gold/recommendations/date={ts.date().isoformat()}/"
+                f"recommendations_{ts.strftime('%Y%m%d_%H%M%S_%f')}_{device}.json")
+        body = serialize_gold(payload)
+        self.client.put_object(MINIO_BUCKET, name, data=io.BytesIO(body), length=len(body),
+                               content_type="application/json")
+        self.gold_written += 1
+        return name
+
+    def tick(self, ts: datetime, payload: dict):
+        from scripts.gold.build_gold import build_and_write_gold
+        from scripts.transform.split_user_activity import split_records, newer_devices, upsert_by_device
+
+        records = [r for r in payload.get("records", []) if r.get("device") and r.get("timestamp_utc")]
+        if not records:
+            return
+
+        screen_df, location_df = split_records(records, resolved_at=ts)
+        screen_df = screen_df[newer_devices(self.screen, screen_df)]
+        if screen_df.empty:
+            return
+        location_df = location_df[location_df["device"].astype(str).isin(screen_df["device"].astype(str))]
+
+        self.screen = upsert_by_device(self.screen, screen_df)
+        self.location = upsert_by_device(self.location, location_df)
+
+        weather = self.weather.at(ts)
+        locations = {str(r["device"]): r for r in location_df.to_dict(orient="records")}
+        for screen in screen_df.to_dict(orient="records"):
+            device = str(screen["device"])
+            loc = {k: (None if isinstance(v, float) and pd.isna(v) else v)
+                   for k, v in locations.get(device, {"device": device}).items()}
+            build_and_write_gold(
+                screen=screen,
+                loc=loc,
+                weather=weather,
+                places=self.places,
+                cooldown_state=self.cooldown_state,
+                detour_model=self.detour_model,
+                index_entries=self.index_entries,
+                crowd_table=self.crowd_table,
+                place_graph=self.place_graph,
+                now=ts,
+                writer=self._write_gold,
+                device_caches=self.device_caches,
+                refine_top_k=self.route_top_k,
+            )
+
+    def run(self, resume: bool = True):
+        if not (resume and self.load_checkpoint()):
+            self.save_checkpoint()
+
+        objects = bronze_objects(self.client, USER_ACTIVITY_PREFIX, self.start, self.end)
+        if self.last_key:
+            # stems differ (latest_5_ / stream_), so resume on (ts, name), never on the name alone
+            objects = [(ts, name) for ts, name in objects if (ts, name) > self.last_key]
+        print(f"[INFO] Replay {self.run_id}: {len(objects)} bronze objects to process")
+
+        started, processed = time.monotonic(), 0
+        for i in range(0, len(objects), PREFETCH_OBJECTS):
+            window = objects[i:i + PREFETCH_OBJECTS]
+            # downloads run concurrently; ticks are applied strictly in timestamp order
+            payloads = fetch_json_objects(self.client, MINIO_BUCKET, [name for _, name in window])
+            for (ts, name), payload in zip(window, payloads):
+                self.tick(ts, payload)
+                self.last_object, self.last_key = name, (ts, name)
+                self.ticks += 1
+                processed += 1
+                if self.ticks % CHECKPOINT_EVERY == 0:
+                    self.save_checkpoint()
+                    rate = processed / max(time.monotonic() - started, 1e-9)
+                    print(f"[INFO] Replay {self.run_id}: {self.ticks} ticks, {self.gold_written} gold docs, "
+                          f"at {ts.isoformat()} ({rate:.1f} ticks/s)")
+
+        self.save_checkpoint(done=True)
+        print(f"[OK] Replay {self.run_id} done: {self.ticks} ticks, {self.gold_written} gold docs → {self.prefix}")
+
+
+def _parse_day(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute silver and gold from historical bronze")
+    parser.add_argument("--start", required=True, help="ISO date/time, inclusive (UTC if no offset)")
+    parser.add_argument("--end", required=True, help="ISO date/time, exclusive")
+    parser.add_argument("--run-id", help="output under replay/<run-id>/; reuse it to resume")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--route-top-k", type=int, default=ROUTE_TOP_K,
+                        help="ORS calls per device per tick (default: none, estimates and cached routes only)")
+    args = parser.parse_args()
+
+    start, end = _parse_day(args.start), _parse_day(args.end)
+    if end <= start:
+        raise RuntimeError("--end must be after --start")
+    run_id = args.run_id or f"{start.strftime('%Y%m%d')}_{end.strftime('%Y%m%d')}"
+
+    Replay(run_id, start, end, route_top_k=args.route_top_k).run(resume=not args.fresh)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
-import subprocess, sys 
+import os, subprocess, sys, time
+
+from scripts.load.run_context import RunLease, commit_staged, discard_staged, new_run_id
+from scripts.load.write_to_minio import MINIO_BUCKET, ensure_bucket, get_client
 
 STEPS = [
     "scripts.extract.firebase_data",
@@ -9,11 +12,75 @@ STEPS = [
     "scripts.transform.history_to_silver",
     "scripts.transform.weather_to_silver",
     "scripts.transform.places_upsert",
+    "scripts.transform.crowd_to_silver",
+    "scripts.transform.place_graph_to_silver",
     "scripts.analytics.daily_screen_time",
+]
+# run after the commit, on committed silver only: gold shares its objects with the stream
+# daemon, so it is written live rather than staged
+PUBLISH_STEPS = [
     "scripts.gold.build_gold",
 ]
 
-for step in STEPS:
+# --profile (or PROFILE=cprofile|sample|both) runs every step under scripts.profiling:
+# pstats, collapsed stacks and external-call spans per step in logs/profiles/
+PROFILE = "--profile" in sys.argv[1:] or os.getenv("PROFILE", "").lower() not in ("", "0", "false", "no", "off")
+# an overlapping tick skips by default; ETL_LOCK_WAIT_SECONDS > 0 queues behind the running one
+LOCK_WAIT_SECONDS = float(os.getenv("ETL_LOCK_WAIT_SECONDS", "0"))
+
+run_id = new_run_id()
+ensure_bucket()
+client = get_client()
+
+lease = RunLease("run_etl", run_id, client, MINIO_BUCKET)
+if not lease.acquire(wait_seconds=LOCK_WAIT_SECONDS):
+    holder = lease.blocked_by or {}
+    print(f"[WARN] run_etl {run_id} skipped: run {holder.get('run_id')} on {holder.get('host')} "
+          f"still holds the lease (since {holder.get('acquired_at', '?')}, expires {holder.get('expires_at', '?')})")
+    sys.exit(0)
+
+# every step stamps this run id on what it writes and stages the objects in STAGED_OBJECTS
+env = dict(os.environ, ETL_RUN_ID=run_id, ETL_STAGE="1")
+if PROFILE:
+    env["PROFILE"] = os.getenv("PROFILE") or "both"
+
+timings = []
+
+
+def run_step(step: str, step_env: dict):
+    if lease.lost:
+        raise RuntimeError(f"run_etl {run_id} lost its lease before {step}")
     print(f"[RUN] {step}")
-    if subprocess.run([sys.executable, "-m", step]).returncode != 0:
+    cmd = [sys.executable, "-m", "scripts.profiling", step] if PROFILE else [sys.executable, "-m", step]
+    started = time.monotonic()
+    returncode = subprocess.run(cmd, env=step_env).returncode
+    timings.append((step, time.monotonic() - started))
+    if returncode != 0:
         raise RuntimeError(step)
+
+
+print(f"[INFO] run_etl {run_id} started")
+try:
+    try:
+        for step in STEPS:
+            run_step(step, env)
+
+        if lease.lost:
+            raise RuntimeError(f"run_etl {run_id} lost its lease, not committing")
+        committed = commit_staged(client, MINIO_BUCKET, run_id)
+        print(f"[OK] run_etl {run_id} committed {len(committed)} staged objects")
+    except BaseException:
+        # staged silver and watermarks are dropped, so the next run picks the same bronze up again
+        dropped = discard_staged(client, MINIO_BUCKET, run_id)
+        print(f"[WARN] run_etl {run_id} failed, discarded {dropped} staged objects")
+        raise
+
+    publish_env = dict(env, ETL_STAGE="0")
+    for step in PUBLISH_STEPS:
+        run_step(step, publish_env)
+finally:
+    lease.release()
+
+if PROFILE:
+    for step, seconds in sorted(timings, key=lambda t: -t[1]):
+        print(f"[PROFILE] {seconds:7.2f}s  {step}")
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import random
+import signal
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from scripts.load.write_to_minio import upload_json_to_minio, read_json_from_minio
+from scripts.stream.micro_batch import MicroBatcher
+from scripts.stream.sources import FakeSource, FirestoreListenSource, FirestorePollSource
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+load_dotenv(BASE_DIR / ".env")
+
+WATERMARK_OBJECT = "state/stream_watermark.json"
+
+BATCH_MAX_RECORDS = int(os.getenv("STREAM_BATCH_MAX_RECORDS", "200"))
+BATCH_MAX_WAIT_SECONDS = float(os.getenv("STREAM_BATCH_MAX_WAIT_SECONDS", "2"))
+POLL_INTERVAL_SECONDS = float(os.getenv("STREAM_POLL_INTERVAL_SECONDS", "5"))
+BOOTSTRAP_MINUTES = int(os.getenv("STREAM_BOOTSTRAP_MINUTES", "15"))
+# a failing batch is retried with backoff, then dropped; its records stay in bronze
+# when that write succeeded, and the batch split_user_activity picks them up
+BATCH_MAX_ATTEMPTS = int(os.getenv("STREAM_BATCH_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("STREAM_RETRY_BASE_SECONDS", "2"))
+RETRY_CAP_SECONDS = float(os.getenv("STREAM_RETRY_CAP_SECONDS", "60"))
+
+
+def load_watermark() -> datetime:
+    state = read_json_from_minio(WATERMARK_OBJECT, default={}) or {}
+    if state.get("timestamp_utc"):
+        return datetime.fromisoformat(state["timestamp_utc"])
+    return datetime.now(timezone.utc) - timedelta(minutes=BOOTSTRAP_MINUTES)
+
+
+def save_watermark(ts: datetime):
+    upload_json_to_minio(
+        object_name=WATERMARK_OBJECT,
+        data={"timestamp_utc": ts.isoformat(), "updated_at": datetime.now(timezone.utc).isoformat()},
+    )
+
+
+def _read_silver(object_name: str):
+    from scripts.prescriptive.read_silver import _read_csv
+
+    try:
+        return _read_csv(object_name)
+    except Exception:
+        return None
+
+
+def _none_if_nan(row: dict) -> dict:
+    return {k: (None if isinstance(v, float) and pd.isna(v) else v) for k, v in row.items()}
+
+
+def process_batch(records: list):
+    from scripts.gold.build_gold import build_and_write_gold
+    from scripts.gold.gold_index import append_index
+    from scripts.prescriptive.cooldown_state import load_cooldown_state, save_cooldown_state
+    from scripts.prescriptive.distance_model import load_detour_model, save_detour_model
+    from scripts.prescriptive.read_silver import get_latest_weather, get_place_manifest, get_crowd_table, get_place_graph
+    from scripts.transform.split_user_activity import (
+        split_records,
+        newer_devices,
+        upsert_by_device,
+        upload_csv,
+        silver_lease,
+    )
+
+    # the listener can redeliver a document (MODIFIED, reconnects); keep the newest copy
+    by_id = {}
+    for r in records:
+        by_id[r.get("document_id") or id(r)] = r
+    records = [r for r in by_id.values() if r.get("device") and r.get("timestamp_utc")]
+    if not records:
+        return None
+
+    now = datetime.now(timezone.utc)
+    upload_json_to_minio(
+        object_name=f"bronze/user_activity/user_activity_stream_{now.strftime('%Y%m%d_%H%M%S_%f')}.json",
+        data={
+            "source": "firebase.firestore",
+            "collection": "screen_time_logs",
+            "extracted_at": now.isoformat(),
+            "strategy": "stream_micro_batch",
+            "record_count": len(records),
+            "records": records,
+        },
+    )
+
+    screen_df, location_df = split_records(records)
+    high_water = screen_df["timestamp_utc"].max().to_pydatetime()
+
+    # the batch split_user_activity rewrites the same files; without the lease the last
+    # writer would drop the other's rows
+    with silver_lease():
+        # redelivered or late records never roll a device back to an older reading
+        existing_screen = _read_silver("silver/screen_time.csv")
+        screen_df = screen_df[newer_devices(existing_screen, screen_df)]
+        location_df = location_df[location_df["device"].astype(str).isin(screen_df["device"].astype(str))]
+        if screen_df.empty:
+            return high_water
+
+        upload_csv("silver/screen_time.csv", upsert_by_device(existing_screen, screen_df))
+        upload_csv("silver/user_location.csv", upsert_by_device(_read_silver("silver/user_location.csv"), location_df))
+
+    # weather, the place shard manifest, the crowd table, the place graph, cooldown state and the detour model
+    # are shared by every device in the batch; each device reads the catalog rows around its location
+    weather = get_latest_weather() or {}
+    place_manifest = get_place_manifest()
+    crowd_table = get_crowd_table()
+    place_graph = get_place_graph()
+    cooldown_state = load_cooldown_state()
+    detour_model = load_detour_model()
+    model_observations = detour_model["observations"]
+    index_entries = []
+
+    locations = {str(r["device"]): _none_if_nan(r) for r in location_df.to_dict(orient="records")}
+
+    for screen in screen_df.to_dict(orient="records"):
+        device = str(screen["device"])
+        build_and_write_gold(
+            screen=screen,
+            loc=locations.get(device, {"device": device}),
+            weather=weather,
+            place_manifest=place_manifest,
+            crowd_table=crowd_table,
+            place_graph=place_graph,
+            cooldown_state=cooldown_state,
+            detour_model=detour_model,
+            index_entries=index_entries,
+        )
+
+    save_cooldown_state(cooldown_state)
+    append_index(index_entries)
+    if detour_model["observations"] != model_observations:
+        save_detour_model(detour_model)
+
+    from scripts.http_client import all_metrics
+
+    print(f"[STREAM] {len(records)} records → gold for {len(screen_df)} devices | http {all_metrics()}")
+    return high_water
+
+
+def _process(records: list, stop: threading.Event, on_batch):
+    # a retry redoes the whole batch; newer_devices keeps that from rolling anything back
+    for attempt in range(1, BATCH_MAX_ATTEMPTS + 1):
+        try:
+            high_water = on_batch(records)
+            if high_water is not None:
+                save_watermark(high_water)
+            return
+        except Exception as exc:
+            if attempt == BATCH_MAX_ATTEMPTS or stop.is_set():
+                print(f"[WARN] stream batch of {len(records)} records dropped after {attempt} attempts: {exc!r}")
+                return
+            delay = random.uniform(0, min(RETRY_CAP_SECONDS, RETRY_BASE_SECONDS * (2 ** attempt)))
+            print(f"[WARN] stream batch failed (attempt {attempt}/{BATCH_MAX_ATTEMPTS}), retrying in {delay:.1f}s: {exc!r}")
+            stop.wait(delay)
+
+
+def run(source, batcher: MicroBatcher, stop: threading.Event, on_batch=process_batch):
+    while not stop.is_set():
+        batcher.add(source.poll(batcher.time_left(POLL_INTERVAL_SECONDS)))
+
+        if batcher.ready():
+            _process(batcher.drain(), stop, on_batch)
+
+    if len(batcher):
+        _process(batcher.drain(), stop, on_batch)
+
+    source.close()
+
+
+def _make_source(kind: str, fake_file: str = None):
+    if kind == "fake":
+        records = []
+        if fake_file:
+            with open(fake_file) as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        return FakeSource(records)
+
+    watermark = load_watermark()
+    print(f"[STREAM] Resuming after {watermark.isoformat()}")
+
+    if kind == "listen":
+        return FirestoreListenSource(watermark)
+    return FirestorePollSource(watermark, interval_seconds=POLL_INTERVAL_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batch screen time stream into silver and gold")
+    parser.add_argument("--source", choices=("listen", "poll", "fake"), default=os.getenv("STREAM_SOURCE", "listen"))
+    parser.add_argument("--fake-file", help="NDJSON records to replay with --source fake")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    source = _make_source(args.source, args.fake_file)
+    batcher = MicroBatcher(BATCH_MAX_RECORDS, BATCH_MAX_WAIT_SECONDS)
+
+    print(f"[STREAM] Started ({args.source}, batch ≤{BATCH_MAX_RECORDS} records / {BATCH_MAX_WAIT_SECONDS}s)")
+    run(source, batcher, stop)
+    print("[STREAM] Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import time
+
+
+class MicroBatcher:
+    """Accumulates records until max_records or max_wait_seconds after the first one."""
+
+    def __init__(self, max_records: int = 200, max_wait_seconds: float = 2.0):
+        self.max_records = max_records
+        self.max_wait_seconds = max_wait_seconds
+        self._records = []
+        self._opened_at = None
+
+    def add(self, records: list):
+        if records and self._opened_at is None:
+            self._opened_at = time.monotonic()
+        self._records.extend(records)
+
+    def time_left(self, idle_wait: float) -> float:
+        if self._opened_at is None:
+            return idle_wait
+        return max(0.0, self.max_wait_seconds - (time.monotonic() - self._opened_at))
+
+    def ready(self) -> bool:
+        if not self._records:
+            return False
+        if len(self._records) >= self.max_records:
+            return True
+        return time.monotonic() - self._opened_at >= self.max_wait_seconds
+
+    def drain(self) -> list:
+        records, self._records, self._opened_at = self._records, [], None
+        return records
+
+    def __len__(self):
+        return len(self._records)
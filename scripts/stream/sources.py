@@ -0,0 +1,98 @@
+import queue
+import time
+from datetime import datetime, timezone
+
+from scripts.profiling import span
+
+COLLECTION_NAME = "screen_time_logs"
+
+
+class _QueueSource:
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def poll(self, timeout: float) -> list:
+        try:
+            records = [self._queue.get(timeout=max(timeout, 0.0))]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def close(self):
+        pass
+
+
+class FakeSource(_QueueSource):
+    """In-memory stand-in for Firestore, for tests and local runs without credentials."""
+
+    def __init__(self, records=None):
+        super().__init__()
+        for record in records or []:
+            self.push(record)
+
+    def push(self, record: dict):
+        self._queue.put(record)
+
+
+class FirestoreListenSource(_QueueSource):
+    """Firestore snapshot listener. Honors FIRESTORE_EMULATOR_HOST for local runs."""
+
+    def __init__(self, watermark: datetime):
+        super().__init__()
+        from scripts.extract.firebase_client import get_db
+        from scripts.extract.firebase_data import doc_to_record
+
+        self._doc_to_record = doc_to_record
+        query = get_db().collection(COLLECTION_NAME).where("timestamp", ">", watermark)
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        for change in changes:
+            if change.type.name in ("ADDED", "MODIFIED"):
+                self._queue.put(self._doc_to_record(change.document))
+
+    def close(self):
+        self._watch.unsubscribe()
+
+
+class FirestorePollSource:
+    """Polls for documents newer than the watermark, for when a listener is not an option."""
+
+    def __init__(self, watermark: datetime, interval_seconds: float = 5.0, page_size: int = 500):
+        from firebase_admin import firestore
+        from scripts.extract.firebase_client import get_db
+        from scripts.extract.firebase_data import doc_to_record
+
+        self._db = get_db()
+        self._firestore = firestore
+        self._doc_to_record = doc_to_record
+        self._cursor = watermark
+        self._interval = interval_seconds
+        self._page_size = page_size
+
+    def poll(self, timeout: float) -> list:
+        with span("firestore.stream"):
+            docs = list(
+                self._db.collection(COLLECTION_NAME)
+                .where("timestamp", ">", self._cursor)
+                .order_by("timestamp", direction=self._firestore.Query.ASCENDING)
+                .limit(self._page_size)
+                .stream()
+            )
+
+        if not docs:
+            time.sleep(max(0.0, min(timeout, self._interval)))
+            return []
+
+        last_ts = (docs[-1].to_dict() or {}).get("timestamp")
+        if last_ts is not None:
+            self._cursor = last_ts.astimezone(timezone.utc)
+
+        return [self._doc_to_record(doc) for doc in docs]
+
+    def close(self):
+        pass
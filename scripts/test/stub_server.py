@@ -0,0 +1,128 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from scripts.prescriptive.geo import haversine_km
+
+# Local stand-in for ORS directions and Open-Meteo forecast, with a per-minute
+# quota and injectable failures, for exercising scripts/http_client.py:
+#   python -m scripts.test.stub_server --port 8089 --quota 40 --fail-rate 0.1
+#   ORS_BASE_URL=http://127.0.0.1:8089 OPEN_METEO_URL=http://127.0.0.1:8089/v1/forecast ...
+
+
+class StubState:
+    def __init__(self, quota_per_minute: int, fail_rate: float, latency_ms: float):
+        self.quota = quota_per_minute
+        self.fail_rate = fail_rate
+        self.latency_s = latency_ms / 1000.0
+        self.window_start = time.time()
+        self.used = 0
+        self.served = 0
+        self.lock = threading.Lock()
+
+    def take(self):
+        # fixed one-minute window, like ORS: returns (allowed, remaining, reset_epoch)
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= 60:
+                self.window_start, self.used = now, 0
+            reset = self.window_start + 60
+            if self.quota and self.used >= self.quota:
+                return False, 0, reset
+            self.used += 1
+            self.served += 1
+            return True, (self.quota - self.used) if self.quota else 1, reset
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _gate(self):
+            time.sleep(self.server_latency())
+            allowed, remaining, reset = state.take()
+            limits = {
+                "x-ratelimit-limit": str(state.quota),
+                "x-ratelimit-remaining": str(remaining),
+                "x-ratelimit-reset": f"{reset:.0f}",
+            }
+            if not allowed:
+                self._send(429, {"error": "Rate limit exceeded"}, {**limits, "Retry-After": f"{max(1, reset - time.time()):.0f}"})
+                return None
+            if random.random() < state.fail_rate:
+                self._send(503, {"error": "injected failure"}, limits)
+                return None
+            return limits
+
+        def server_latency(self):
+            return state.latency_s
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not urlparse(self.path).path.startswith("/v2/directions/"):
+                return self._send(404, {"error": "not found"})
+            limits = self._gate()
+            if limits is None:
+                return
+            (lon1, lat1), (lon2, lat2) = body["coordinates"][:2]
+            meters = 1000 * 1.3 * haversine_km((lat1, lon1), (lat2, lon2))
+            self._send(200, {"routes": [{"summary": {"distance": meters, "duration": meters / 8}}]}, limits)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/metrics":
+                return self._send(200, {"served": state.served, "window_used": state.used})
+            if not path.startswith("/v1/forecast"):
+                return self._send(404, {"error": "not found"})
+            limits = self._gate()
+            if limits is None:
+                return
+            now = time.strftime("%Y-%m-%dT%H:00", time.gmtime())
+            self._send(200, {
+                "hourly": {
+                    "time": [now],
+                    "temperature_2m": [29.5],
+                    "uv_index": [6.0],
+                    "weathercode": [2],
+                }
+            }, limits)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub ORS / Open-Meteo server for HTTP client tests")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--quota", type=int, default=40, help="requests per minute, 0 for unlimited")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    state = StubState(args.quota, args.fail_rate, args.latency_ms)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"[STUB] Listening on http://127.0.0.1:{args.port} (quota {args.quota}/min, fail rate {args.fail_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
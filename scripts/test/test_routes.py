@@ -1,21 +1,27 @@
 import os
-import requests
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 load_dotenv(BASE_DIR / ".env")
 
+from scripts.http_client import get_client
+from scripts.prescriptive.distance import DIRECTIONS_PATH, route_distance_km
+
 ORS_API_KEY = os.getenv("ORS_API_KEY")
 if not ORS_API_KEY:
     raise RuntimeError("ORS_API_KEY not found")
 
+# Set ORS_BASE_URL=http://127.0.0.1:8089 to run against scripts/test/stub_server.py
+ROUTE_COUNT = int(os.getenv("TEST_ROUTE_COUNT", "1"))
+
 # Dummy coordinates
 start_lat, start_lon = -3.3008856, 114.5908285
 end_lat, end_lon = -3.2979914, 114.5901445
 
-url = "https://api.openrouteservice.org/v2/directions/driving-car"
 headers = {
     "Authorization": ORS_API_KEY,
     "Content-Type": "application/json"
@@ -28,10 +34,21 @@ payload = {
     ]
 }
 
-response = requests.post(url, json=payload, headers=headers, timeout=10)
-response.raise_for_status()
+response = get_client("ors").post(DIRECTIONS_PATH, json=payload, headers=headers)
 
 data = response.json()
 
 # PRINT FULL JSON RESPONSE
 print(json.dumps(data, indent=2))
+
+if ROUTE_COUNT > 1:
+    # burst of routes through the shared client: exercises rate limiting and retries
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(
+            lambda i: route_distance_km((start_lat, start_lon), (end_lat + i * 1e-4, end_lon)),
+            range(ROUTE_COUNT),
+        ))
+    print(f"[OK] {len(results)} routes in {time.monotonic() - started:.1f}s")
+
+print(json.dumps(get_client("ors").metrics(), indent=2))
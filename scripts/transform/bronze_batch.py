@@ -0,0 +1,96 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from scripts.load.write_to_minio import upload_json_to_minio, read_json_from_minio
+
+WATERMARK_PREFIX = "state/watermarks/"
+FETCH_WORKERS = int(os.getenv("BRONZE_FETCH_WORKERS", "8"))
+
+# bronze object names end in a UTC timestamp, but writers use different stems
+# (user_activity_latest_5_<ts> from the hourly extract, user_activity_stream_<ts> from
+# the daemon), so name order is not arrival order. Objects are ordered by (timestamp,
+# name) and the watermark is the last object a transform has folded into silver.
+
+# ..._YYYYMMDD_HHMMSS[_ffffff].ext
+_OBJECT_TS = re.compile(r"_(\d{8}_\d{6})(?:_(\d{6}))?\.\w+$")
+_NO_TS = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def object_time(name: str):
+    m = _OBJECT_TS.search(name)
+    if not m:
+        return None
+    ts = datetime.strptime(m.group(1), "%Y%m%d_%H%M%S").replace(tzinfo=timezone.utc)
+    return ts.replace(microsecond=int(m.group(2))) if m.group(2) else ts
+
+
+def object_key(name: str) -> tuple:
+    """Sort key of a bronze object: its timestamp, then its name."""
+    return object_time(name) or _NO_TS, name
+
+
+def _watermark_object(name: str) -> str:
+    return WATERMARK_PREFIX + f"{name}.json"
+
+
+def load_watermark(name: str):
+    state = read_json_from_minio(_watermark_object(name), default={}) or {}
+    return state.get("last_object")
+
+
+def save_watermark(name: str, last_object: str, processed: int):
+    upload_json_to_minio(
+        object_name=_watermark_object(name),
+        data={
+            "last_object": last_object,
+            "last_ts": object_key(last_object)[0].isoformat(),
+            "processed": processed,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+
+
+def list_new_objects(client, bucket: str, prefix: str, after: str = None) -> list:
+    """Names under `prefix` that come after the object `after`, in (timestamp, name) order."""
+    names = (o.object_name for o in client.list_objects(bucket, prefix=prefix, recursive=True))
+    if after is not None:
+        watermark = object_key(after)
+        names = (n for n in names if object_key(n) > watermark)
+    return sorted(names, key=object_key)
+
+
+def fetch_json_objects(client, bucket: str, names: list) -> list:
+    """Download and parse objects concurrently; results keep the order of `names`."""
+    def fetch(name):
+        resp = client.get_object(bucket, name)
+        try:
+            return json.loads(resp.read().decode("utf-8"))
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    if len(names) <= 1:
+        return [fetch(n) for n in names]
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(names))) as pool:
+        return list(pool.map(fetch, names))
+
+
+def pending_payloads(client, bucket: str, name: str, prefix: str, bootstrap_objects: int = None):
+    """(object names, payloads) of every bronze object after the transform's watermark.
+
+    Without a watermark everything is pending, or only the newest `bootstrap_objects`
+    for transforms where old objects carry no information.
+    """
+    after = load_watermark(name)
+    names = list_new_objects(client, bucket, prefix, after)
+    if after:
+        print(f"[INFO] {name}: {len(names)} new bronze objects after {after}")
+    else:
+        if bootstrap_objects:
+            names = names[-bootstrap_objects:]
+        print(f"[INFO] {name}: no watermark, processing {len(names)} bronze objects")
+    return names, fetch_json_objects(client, bucket, names)
@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+import pandas as pd
+from minio import Minio
+
+from scripts.load.write_to_minio import upload_json_to_minio, read_json_from_minio
+from scripts.prescriptive.crowd import (
+    HOURS_PER_WEEK,
+    LOCAL_TZ_OFFSET,
+    build_crowd_codes,
+    presence_cells,
+    publish_crowd_table,
+)
+from scripts.prescriptive.read_silver import get_place_catalog
+from scripts.prescriptive.rules_loader import get_rules
+from scripts.transform.bronze_batch import pending_payloads, save_watermark
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+load_dotenv(BASE_DIR / ".env")
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "touchgrass")
+
+client = Minio(
+    MINIO_ENDPOINT,
+    access_key=MINIO_ACCESS_KEY,
+    secret_key=MINIO_SECRET_KEY,
+    secure=False
+)
+
+BRONZE_PREFIX = "bronze/user_activity/"
+WATERMARK_NAME = "crowd_to_silver"
+PRESENCE_OBJECT = "state/crowd_presence.json"
+
+
+def presence_counts(records: list) -> pd.DataFrame:
+    """Distinct device-hours per (presence cell, local hour-of-week)."""
+    df = pd.DataFrame.from_records(records, columns=["device", "timestamp_utc", "latitude", "longitude"])
+    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True, errors="coerce")
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    df = df.dropna()
+    if df.empty:
+        return pd.DataFrame(columns=["cell", "how", "devices"])
+
+    local = df["timestamp_utc"] + LOCAL_TZ_OFFSET
+    df = df.assign(
+        cell=presence_cells(df["latitude"], df["longitude"]),
+        how=(local.dt.dayofweek * 24 + local.dt.hour).to_numpy(),
+        hour=df["timestamp_utc"].dt.floor("h"),
+    )
+    # a device logging several times in the same hour and cell counts once
+    df = df.drop_duplicates(subset=["device", "cell", "hour"])
+    return df.groupby(["cell", "how"]).size().rename("devices").reset_index()
+
+
+def fold_presence(state: dict, counts: pd.DataFrame, first_ts, last_ts) -> dict:
+    cells = state.setdefault("cells", {})
+    for cell, how, devices in counts.itertuples(index=False):
+        cells.setdefault(str(cell), [0] * HOURS_PER_WEEK)[int(how)] += int(devices)
+
+    if first_ts is not None:
+        state["first_ts"] = min(filter(None, [state.get("first_ts"), first_ts.isoformat()]))
+        state["last_ts"] = max(filter(None, [state.get("last_ts"), last_ts.isoformat()]))
+    return state
+
+
+def observed_weeks(state: dict) -> float:
+    if not state.get("first_ts"):
+        return 1.0
+    span = pd.Timestamp(state["last_ts"]) - pd.Timestamp(state["first_ts"])
+    return max(1.0, span / pd.Timedelta(days=7))
+
+
+def main():
+    names, payloads = pending_payloads(client, MINIO_BUCKET, WATERMARK_NAME, BRONZE_PREFIX)
+    state = read_json_from_minio(PRESENCE_OBJECT, default=None) or {}
+
+    if names:
+        records = [r for payload in payloads for r in payload.get("records", [])]
+        counts = presence_counts(records)
+        ts = pd.to_datetime(pd.Series([r.get("timestamp_utc") for r in records]), utc=True, errors="coerce").dropna()
+        fold_presence(state, counts, ts.min() if len(ts) else None, ts.max() if len(ts) else None)
+        upload_json_to_minio(object_name=PRESENCE_OBJECT, data=state)
+
+    # rebuilt every run: the category baseline follows rules.yaml even when no new presence arrived
+    places = get_place_catalog()
+    codes = build_crowd_codes(places, get_rules(), state.get("cells"), observed_weeks(state))
+    version = publish_crowd_table(places.location_ids, codes, client, MINIO_BUCKET)
+
+    known = codes >= 0
+    print(f"[OK] crowd table {version}: {len(places)} places × {HOURS_PER_WEEK} hours, "
+          f"{known.mean() if known.size else 0:.0%} slots known, {len(state.get('cells', {}))} presence cells")
+
+    if names:
+        save_watermark(WATERMARK_NAME, names[-1], len(names))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 import os
 import io
-import json
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 
 import pandas as pd
 from minio import Minio
+from minio.error import S3Error
+
+from scripts.load.run_context import resolve_name, run_metadata, staged_name
+from scripts.transform.bronze_batch import pending_payloads, save_watermark
 
 load_dotenv()
 
@@ -24,64 +27,80 @@ client = Minio(
     secure=MINIO_SECURE
 )
 
-def get_latest_bronze_history(prefix: str) -> str:    
-    objects = list(client.list_objects(
-        MINIO_BUCKET, 
-        prefix=prefix, 
-        recursive=True
-    ))
+BRONZE_PREFIX = "bronze/screen_time_history/"
+SILVER_OBJECT = "silver/screen_time_history.csv"
+WATERMARK_NAME = "history_to_silver"
 
-    if not objects:
-        raise RuntimeError("No bronze user activity files found")
-    
-    objects.sort(key=lambda o: o.object_name, reverse=True)
-    return objects[0].object_name
-    
 
-def read_json_from_minio(object_name: str) -> dict:
-    resp = client.get_object(MINIO_BUCKET, object_name)
-    data = json.loads(resp.read().decode("utf-8"))
-    resp.close()
-    resp.release_conn()
-    return data
+def read_silver_csv(object_name: str):
+    try:
+        resp = client.get_object(MINIO_BUCKET, resolve_name(client, MINIO_BUCKET, object_name))
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return None
+        raise
+    try:
+        return pd.read_csv(io.BytesIO(resp.read()), keep_default_na=False)
+    finally:
+        resp.close()
+        resp.release_conn()
 
 
 def upload_csv(object_name: str, df: pd.DataFrame):
     csv_bytes = df.to_csv(index=False).encode("utf-8")
     client.put_object(
         bucket_name=MINIO_BUCKET,
-        object_name=object_name,
+        object_name=staged_name(object_name),
         data=io.BytesIO(csv_bytes),
         length=len(csv_bytes),
-        content_type="text/csv"
+        content_type="text/csv",
+        metadata=run_metadata()
     )
     print(f"[MINIO] Uploaded {object_name}")
 
-def process_history_to_silver():
-    bronze_prefix = "bronze/screen_time_history/"
-    bronze_object = get_latest_bronze_history(bronze_prefix)
+def daily_max(df: pd.DataFrame) -> pd.DataFrame:
+    # screen time is cumulative within a day, so the day's value is its max
+    return df.groupby(["local_date", "device"]).agg(
+        minutes_spent=("minutes_spent", "max"),
+        timestamp_local=("timestamp_local", "max"),
+    ).reset_index()
 
-    print(f"[INFO] Using bronze file: {bronze_object}")
-    payload = read_json_from_minio(bronze_object)
 
-    records = payload.get("records", [])
+def process_history_to_silver():
+    names, payloads = pending_payloads(client, MINIO_BUCKET, WATERMARK_NAME, BRONZE_PREFIX)
+    if not names:
+        print("[OK] Silver history already up to date")
+        return
+
+    records = [r for payload in payloads for r in payload.get("records", [])]
     if not records:
-        raise RuntimeError("No records in bronze payload")
-    
+        print("[INFO] No records in pending bronze payloads")
+        save_watermark(WATERMARK_NAME, names[-1], len(names))
+        return
+
     df = pd.DataFrame(records)
-    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], format='ISO8601')
+    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True, format='ISO8601')
     df["timestamp_local"] = df["timestamp_utc"] + LOCAL_TZ_OFFSET
     df["local_date"] = df["timestamp_local"].dt.date.astype(str)
+    df = df[["local_date", "device", "minutes_spent", "timestamp_local"]]
+
+    # fold the pending extracts into the existing history instead of replacing it,
+    # so days outside the latest 7-day window are kept
+    existing = read_silver_csv(SILVER_OBJECT)
+    if existing is not None and not existing.empty:
+        existing = existing[["local_date", "device", "minutes_spent", "timestamp_local"]].assign(
+            timestamp_local=pd.to_datetime(existing["timestamp_local"], utc=True, format="ISO8601"),
+            minutes_spent=pd.to_numeric(existing["minutes_spent"], errors="coerce"),
+        )
+        df = pd.concat([existing, df], ignore_index=True)
+
+    # groupby already orders by local_date; newest first is just the reverse
+    screentime_history_df = daily_max(df).iloc[::-1].reset_index(drop=True)
 
-    screentime_history_df = df.groupby("local_date").agg({
-        "minutes_spent": "max",
-        "device": "first",
-        "timestamp_local": "max"
-    }).reset_index()
+    upload_csv(SILVER_OBJECT, screentime_history_df)
+    save_watermark(WATERMARK_NAME, names[-1], len(names))
+    print(f"[OK] Silver history upserted ({len(names)} bronze objects, {len(records)} records).")
 
-    screentime_history_df = screentime_history_df.sort_values("local_date", ascending=False)
 
-    upload_csv("silver/screen_time_history.csv", screentime_history_df)
-    print("[OK] Silver history upserted.")
 if __name__ == "__main__":
-    process_history_to_silver()
\ No newline at end of file
+    process_history_to_silver()
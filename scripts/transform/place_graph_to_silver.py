@@ -0,0 +1,61 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+from minio import Minio
+
+from scripts.prescriptive.distance_model import load_detour_model
+from scripts.prescriptive.place_graph import (
+    ROUTE_BUDGET,
+    build_place_graph,
+    load_place_graph,
+    publish_place_graph,
+    refine_routes,
+)
+from scripts.prescriptive.read_silver import get_place_catalog
+from scripts.transform.bronze_batch import fetch_json_objects, list_new_objects
+from scripts.transform.places_upsert import CHANGES_PREFIX
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+load_dotenv(BASE_DIR / ".env")
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "touchgrass")
+
+client = Minio(
+    MINIO_ENDPOINT,
+    access_key=MINIO_ACCESS_KEY,
+    secret_key=MINIO_SECRET_KEY,
+    secure=False
+)
+
+
+def main():
+    previous = load_place_graph(client, MINIO_BUCKET)
+    after = previous.meta.get("last_change_log") if previous is not None else None
+    log_names = list_new_objects(client, MINIO_BUCKET, CHANGES_PREFIX, after=after)
+
+    if previous is not None and not log_names:
+        graph, rebuilt = previous, 0
+    else:
+        # the change log is the trigger and names the places to re-examine; without a
+        # previous graph (or its last log) every row is built
+        change_logs = fetch_json_objects(client, MINIO_BUCKET, log_names) if after is not None else None
+        graph, rebuilt = build_place_graph(get_place_catalog(), load_detour_model(), previous, change_logs)
+        if log_names:
+            graph.meta["last_change_log"] = log_names[-1]
+
+    routed = refine_routes(graph, ROUTE_BUDGET)
+    if not rebuilt and not routed:
+        print(f"[OK] place graph already up to date ({len(graph)} places, {graph.nnz} edges)")
+        return
+
+    version = publish_place_graph(graph, client, MINIO_BUCKET)
+    print(f"[OK] place graph {version}: {len(graph)} places, {graph.nnz} edges, {rebuilt} rows rebuilt, "
+          f"{routed} edges routed ({int(graph.routed.sum())} routed in total)")
+
+
+if __name__ == "__main__":
+    main()
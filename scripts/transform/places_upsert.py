@@ -1,11 +1,18 @@
 import os
 import io
+import json
 import pandas as pd
 from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 from minio import Minio
 
+from scripts.load.run_context import run_metadata
+from scripts.prescriptive.catalog import catalog_from_frame
+from scripts.prescriptive.catalog_snapshot import publish_snapshot
+from scripts.prescriptive.place_shards import write_shards, read_shards_frame, geohash_encode
+from minio.error import S3Error
+
 BASE_DIR = Path(__file__).resolve().parents[2]
 load_dotenv(BASE_DIR / ".env")
 
@@ -21,6 +28,12 @@ client = Minio(
     secure=False
 )
 
+CHANGES_PREFIX = "silver/places_changes/"
+KEY = "location_id"
+# bookkeeping columns; everything else is place content and feeds the row hash
+META_COLUMNS = ("is_active", "updated_at_utc")
+
+
 def get_latest_places_object():
     objects = list(client.list_objects(
         MINIO_BUCKET,
@@ -37,12 +50,102 @@ def get_latest_places_object():
 
 def read_csv(object_name: str) -> pd.DataFrame:
     resp = client.get_object(MINIO_BUCKET, object_name)
-    df = pd.read_csv(resp)
+    # strings throughout, so unchanged rows hash the same as their silver copy
+    df = pd.read_csv(resp, dtype=str, keep_default_na=False)
     resp.close()
     resp.release_conn()
     return df
 
 
+def read_current_silver():
+    """(current silver places, whether they came from the shards)."""
+    current = read_shards_frame(client, MINIO_BUCKET)
+    if current is not None:
+        return current, True
+    # before sharding, silver was a single CSV
+    try:
+        return read_csv("silver/places.csv"), False
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return pd.DataFrame(columns=[KEY, *META_COLUMNS]), False
+        raise
+
+
+def _row_hashes(df: pd.DataFrame, columns: list) -> pd.Series:
+    return pd.util.hash_pandas_object(df.reindex(columns=columns, fill_value="").astype(str), index=False)
+
+
+def merge_places(current: pd.DataFrame, bronze: pd.DataFrame, now: str):
+    """Merge the bronze snapshot into silver keyed on location_id.
+
+    Returns (silver, changes). Changed and new rows get updated_at_utc = now, places
+    missing from bronze are soft-deactivated, unchanged rows are kept as they were.
+    """
+    bronze = bronze.drop_duplicates(subset=[KEY], keep="last").set_index(KEY)
+    current = current.drop_duplicates(subset=[KEY], keep="last").set_index(KEY)
+    content = [c for c in bronze.columns if c not in META_COLUMNS]
+
+    was_active = current["is_active"].astype(str).str.lower().isin(("true", "1"))
+    new_hash = _row_hashes(bronze, content)
+    new_hash.index = bronze.index
+    old_hash = _row_hashes(current, content)
+    old_hash.index = current.index
+
+    common = bronze.index.intersection(current.index)
+    inserted = bronze.index.difference(current.index)
+    updated = common[(new_hash[common] != old_hash[common]).to_numpy()]
+    reactivated = common[~was_active[common].to_numpy()].difference(updated)
+    deactivated = current.index.difference(bronze.index)
+    deactivated = deactivated[was_active[deactivated].to_numpy()]
+
+    touched = inserted.union(updated).union(reactivated)
+    fresh = bronze.loc[touched].copy()
+    fresh["is_active"] = "True"
+    fresh["updated_at_utc"] = now
+
+    gone = current.loc[deactivated].copy()
+    gone["is_active"] = "False"
+    gone["updated_at_utc"] = now
+
+    kept = current.drop(index=touched.union(deactivated), errors="ignore")
+    silver = pd.concat([kept, fresh, gone]).reindex(columns=[*content, *META_COLUMNS], fill_value="")
+    silver = silver.sort_index(key=lambda ids: pd.to_numeric(ids, errors="coerce")).reset_index()
+
+    changes = pd.DataFrame({
+        KEY: [*inserted, *updated, *reactivated, *deactivated],
+        "op": ["insert"] * len(inserted) + ["update"] * len(updated)
+        + ["reactivate"] * len(reactivated) + ["deactivate"] * len(deactivated),
+    })
+    return silver, changes
+
+
+def write_change_log(changes: pd.DataFrame, silver: pd.DataFrame, bronze_object: str, now: str) -> str:
+    # geohash per change so consumers can invalidate just the shards (and caches) touched
+    located = silver.set_index(KEY).loc[changes[KEY]]
+    changes = changes.assign(geohash=geohash_encode(
+        pd.to_numeric(located["latitude"], errors="coerce").to_numpy(),
+        pd.to_numeric(located["longitude"], errors="coerce").to_numpy(),
+    ))
+
+    object_name = CHANGES_PREFIX + f"changes_{datetime.fromisoformat(now).strftime('%Y%m%d_%H%M%S')}.json"
+    payload = {
+        "run_at": now,
+        "bronze_object": bronze_object,
+        "counts": {op: int(n) for op, n in changes["op"].value_counts().items()},
+        "changes": changes.to_dict(orient="records"),
+    }
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    client.put_object(
+        MINIO_BUCKET,
+        object_name,
+        data=io.BytesIO(body),
+        length=len(body),
+        content_type="application/json",
+        metadata=run_metadata()
+    )
+    return object_name
+
+
 def main():
     bronze_object = get_latest_places_object()
     print(f"[INFO] Using bronze places: {bronze_object}")
@@ -64,31 +167,28 @@ def main():
 
     now = datetime.now(timezone.utc).isoformat()
 
-    silver_df = bronze_df.rename(columns={
+    bronze_df = bronze_df.rename(columns={
         "location_category": "category"
     })
 
-    silver_df["is_active"] = True
-    silver_df["updated_at_utc"] = now
+    current_df, sharded = read_current_silver()
+    silver_df, changes = merge_places(current_df, bronze_df, now)
+    if changes.empty and sharded:
+        print("[OK] silver places already up to date")
+        return
 
-    silver_df = (
-        silver_df
-        .sort_values("updated_at_utc")
-        .drop_duplicates(subset=["location_id"], keep="last")
-        .reset_index(drop=True)
-    )
+    print(f"[INFO] places changes: {changes['op'].value_counts().to_dict()}")
 
-    csv_bytes = silver_df.to_csv(index=False).encode("utf-8")
+    # one object per geohash prefix; only shards whose rows changed are rewritten
+    manifest = write_shards(silver_df, client, MINIO_BUCKET)
 
-    client.put_object(
-        MINIO_BUCKET,
-        "silver/places.csv",
-        data=io.BytesIO(csv_bytes),
-        length=len(csv_bytes),
-        content_type="text/csv"
-    )
+    if manifest["changed"] or manifest["removed"]:
+        publish_snapshot(catalog_from_frame(silver_df.fillna("").astype(str)), client, MINIO_BUCKET)
 
-    print("[OK] silver/places.csv upserted")
+    if changes.empty:
+        return
+    log_object = write_change_log(changes, silver_df, bronze_object, now)
+    print(f"[OK] places change log → {log_object}")
 
 
 if __name__ == "__main__":
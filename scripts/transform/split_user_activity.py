@@ -1,11 +1,15 @@
 import os
 import io
-import json
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 
 import pandas as pd
 from minio import Minio
+from minio.error import S3Error
+
+from scripts.load.run_context import RunLease, current_run_id, run_metadata
+from scripts.transform.bronze_batch import pending_payloads, save_watermark
 
 load_dotenv()
 
@@ -24,26 +28,28 @@ client = Minio(
     secure=MINIO_SECURE
 )
 
-def get_latest_bronze_object(prefix: str) -> str:
-    objects = list(client.list_objects(
-        MINIO_BUCKET,
-        prefix=prefix,
-        recursive=True
-    ))
-
-    if not objects:
-        raise RuntimeError("No bronze user activity files found")
+BRONZE_PREFIX = "bronze/user_activity/"
+WATERMARK_NAME = "split_user_activity"
 
-    objects.sort(key=lambda o: o.object_name, reverse=True)
-    return objects[0].object_name
+# silver/screen_time.csv and silver/user_location.csv are read, merged and rewritten by
+# this step and by the stream daemon; the lease makes them take turns
+SILVER_LEASE = "silver_user_activity"
+SILVER_LEASE_SECONDS = 120
+SILVER_LEASE_WAIT_SECONDS = float(os.getenv("SILVER_LEASE_WAIT_SECONDS", "120"))
 
 
-def read_json_from_minio(object_name: str) -> dict:
-    resp = client.get_object(MINIO_BUCKET, object_name)
-    data = json.loads(resp.read().decode("utf-8"))
-    resp.close()
-    resp.release_conn()
-    return data
+def read_silver_csv(object_name: str):
+    try:
+        resp = client.get_object(MINIO_BUCKET, object_name)
+    except S3Error as exc:
+        if exc.code == "NoSuchKey":
+            return None
+        raise
+    try:
+        return pd.read_csv(io.BytesIO(resp.read()), keep_default_na=False)
+    finally:
+        resp.close()
+        resp.release_conn()
 
 
 def upload_csv(object_name: str, df: pd.DataFrame):
@@ -53,67 +59,124 @@ def upload_csv(object_name: str, df: pd.DataFrame):
         object_name=object_name,
         data=io.BytesIO(csv_bytes),
         length=len(csv_bytes),
-        content_type="text/csv"
+        content_type="text/csv",
+        metadata=run_metadata()
     )
     print(f"[MINIO] Uploaded {object_name}")
 
 
-def split_user_activity():
-    bronze_prefix = "bronze/user_activity/"
-    bronze_object = get_latest_bronze_object(bronze_prefix)
-
-    print(f"[INFO] Using bronze file: {bronze_object}")
-    payload = read_json_from_minio(bronze_object)
+@contextmanager
+def silver_lease():
+    lease = RunLease(SILVER_LEASE, current_run_id(), client, MINIO_BUCKET, seconds=SILVER_LEASE_SECONDS)
+    if not lease.acquire(wait_seconds=SILVER_LEASE_WAIT_SECONDS):
+        holder = lease.blocked_by or {}
+        raise RuntimeError(f"silver user activity is locked by run {holder.get('run_id')} on {holder.get('host')}")
+    try:
+        yield
+    finally:
+        lease.release()
 
-    records = payload.get("records", [])
-    if not records:
-        raise RuntimeError("No records in bronze payload")
 
+def split_records(records: list, resolved_at: datetime = None):
+    # latest screen time row and last known location, one row per device
     df = pd.DataFrame(records)
 
-    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True)
-
-    df = df.sort_values("timestamp_utc", ascending=False)
+    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], utc=True, format="ISO8601")
+    df = df[df["timestamp_utc"].notna()].reset_index(drop=True)
 
-    valid_location = df[
-        df["latitude"].notna() & df["longitude"].notna()
-    ]
+    # newest row per device via idxmax, no sort of the whole batch
+    latest = df.loc[df.groupby("device", sort=False)["timestamp_utc"].idxmax()]
 
-    if not valid_location.empty:
-        last_lat = valid_location.iloc[0]["latitude"]
-        last_lon = valid_location.iloc[0]["longitude"]
-        location_source = "last_known"
-    else:
-        last_lat = None
-        last_lon = None
-        location_source = "unknown"
+    located = df[df["latitude"].notna() & df["longitude"].notna()]
+    valid_location = located.loc[located.groupby("device", sort=False)["timestamp_utc"].idxmax()]
 
-    df["timestamp_local"] = df["timestamp_utc"] + LOCAL_TZ_OFFSET
-    df["local_date"] = df["timestamp_local"].dt.date
+    latest = latest.assign(
+        timestamp_local=latest["timestamp_utc"] + LOCAL_TZ_OFFSET,
+    )
+    latest["local_date"] = latest["timestamp_local"].dt.date
 
-    screen_time_df = df[[
+    screen_time_df = latest[[
         "device",
         "minutes_spent",
         "timestamp_utc",
         "timestamp_local",
         "local_date"
-    ]].copy()
+    ]].reset_index(drop=True)
+
+    user_location_df = latest[["device"]].merge(
+        valid_location[["device", "latitude", "longitude"]],
+        on="device",
+        how="left",
+    )
+    user_location_df["location_source"] = user_location_df["latitude"].notna().map(
+        {True: "last_known", False: "unknown"}
+    )
+    user_location_df["resolved_at_utc"] = (resolved_at or datetime.now(timezone.utc)).isoformat()
+
+    return screen_time_df, user_location_df
 
-    screen_time_df = screen_time_df.head(1)
-    
-    user_location_df = pd.DataFrame([{
-        "device": df.iloc[0]["device"],
-        "latitude": last_lat,
-        "longitude": last_lon,
-        "location_source": location_source,
-        "resolved_at_utc": datetime.now(timezone.utc).isoformat()
-    }])
 
+def upsert_by_device(existing_df: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
+    # replace the rows of every device present in new_df, keep the others
+    if existing_df is None or existing_df.empty:
+        return new_df
 
-    upload_csv("silver/screen_time.csv", screen_time_df)
-    upload_csv("silver/user_location.csv", user_location_df)
+    existing_df = existing_df[~existing_df["device"].astype(str).isin(new_df["device"].astype(str))]
+    return pd.concat([existing_df, new_df], ignore_index=True)
+
+
+def newer_devices(existing_screen: pd.DataFrame, screen_df: pd.DataFrame) -> pd.Series:
+    # the stream daemon and the batch both write silver; a device only moves forward in time
+    if existing_screen is None or existing_screen.empty:
+        return pd.Series(True, index=screen_df.index)
+
+    previous = pd.Series(
+        pd.to_datetime(existing_screen["timestamp_utc"], utc=True, format="ISO8601", errors="coerce").to_numpy(),
+        index=existing_screen["device"].astype(str),
+    ).groupby(level=0).max()
+
+    current = previous.reindex(screen_df["device"].astype(str)).reset_index(drop=True)
+    incoming = screen_df["timestamp_utc"].reset_index(drop=True)
+    keep = current.isna() | (incoming > current)
+    return pd.Series(keep.to_numpy(), index=screen_df.index)
+
+
+def merge_into_silver(existing_screen, existing_location, screen_df, location_df):
+    keep = newer_devices(existing_screen, screen_df)
+    devices = screen_df.loc[keep, "device"].astype(str)
+
+    screen = upsert_by_device(existing_screen, screen_df[keep])
+    location = upsert_by_device(existing_location, location_df[location_df["device"].astype(str).isin(devices)])
+    return screen, location, int(keep.sum())
+
+
+def split_user_activity():
+    names, payloads = pending_payloads(client, MINIO_BUCKET, WATERMARK_NAME, BRONZE_PREFIX)
+    if not names:
+        print("[OK] Silver user activity already up to date")
+        return
+
+    # every pending bronze object (hourly extracts and stream micro-batches) in one pass
+    records = [r for payload in payloads for r in payload.get("records", [])]
+    records = [r for r in records if r.get("device") and r.get("timestamp_utc")]
+
+    if records:
+        screen_time_df, user_location_df = split_records(records)
+        with silver_lease():
+            screen, location, updated = merge_into_silver(
+                read_silver_csv("silver/screen_time.csv"),
+                read_silver_csv("silver/user_location.csv"),
+                screen_time_df,
+                user_location_df,
+            )
+
+            upload_csv("silver/screen_time.csv", screen)
+            upload_csv("silver/user_location.csv", location)
+        print(f"[OK] Silver user activity tables updated ({len(records)} records, {updated} devices)")
+    else:
+        print("[INFO] No records in pending bronze payloads")
 
-    print("[OK] Silver user activity tables updated")
+    save_watermark(WATERMARK_NAME, names[-1], len(names))
 
 
 if __name__ == "__main__":
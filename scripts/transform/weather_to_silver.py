@@ -1,13 +1,15 @@
 import os
-import json
 import io
-from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 
+import numpy as np
 import pandas as pd
 from minio import Minio
 
+from scripts.load.run_context import run_metadata, staged_name
+from scripts.transform.bronze_batch import pending_payloads, save_watermark
+
 BASE_DIR = Path(__file__).resolve().parents[2]
 load_dotenv(BASE_DIR / ".env")
 
@@ -24,26 +26,8 @@ client = Minio(
     secure=False
 )
 
-def get_latest_weather_object():
-    objects = list(client.list_objects(
-        MINIO_BUCKET,
-        prefix="bronze/weather/",
-        recursive=True
-    ))
-
-    if not objects:
-        raise RuntimeError("No bronze weather files found")
-
-    objects.sort(key=lambda o: o.object_name, reverse=True)
-    return objects[0].object_name
-
-
-def read_json(object_name: str) -> dict:
-    resp = client.get_object(MINIO_BUCKET, object_name)
-    data = json.loads(resp.read().decode("utf-8"))
-    resp.close()
-    resp.release_conn()
-    return data
+BRONZE_PREFIX = "bronze/weather/"
+WATERMARK_NAME = "weather_to_silver"
 
 
 def weather_category(code: int) -> str:
@@ -58,55 +42,64 @@ def weather_category(code: int) -> str:
     return "storm"
 
 
-def main():
-    bronze_object = get_latest_weather_object()
-    print(f"[INFO] Using bronze weather: {bronze_object}")
+def weather_row(payloads: list, at) -> dict:
+    """Silver weather row for time `at` from bronze forecasts given oldest first."""
+    # newest forecast first, so on equal distance to `at` argmin picks the latest one
+    hourly = [p["data"]["hourly"] for p in reversed(payloads)]
 
-    payload = read_json(bronze_object)
-    
-    data = payload["data"]
-    hourly = data["hourly"]
+    def frame(h):
+        # every key aligned to this forecast's own time axis; a short or missing key is NaN
+        n = len(h.get("time", []))
+        columns = {"time": h.get("time", [])}
+        for key in ("temperature_2m", "uv_index", "weathercode"):
+            values = np.asarray(h.get(key, []), dtype=np.float64)[:n]
+            columns[key] = np.pad(values, (0, n - len(values)), constant_values=np.nan)
+        return pd.DataFrame(columns)
 
-    times = hourly.get("time", [])
-    temps = hourly.get("temperature_2m", [])
-    uvs = hourly.get("uv_index", [])
-    codes = hourly.get("weathercode", [])
+    hours = pd.concat([frame(h) for h in hourly], ignore_index=True)
+    # an hour without a weather code cannot be categorised
+    hours = hours.dropna(subset=["weathercode"]).reset_index(drop=True)
 
-    if not times:
+    if hours.empty:
         raise RuntimeError("No hourly weather data found")
 
-    df = pd.DataFrame({
-        "timestamp_utc": pd.to_datetime(times, utc=True),
-        "temperature_c": temps,
-        "uv_index": uvs,
-        "weather_code": codes
-    })
+    timestamps = pd.to_datetime(hours["time"], utc=True)
+    i = int(np.abs((timestamps - pd.Timestamp(at)).to_numpy().astype("int64")).argmin())
+    row = hours.iloc[i]
+    code = int(row["weathercode"])
 
-    now = datetime.now(timezone.utc)
-    df["time_diff"] = (df["timestamp_utc"] - now).abs()
+    return {
+        "timestamp_utc": timestamps[i].isoformat(),
+        "temperature_c": float(row["temperature_2m"]),
+        "uv_index": float(row["uv_index"]),
+        "weather_code": code,
+        "weather_category": weather_category(code),
+        "horizon_hours": len(hourly[0].get("time", []))
+    }
 
-    row = df.sort_values("time_diff").iloc[0]
 
-    silver_df = pd.DataFrame([{
-        "timestamp_utc": row["timestamp_utc"].isoformat(),
-        "temperature_c": float(row["temperature_c"]),
-        "uv_index": float(row["uv_index"]),
-        "weather_code": int(row["weather_code"]),
-        "weather_category": weather_category(row["weather_code"]),
-        "horizon_hours": len(df)
-    }])
+def main():
+    # only the newest forecast matters on a first run; after downtime every pending one is considered
+    names, payloads = pending_payloads(client, MINIO_BUCKET, WATERMARK_NAME, BRONZE_PREFIX, bootstrap_objects=1)
+    if not names:
+        print("[OK] silver/weather.csv already up to date")
+        return
+
+    silver_df = pd.DataFrame([weather_row(payloads, pd.Timestamp.now(tz="UTC"))])
 
     csv_bytes = silver_df.to_csv(index=False).encode("utf-8")
 
     client.put_object(
         MINIO_BUCKET,
-        "silver/weather.csv",
+        staged_name("silver/weather.csv"),
         data=io.BytesIO(csv_bytes),
         length=len(csv_bytes),
-        content_type="text/csv"
+        content_type="text/csv",
+        metadata=run_metadata()
     )
 
-    print("[OK] silver/weather.csv updated")
+    save_watermark(WATERMARK_NAME, names[-1], len(names))
+    print(f"[OK] silver/weather.csv updated ({len(names)} bronze objects)")
 
 
 if __name__ == "__main__":